@@ -5,6 +5,17 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+La página de inicio y el informe de ventas son vistas async que lanzan sus
+consultas en paralelo (ver inventory.asyncdb). Bajo WSGI (wsgi.py) también
+funcionan, en un bucle de eventos por petición; con un servidor ASGI
+comparten el bucle del proceso. Por ejemplo, con uvicorn (no incluido en
+requirements.txt):
+
+    uvicorn cafe_central_project.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+`python manage.py benchmark_asgi` compara la latencia de ambos manejadores
+con peticiones concurrentes.
 """
 
 import os
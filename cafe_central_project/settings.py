@@ -11,8 +11,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,9 +57,15 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    # Sesiones iniciadas con ModelBackend a RoleModelBackend (ver inventory.backends).
+    'inventory.backends.SessionBackendMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Fija al primario las lecturas de quien acaba de escribir (ver inventory.replicas).
+    'inventory.replicas.PrimaryPinningMiddleware',
+    # Tiempos por petición (Server-Timing y página de rendimiento). Debe ir el último.
+    'inventory.instrumentation.RequestTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'cafe_central_project.urls'
@@ -91,6 +99,72 @@ DATABASES = {
     )
 }
 
+# Réplica de lectura opcional para las páginas de consulta pesadas (ver
+# inventory.replicas). En las pruebas es un espejo de 'default'.
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.parse(os.environ['DATABASE_REPLICA_URL'], conn_max_age=600)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['inventory.replicas.ReplicaRouter']
+# Segundos que las lecturas de un cliente van al primario tras una escritura
+# (debe cubrir el retraso habitual de la réplica).
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', 5))
+
+# Pool de conexiones (psycopg 3 + psycopg_pool, solo PostgreSQL) con
+# DATABASE_POOL=True. Sin pool, cada hilo del servidor mantiene su propia
+# conexión persistente (conn_max_age), sin límite: al escalar workers se
+# agotan las conexiones de PostgreSQL. Con pool, el proceso abre como mucho
+# DATABASE_POOL_MAX_SIZE conexiones y las comparte entre sus hilos; una
+# petición que no consigue conexión en DATABASE_POOL_TIMEOUT segundos falla
+# en lugar de esperar indefinidamente. Las conexiones se comprueban antes de
+# entregarlas (CONN_HEALTH_CHECKS). Métricas: inventory.dbpool.pool_stats().
+# El pool necesita psycopg 3 y psycopg-pool (ver requirements.txt); sin
+# DATABASE_POOL sigue valiendo psycopg2.
+if os.environ.get('DATABASE_POOL', 'False') == 'True':
+    if find_spec('psycopg') is None or find_spec('psycopg_pool') is None:
+        raise ImproperlyConfigured("DATABASE_POOL necesita psycopg 3 y psycopg-pool: "
+                                   "pip install 'psycopg[binary,pool]'.")
+    for alias, database in DATABASES.items(): # Un pool por alias (primario y réplica)
+        if database['ENGINE'] != 'django.db.backends.postgresql':
+            raise ImproperlyConfigured("DATABASE_POOL solo está disponible con PostgreSQL.")
+        database['CONN_MAX_AGE'] = 0 # El pool reutiliza las conexiones (Django no admite ambas cosas)
+        database['CONN_HEALTH_CHECKS'] = True
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'name': f'cafecentral-{alias}',
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)), # Espera máxima por una conexión
+            'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', 60 * 5)), # Cierra las que sobran tras este tiempo
+            'max_lifetime': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 60 * 30)),
+        }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Con DJANGO_CACHE_DIR la caché se guarda en disco y la comparten todos los
+# procesos del servidor; sin ella cada proceso tiene su propia caché en memoria
+# y las versiones que invalidan las páginas (ver inventory.caching) solo se
+# suben en el proceso que hizo la escritura.
+
+if os.environ.get('DJANGO_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['DJANGO_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cafecentral',
+        }
+    }
+
+# Segundos que se conserva el contenido de una página en caché. Los cambios se
+# invalidan por versión; este límite solo acota la memoria y, con la caché en
+# memoria, el desfase entre procesos.
+CONTENT_CACHE_TIMEOUT = int(os.environ.get('CONTENT_CACHE_TIMEOUT', 60 * 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -150,6 +224,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'inventory.CustomUser'
 
+# Carga el usuario de la sesión junto con su rol en una sola consulta. Las
+# sesiones iniciadas antes con ModelBackend las migra SessionBackendMiddleware.
+AUTHENTICATION_BACKENDS = ['inventory.backends.RoleModelBackend']
+
 
 # Redirección después de iniciar sesión
 LOGIN_REDIRECT_URL = '/' # Redirige a la página de inicio después del login
@@ -161,5 +239,12 @@ LOGIN_URL = '/accounts/login/' # La URL a la que se redirige si el usuario no es
 LOGOUT_REDIRECT_URL = '/' # Redirige a la página de inicio después del logout
 
 # Configuración de correo electrónico para desarrollo
-# En desarrollo, los correos se mostrarán en la consola
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
+# En desarrollo, los correos se mostrarán en la consola; con EMAIL_FILE_PATH se
+# guardan en ficheros (django.core.mail.backends.filebased.EmailBackend).
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'CafeCentral <no-reply@cafecentral.local>')
+
+# Segundos que se acumulan las alertas de stock bajo antes de enviar el
+# resumen por correo (ver inventory.notifications).
+ALERT_DIGEST_WINDOW = int(os.environ.get('ALERT_DIGEST_WINDOW', 60 * 15))
\ No newline at end of file
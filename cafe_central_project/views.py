@@ -1,15 +1,14 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, F
-from django.utils import timezone
 from django.contrib.auth import login
 from django.urls import reverse_lazy
 from django.views.generic import CreateView
 from django.contrib import messages
 
-# Importar los modelos necesarios desde el módulo inventory
-from inventory.models import DailySalesSession, SaleItem, StockAlert, Product, CustomUser, Role
+from inventory.dashboard import aget_dashboard_metrics
 from inventory.forms import CustomUserCreationForm
+from inventory.replicas import read_from_replica
 
 class SignupView(CreateView):
     form_class = CustomUserCreationForm
@@ -54,60 +53,38 @@ class SignupView(CreateView):
 
 
 @login_required
-def home(request):
+@read_from_replica
+async def home(request):
     context = {
         'project_name': 'CafeCentral',
         'page_title': 'Inicio - Dashboard'
     }
 
-    user = request.user
+    # Vista async: el usuario se carga con auser() y se deja en request.user para
+    # que la plantilla (context processor auth) no lo vuelva a consultar.
+    user = request.user = await request.auser()
 
-    # Datos generales para todos los usuarios autenticados
-    total_products = Product.objects.count()
-    active_stock_alerts = StockAlert.objects.filter(resolved=False)
-    active_stock_alerts_count = active_stock_alerts.count()
-    
-    # Productos con stock bajo: current_stock menor o igual al minimum_stock_level
-    products_low_stock_queryset = Product.objects.filter(current_stock__lte=F('minimum_stock_level'))
-    products_low_stock_count = products_low_stock_queryset.count()
+    # Métricas agregadas y cacheadas; sin caché, sus consultas van en paralelo (ver inventory.dashboard)
+    metrics = await aget_dashboard_metrics()
 
+    # Datos generales para todos los usuarios autenticados
     context.update({
-        'total_products': total_products,
-        'active_stock_alerts_count': active_stock_alerts_count,
-        'products_low_stock_count': products_low_stock_count,
-        'active_stock_alerts_list': active_stock_alerts, # Renombrado para claridad en la plantilla
-        'products_low_stock_list': products_low_stock_queryset, # Renombrado para claridad en la plantilla
+        'total_products': metrics['total_products'],
+        'active_stock_alerts_count': metrics['active_stock_alerts_count'],
+        'products_low_stock_count': metrics['products_low_stock_count'],
     })
 
     # Datos específicos para OWNERs y ADMINs
     if user.is_owner() or user.is_admin():
-        today = timezone.localdate()
-        
-        # Ventas de hoy
-        today_sales_session = DailySalesSession.objects.filter(sale_date=today).first()
-        total_revenue_today = 0
-        total_items_sold_today = 0
-        if today_sales_session:
-            sales_data = today_sales_session.sale_items.aggregate(
-                total_revenue=Sum('subtotal'),
-                total_quantity=Sum('quantity_sold')
-            )
-            total_revenue_today = sales_data['total_revenue'] or 0
-            total_items_sold_today = sales_data['total_quantity'] or 0
-        
-        # Conteo de usuarios por rol (OWNER, ADMIN, EMPLOYEE)
-        owner_count = CustomUser.objects.filter(role__name='OWNER').count()
-        admin_count = CustomUser.objects.filter(role__name='ADMIN').count()
-        employee_count = CustomUser.objects.filter(role__name='EMPLOYEE').count()
-
         context.update({
-            'total_revenue_today': total_revenue_today,
-            'total_items_sold_today': total_items_sold_today,
-            'owner_count': owner_count,
-            'admin_count': admin_count,
-            'employee_count': employee_count,
-            'today_sales_session_exists': today_sales_session is not None,
-            'today_sales_session_pk': today_sales_session.pk if today_sales_session else None,
+            'total_revenue_today': metrics['total_revenue_today'],
+            'total_items_sold_today': metrics['total_items_sold_today'],
+            'owner_count': metrics['owner_count'],
+            'admin_count': metrics['admin_count'],
+            'employee_count': metrics['employee_count'],
+            'today_sales_session_exists': metrics['today_sales_session_exists'],
+            'today_sales_session_pk': metrics['today_sales_session_pk'],
         })
     
-    return render(request, 'home.html', context)
\ No newline at end of file
+    # TemplateResponse: el renderizado ocurre fuera de la vista y se mide aparte (Server-Timing).
+    return TemplateResponse(request, 'home.html', context)
\ No newline at end of file
@@ -1,6 +1,7 @@
 # inventory/admin.py
 from django.contrib import admin
-from .models import Role, CustomUser, Supplier, Product, StockAlert, DailySalesSession, SaleItem
+from .models import (Role, CustomUser, Supplier, Product, StockAlert, DailySalesSession, SaleItem, InventorySnapshot,
+                     PurchaseOrder, PurchaseOrderLine, Task, SyncBatch, SyncLine)
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin # Renombramos UserAdmin para evitar conflictos
 
@@ -49,4 +50,31 @@ admin.site.register(Supplier)
 admin.site.register(Product)
 admin.site.register(StockAlert)
 admin.site.register(DailySalesSession)
-admin.site.register(SaleItem)
\ No newline at end of file
+admin.site.register(SaleItem)
+admin.site.register(InventorySnapshot)
+admin.site.register(PurchaseOrder)
+admin.site.register(PurchaseOrderLine)
+
+
+# Cola de tareas: estado de cada tarea y último error para revisar las fallidas
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'last_error')
+
+# Lotes de sincronización de los TPV: resultado devuelto por línea
+@admin.register(SyncBatch)
+class SyncBatchAdmin(admin.ModelAdmin):
+    list_display = ('key', 'device', 'user', 'line_count', 'received_at')
+    search_fields = ('key', 'device')
+    readonly_fields = ('received_at', 'results')
+
+
+@admin.register(SyncLine)
+class SyncLineAdmin(admin.ModelAdmin):
+    list_display = ('key', 'kind', 'batch', 'sale_item', 'stock_movement', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('key',)
+    raw_id_fields = ('batch', 'sale_item', 'stock_movement')
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Lógica de creación y resolución de alertas de stock.
+
+Las funciones de este módulo trabajan sobre lotes de cambios de stock
+(ver inventory.stock.StockChange) para que evaluar las alertas cueste un
+número fijo de consultas sin importar cuántos productos se toquen.
+
+"Como mucho una alerta activa por producto" lo garantiza el índice único
+parcial de StockAlert: las alertas se insertan ignorando conflictos, de modo
+que dos escrituras concurrentes nunca generan duplicados.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import Product, StockAlert
+
+
+def sync_stock_alerts(changes):
+    """
+    Crea o resuelve alertas para los productos afectados por `changes`.
+
+    - Crea una alerta si el stock quedó por debajo/igual al mínimo y el
+      producto no tiene ya una alerta activa.
+    - Resuelve las alertas activas si el stock SUBIÓ y supera el mínimo.
+
+    Si el cambio ya dice si hay una alerta activa (has_active_alert, ver
+    inventory.stock), no se consultan las alertas cuando no hay nada que hacer.
+    """
+    low_stock = [c for c in changes
+                 if c.new_stock <= c.minimum_stock_level and not c.has_active_alert]
+    recovered = [c.product_id for c in changes
+                 if c.delta > 0 and c.new_stock > c.minimum_stock_level and c.has_active_alert is not False]
+
+    if low_stock:
+        create_alerts((c.product_id, c.new_stock) for c in low_stock)
+    if recovered:
+        resolve_alerts(StockAlert.objects.filter(product_id__in=recovered))
+
+
+def create_alerts(products):
+    """
+    Inserta una alerta activa por cada par (product_id, stock) de `products`
+    con un único INSERT; los productos que ya tienen una alerta activa se
+    ignoran (ON CONFLICT DO NOTHING sobre el índice único parcial).
+    """
+    from .events import publish_alerts_created
+    from .tasks import enqueue
+
+    now = timezone.now()
+    products = list(products)
+    StockAlert.objects.bulk_create([
+        StockAlert(product_id=product_id, current_stock_at_alert=stock, alert_timestamp=now)
+        for product_id, stock in products
+    ], ignore_conflicts=True)
+    # Las insertadas ahora: auto_now_add les pone una fecha >= now; las
+    # ignoradas por conflicto son alertas activas anteriores.
+    created = publish_alerts_created(StockAlert.objects.filter(
+        product_id__in=[product_id for product_id, _ in products], resolved=False, alert_timestamp__gte=now))
+    if created:
+        # Un solo resumen por correo por ventana (ver inventory.notifications).
+        enqueue('send_alert_digests', key='send_alert_digests',
+                delay=getattr(settings, 'ALERT_DIGEST_WINDOW', 60 * 15))
+
+
+def resolve_alerts(queryset):
+    """Marca como resueltas (por el sistema) las alertas activas de `queryset` con un único UPDATE."""
+    from .events import publish_alerts_resolved
+
+    active = queryset.filter(resolved=False)
+    alert_ids = list(active.values_list('pk', flat=True))
+    if not alert_ids:
+        return 0
+    now = timezone.now()
+    resolved = active.update(
+        resolved=True,
+        resolved_by_user=None, # O podrías buscar un usuario 'sistema' si lo creas.
+        resolved_timestamp=now,
+    )
+    publish_alerts_resolved(alert_ids, now)
+    return resolved
+
+
+def products_missing_alert(queryset=None):
+    """Productos con stock bajo (<= mínimo) sin alerta activa."""
+    if queryset is None:
+        queryset = Product.objects.all()
+    return (queryset
+            .low_stock()
+            .exclude(Exists(StockAlert.objects.filter(product=OuterRef('pk'), resolved=False))))
+
+
+def alerts_to_resolve(queryset=None):
+    """Alertas activas de productos (de `queryset`) cuyo stock ya supera el mínimo."""
+    alerts = StockAlert.objects.filter(resolved=False, product__current_stock__gt=F('product__minimum_stock_level'))
+    if queryset is not None:
+        alerts = alerts.filter(product__in=queryset.values('pk'))
+    return alerts
+
+
+def reconcile_alerts(queryset=None):
+    """
+    Re-evalúa las alertas de los productos de `queryset` (todos por defecto)
+    según su stock actual, en bloque: crea las alertas que faltan y resuelve
+    las de productos que ya superan el mínimo.
+
+    Se usa tras escrituras que no pasan por Product.save() (update(),
+    bulk_update(), importaciones). Devuelve (alertas creadas, alertas resueltas).
+    """
+    from .dashboard import invalidate_dashboard
+
+    with transaction.atomic():
+        missing = list(products_missing_alert(queryset).values_list('pk', 'current_stock'))
+        if missing:
+            create_alerts(missing)
+        resolved = resolve_alerts(alerts_to_resolve(queryset))
+        if missing or resolved:
+            invalidate_dashboard()
+    return len(missing), resolved
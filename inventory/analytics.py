@@ -0,0 +1,183 @@
+"""
+Consumo diario por producto y días de cobertura del stock.
+
+Las series de consumo (ventas del resumen DailyProductSales y salidas de
+StockMovement, agrupadas por día) se leen en una sola consulta y se vuelcan
+en una matriz NumPy producto × día, sobre la que se calculan a la vez para
+todo el catálogo:
+
+- consumo medio diario de la ventana (ANALYSIS_DAYS días),
+- media móvil de ROLLING_DAYS días y su tendencia (última media frente a la
+  de ROLLING_DAYS días antes),
+- media móvil exponencial (EWMA, span EWMA_SPAN), que pondera más los días
+  recientes y es la que se usa como previsión de consumo.
+
+La ventana termina ayer (días completos), así que el resultado es el mismo
+durante todo el día y se guarda en la caché con la fecha en la clave. Los
+días de cobertura dependen del stock actual y se calculan al mostrar cada
+producto (stock actual / EWMA). Las correcciones con fecha pasada se
+reflejan al día siguiente.
+
+Las ventas se leen del resumen tal como esté: lo mantiene al día la tarea
+refresh_sales_rollup, no esta lectura. Si la ventana aún tiene sesiones sin
+resumir, el resultado se guarda solo ANALYTICS_STALE_CACHE_TIMEOUT segundos
+para recalcularlo en cuanto la tarea las incorpore. consumption_stamp()
+identifica el resultado en caché, para las páginas cacheadas que lo muestran.
+"""
+import datetime
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyProductSales, StockMovement
+from .rollups import pending_refresh
+from .snapshots import day_start
+
+ANALYSIS_DAYS = 28
+ROLLING_DAYS = 7
+EWMA_SPAN = 7
+
+# v2: (huella, estadísticas); la caché en fichero puede conservar entradas del formato anterior.
+ANALYTICS_CACHE_KEY = 'inventory:analytics:consumption:v2:{date}'
+
+# Consumo diario de un producto (en su unidad de medida): media de la ventana,
+# media móvil de los últimos ROLLING_DAYS días, EWMA y tendencia de la media
+# móvil en % (None si no había consumo ROLLING_DAYS días antes).
+ConsumptionStats = namedtuple('ConsumptionStats', ['average', 'rolling', 'ewma', 'trend'])
+
+
+def get_consumption_stats():
+    """{product_id: ConsumptionStats} de los productos con consumo, desde la caché si es posible."""
+    return _cached_consumption_stats()[1]
+
+
+def consumption_stamp():
+    """
+    Huella del resultado actual de get_consumption_stats(): cambia si un
+    recálculo durante el día da otro resultado.
+    """
+    return _cached_consumption_stats()[0]
+
+
+def _cached_consumption_stats():
+    """(huella, estadísticas) de hoy, calculadas y guardadas si no están en la caché."""
+    today = timezone.localdate()
+    key = ANALYTICS_CACHE_KEY.format(date=today.isoformat())
+    cached = cache.get(key)
+    if cached is None:
+        end_date = today - datetime.timedelta(days=1)
+        stats = compute_consumption_stats(end_date)
+        stamp = hashlib.md5(repr(sorted(stats.items())).encode()).hexdigest()
+        cached = (stamp, stats)
+        timeout = getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 60 * 60 * 24)
+        if pending_consumption(end_date)['sessions']:
+            timeout = min(timeout, getattr(settings, 'ANALYTICS_STALE_CACHE_TIMEOUT', 60))
+        cache.set(key, cached, timeout)
+    return cached
+
+
+def pending_consumption(end_date=None, days=ANALYSIS_DAYS):
+    """
+    Sesiones de la ventana de análisis (por defecto la de
+    get_consumption_stats()) que aún no están en el resumen de ventas.
+    """
+    if end_date is None:
+        end_date = timezone.localdate() - datetime.timedelta(days=1)
+    return pending_refresh(end_date - datetime.timedelta(days=days - 1), end_date)
+
+
+def compute_consumption_stats(end_date, days=ANALYSIS_DAYS):
+    """
+    Calcula las estadísticas de consumo de los `days` días que terminan en
+    `end_date` (incluido). Los productos sin consumo en la ventana no aparecen.
+    """
+    product_ids, matrix = consumption_matrix(end_date, days)
+    if not len(product_ids):
+        return {}
+
+    average = matrix.mean(axis=1)
+
+    # Medias móviles de todas las ventanas de ROLLING_DAYS días a la vez (sumas acumuladas).
+    cumulative = np.cumsum(np.pad(matrix, ((0, 0), (1, 0))), axis=1)
+    rolling = (cumulative[:, ROLLING_DAYS:] - cumulative[:, :-ROLLING_DAYS]) / ROLLING_DAYS
+    current = rolling[:, -1]
+    if rolling.shape[1] > ROLLING_DAYS:
+        previous = rolling[:, -1 - ROLLING_DAYS]
+    else:
+        previous = np.zeros_like(current)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trend = np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+
+    # EWMA normalizada: peso (1 - alpha)^k para el día k días antes de end_date.
+    alpha = 2 / (EWMA_SPAN + 1)
+    weights = (1 - alpha) ** np.arange(days - 1, -1, -1)
+    ewma = matrix @ weights / weights.sum()
+
+    return {
+        int(pk): ConsumptionStats(float(avg), float(roll), float(ew), None if np.isnan(tr) else float(tr))
+        for pk, avg, roll, ew, tr in zip(product_ids, average, current, ewma, trend)
+        if avg > 0
+    }
+
+
+def consumption_matrix(end_date, days=ANALYSIS_DAYS):
+    """
+    Devuelve (product_ids, matriz) con el consumo (ventas + salidas) de cada
+    producto en cada uno de los `days` días que terminan en `end_date`: fila i
+    = product_ids[i], columna j = día (end_date - days + 1 + j). Solo incluye
+    los productos con consumo en la ventana.
+    """
+    start_date = end_date - datetime.timedelta(days=days - 1)
+    sales = (DailyProductSales.objects
+             .filter(sale_date__gte=start_date, sale_date__lte=end_date)
+             .values_list('product_id', 'sale_date', 'quantity_sold'))
+    movements = (StockMovement.objects
+                 .filter(movement_type='OUT',
+                         movement_date__gte=day_start(start_date),
+                         movement_date__lt=day_start(end_date + datetime.timedelta(days=1)))
+                 .annotate(day=TruncDate('movement_date'))
+                 .order_by()
+                 .values('product_id', 'day')
+                 .annotate(total=Sum('quantity'))
+                 .values_list('product_id', 'day', 'total'))
+    rows = list(sales.order_by().union(movements, all=True))
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.zeros((0, days))
+
+    product_col, date_col, quantity_col = zip(*rows)
+    product_col = np.fromiter(product_col, dtype=np.int64, count=len(rows))
+    day_col = np.fromiter(((d - start_date).days for d in date_col), dtype=np.int64, count=len(rows))
+    quantity_col = np.fromiter(quantity_col, dtype=np.float64, count=len(rows))
+
+    product_ids, rows_index = np.unique(product_col, return_inverse=True)
+    matrix = np.zeros((len(product_ids), days))
+    np.add.at(matrix, (rows_index, day_col), quantity_col)
+    return product_ids, matrix
+
+
+def attach_consumption(products, stats=None):
+    """
+    Añade a cada producto `consumption` (ConsumptionStats o None) y
+    `days_of_cover` (días que dura el stock actual al ritmo de la EWMA, o None
+    si no hay consumo). Devuelve la lista de productos.
+    """
+    if stats is None:
+        stats = get_consumption_stats()
+    products = list(products)
+    for product in products:
+        product.consumption = stats.get(product.pk)
+        product.days_of_cover = days_of_cover(product.current_stock, product.consumption)
+    return products
+
+
+def days_of_cover(stock, consumption):
+    """Días que dura `stock` al ritmo de consumo previsto (EWMA); None si no hay consumo."""
+    if consumption is None or consumption.ewma <= 0:
+        return None
+    return max(float(stock), 0.0) / consumption.ewma
@@ -0,0 +1,130 @@
+"""
+API JSON de solo lectura (v1) para los clientes que consultan cada pocos
+segundos (tabletas del TPV, pantalla de alertas).
+
+Cada recurso tiene dos partes:
+
+- `<recurso>_validators()`: una consulta agregada barata (COUNT / MAX, sin
+  leer filas) que devuelve (etag, last_modified). Con ellos la vista
+  responde 304 Not Modified sin cargar ni serializar nada más.
+- `<recurso>_payload()`: el contenido completo, solo si ha cambiado.
+
+El ETag de los productos se basa en Product.last_updated (que también
+actualizan los UPDATE de stock en bloque y ProductQuerySet.update) más el
+número de productos y el id máximo, para detectar altas y bajas.
+"""
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import DailySalesSession, Product, StockAlert
+
+API_VERSION = 1
+
+ALERT_STATUSES = ('active', 'resolved', 'all')
+# Alertas resueltas devueltas como máximo (las activas se devuelven todas).
+ALERT_LIMIT = 200
+
+# Cuerpo JSON serializado de cada versión (el ETag identifica recurso y versión).
+API_CACHE_KEY = 'inventory:api:{etag}'
+
+
+def products_validators():
+    state = Product.objects.aggregate(count=Count('pk'), last_id=Max('pk'), last_updated=Max('last_updated'))
+    return _etag('products', state['count'], state['last_id'], state['last_updated']), state['last_updated']
+
+
+def products_payload():
+    return {
+        'version': API_VERSION,
+        'productos': [
+            {
+                'id': pk,
+                'nombre': name,
+                'unidad': unit,
+                'stock': stock,
+                'stock_minimo': minimum,
+                'stock_bajo': stock <= minimum,
+                'proveedor_id': supplier_id,
+                'actualizado': last_updated,
+            }
+            for pk, name, unit, stock, minimum, supplier_id, last_updated in (
+                Product.objects.order_by('name', 'pk').values_list(
+                    'pk', 'name', 'unit_of_measurement', 'current_stock', 'minimum_stock_level',
+                    'supplier_id', 'last_updated'))
+        ],
+    }
+
+
+def alerts_queryset(status):
+    alerts = StockAlert.objects.all()
+    if status == 'active':
+        return alerts.filter(resolved=False)
+    if status == 'resolved':
+        return alerts.filter(resolved=True)
+    return alerts
+
+
+def alerts_validators(status):
+    """
+    Las alertas solo cambian al crearse (id y alert_timestamp nuevos) o al
+    resolverse / reabrirse (cambia el número de activas y resolved_timestamp).
+    """
+    state = alerts_queryset(status).aggregate(
+        count=Count('pk'), active=Count('pk', filter=Q(resolved=False)), last_id=Max('pk'),
+        last_alert=Max('alert_timestamp'), last_resolved=Max('resolved_timestamp'),
+    )
+    last_modified = max(filter(None, (state['last_alert'], state['last_resolved'])), default=None)
+    etag = _etag(f'alerts-{status}', state['count'], state['active'], state['last_id'], last_modified)
+    return etag, last_modified
+
+
+def alerts_payload(status):
+    """Alertas más recientes primero (todas las activas; como mucho ALERT_LIMIT si incluye resueltas)."""
+    alerts = alerts_queryset(status).order_by('-alert_timestamp', '-pk')
+    if status != 'active':
+        alerts = alerts[:ALERT_LIMIT]
+    return {
+        'version': API_VERSION,
+        'alertas': [
+            {
+                'id': pk,
+                'producto_id': product_id,
+                'stock_al_alertar': stock,
+                'fecha': timestamp,
+                'resuelta': resolved,
+                'fecha_resolucion': resolved_timestamp,
+            }
+            for pk, product_id, stock, timestamp, resolved, resolved_timestamp in alerts.values_list(
+                'pk', 'product_id', 'current_stock_at_alert', 'alert_timestamp', 'resolved', 'resolved_timestamp')
+        ],
+    }
+
+
+def today_session_state():
+    """Totales de la sesión de hoy (una fila, ya desnormalizados) o None si no existe."""
+    return (DailySalesSession.objects.filter(sale_date=timezone.localdate())
+            .values('pk', 'sale_date', 'total_revenue', 'total_quantity', 'item_count').first())
+
+
+def today_session_validators(state):
+    if state is None:
+        return _etag('sales-today', timezone.localdate()), None
+    return _etag('sales-today', state['sale_date'], state['pk'], state['total_revenue'],
+                 state['total_quantity'], state['item_count']), None
+
+
+def today_session_payload(state):
+    return {
+        'version': API_VERSION,
+        'fecha': timezone.localdate() if state is None else state['sale_date'],
+        'sesion_id': state['pk'] if state else None,
+        'ingresos': state['total_revenue'] if state else 0,
+        'cantidad': state['total_quantity'] if state else 0,
+        'items': state['item_count'] if state else 0,
+    }
+
+
+def _etag(*parts):
+    return f'v{API_VERSION}-' + '-'.join(
+        str(part.timestamp()) if hasattr(part, 'timestamp') else str(part) for part in parts
+    )
@@ -0,0 +1,49 @@
+"""
+Consultas concurrentes para las vistas async (dashboard, informe de ventas).
+
+El ORM async de Django (aaggregate, afirst, ...) ejecuta cada consulta con
+sync_to_async(thread_sensitive=True): todas pasan por el mismo hilo y la
+misma conexión, así que asyncio.gather sobre ellas las ejecuta una detrás de
+otra. gather_queries() ejecuta cada función en un hilo de un ejecutor
+propio, con su propia conexión, de modo que las consultas independientes van
+en paralelo y el tiempo total es el de la más lenta, no la suma.
+
+Cada hilo usa otra conexión, así que las funciones solo deben leer. Dentro
+de una transacción (pruebas, el comando benchmark) esas conexiones no verían
+sus cambios sin confirmar y las funciones se ejecutan una tras otra en la
+conexión de la petición. ASYNC_DB_WORKERS acota los hilos y, por tanto, las
+conexiones persistentes adicionales por proceso.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'ASYNC_DB_WORKERS', 4),
+                              thread_name_prefix='cafecentral-db')
+
+
+async def gather_queries(*funcs):
+    """Ejecuta en paralelo las funciones síncronas `funcs` y devuelve sus resultados en orden."""
+    if await sync_to_async(_in_transaction)():
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(*(
+        sync_to_async(_run_query, thread_sensitive=False, executor=executor)(func) for func in funcs
+    ))
+
+
+def _in_transaction():
+    # Se ejecuta en el hilo de la petición, el de su conexión.
+    return connection.in_atomic_block
+
+
+def _run_query(func):
+    # Como al empezar y terminar una petición: descarta las conexiones caducadas
+    # (CONN_MAX_AGE) o con errores y conserva las que siguen siendo válidas.
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
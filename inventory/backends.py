@@ -0,0 +1,51 @@
+"""
+Backend de autenticación de CafeCentral.
+
+Todas las páginas consultan el rol del usuario (RoleRequiredMixin,
+role_required, is_owner / is_admin / is_employee y la barra lateral de
+base.html). ModelBackend carga el usuario de la sesión sin su rol, así que el
+primer acceso a user.role costaba una consulta más en cada petición; aquí se
+cargan juntos con un JOIN.
+
+El rol se lee de la base de datos en cada petición junto con el usuario, de
+modo que un cambio de rol (UserUpdateView, el admin) se aplica en la
+siguiente petición sin invalidar nada. Guardarlo en la sesión no ahorraría
+ninguna consulta: el usuario se lee igualmente en cada petición.
+
+La sesión guarda la ruta del backend con el que se inició.
+SessionBackendMiddleware pasa a RoleModelBackend las sesiones iniciadas con
+ModelBackend, que así ni se cierran ni siguen cargando el rol aparte.
+"""
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.utils.deprecation import MiddlewareMixin
+
+ROLE_BACKEND = 'inventory.backends.RoleModelBackend'
+LEGACY_BACKENDS = {'django.contrib.auth.backends.ModelBackend'}
+
+
+class RoleModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('role').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # Usado por request.auser() en las vistas async.
+        UserModel = get_user_model()
+        try:
+            user = await UserModel._default_manager.select_related('role').aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class SessionBackendMiddleware(MiddlewareMixin):
+    """Sesiones de LEGACY_BACKENDS a RoleModelBackend. Va antes de AuthenticationMiddleware."""
+
+    def process_request(self, request):
+        if request.session.get(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+            request.session[BACKEND_SESSION_KEY] = ROLE_BACKEND
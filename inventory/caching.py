@@ -0,0 +1,107 @@
+"""
+Caché de páginas por rol con versiones por modelo.
+
+Cada modelo cacheable tiene un contador de versión en la caché de Django
+(`inventory:version:<app.modelo>`) que se incrementa al confirmarse cualquier
+escritura: post_save / post_delete (ver inventory.signals) y los flujos de
+escritura en bloque, que llaman a bump_versions() junto a
+invalidate_dashboard(). Las claves de la caché incluyen las versiones de los
+modelos que muestra cada página, así que un cambio invalida exactamente las
+entradas afectadas; el TIMEOUT solo acota la memoria usada.
+
+Solo se cachea el bloque de contenido de la página, nunca base.html: la
+cabecera lleva el nombre del usuario y el token CSRF del formulario de
+cierre de sesión, que no se pueden compartir entre usuarios del mismo rol.
+"""
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .replicas import replica_cache_timeout
+
+VERSION_KEY = 'inventory:version:{label}'
+CONTENT_CACHE_KEY = 'inventory:content:{view}:{role}:{date}:{versions}:{path}'
+
+
+def model_versions(*models):
+    """Versiones actuales de `models`, unidas en una cadena para las claves de caché."""
+    keys = [VERSION_KEY.format(label=model._meta.label_lower) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Valor inicial basado en el reloj: si la caché pierde el contador,
+            # las entradas guardadas con el valor anterior no se vuelven a usar.
+            initial = time.time_ns()
+            cache.add(key, initial, None)
+            versions[key] = cache.get(key, initial)
+    return '-'.join(str(versions[key]) for key in keys)
+
+
+def bump_versions(*models):
+    """
+    Incrementa las versiones de `models` cuando la transacción actual se
+    confirme (así ninguna petición concurrente guarda datos previos con la
+    versión nueva).
+    """
+    transaction.on_commit(partial(bump_versions_now, *models))
+
+
+def bump_versions_now(*models):
+    """Incrementa inmediatamente las versiones de `models`."""
+    for model in models:
+        key = VERSION_KEY.format(label=model._meta.label_lower)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+class CachedContentMixin:
+    """
+    Sirve desde la caché el bloque de contenido de una vista GET que solo
+    depende del rol del usuario, de la URL y de los modelos `cache_models`.
+
+    En un acierto no se ejecuta get_queryset() / get_object() ni
+    get_context_data(): solo se renderiza base.html alrededor del HTML
+    guardado. La plantilla de la vista debe extender
+    `{{ base_template|default:'base.html' }}` para poder renderizar su bloque
+    de contenido por separado.
+    """
+    cache_models = ()
+    page_template_name = 'inventory/_cached_page.html'
+    content_base_template = 'inventory/_content_only.html'
+
+    def get_content_cache_key(self):
+        # La versión de la plantilla depende del rol (botones de OWNER / ADMIN),
+        # nunca del usuario concreto. La fecha separa los datos "de hoy".
+        return CONTENT_CACHE_KEY.format(
+            view=type(self).__name__,
+            role=self.request.user.role.name,
+            date=timezone.localdate().isoformat(),
+            versions=model_versions(*self.cache_models),
+            path=hashlib.md5(self.request.get_full_path().encode()).hexdigest(),
+        )
+
+    def get(self, request, *args, **kwargs):
+        # La clave (con las versiones) se lee antes que los datos: si una
+        # escritura se confirma entre medias, el resultado se guarda con la
+        # versión anterior y nadie lo vuelve a leer.
+        key = self.get_content_cache_key()
+        page = cache.get(key)
+        if page is None:
+            context = super().get(request, *args, **kwargs).context_data
+            context['base_template'] = self.content_base_template
+            page = {
+                'page_title': context.get('page_title', ''),
+                'content': render_to_string(self.template_name, context, request),
+            }
+            # Leído de la réplica, puede ser anterior a la versión de la clave.
+            cache.set(key, page, replica_cache_timeout(getattr(settings, 'CONTENT_CACHE_TIMEOUT', 60 * 5)))
+        return render(request, self.page_template_name, page)
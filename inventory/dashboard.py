@@ -0,0 +1,110 @@
+"""
+Métricas del dashboard (página de inicio).
+
+Las métricas se calculan con conteos pequeños (cinco consultas, cada una
+sobre su índice, sin listas que crezcan con el catálogo) y se sirven desde la caché de Django. La
+caché se invalida explícitamente cuando cambian productos, alertas, ventas o
+usuarios (ver inventory.signals y los flujos de escritura en bloque de
+inventory.stock / inventory.sales), de forma que el dashboard nunca muestra
+datos desactualizados más allá de DASHBOARD_CACHE_TIMEOUT si otro proceso
+no comparte la misma caché.
+
+La página de inicio es una vista async y usa aget_dashboard_metrics(), que
+lanza a la vez todas las consultas (ver inventory.asyncdb).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import CustomUser, DailySalesSession, Product, StockAlert
+from .replicas import replica_cache_timeout
+
+DASHBOARD_CACHE_KEY = 'inventory:dashboard:metrics:{date}'
+
+
+def get_dashboard_metrics():
+    """Devuelve el diccionario de métricas del dashboard, desde la caché si es posible."""
+    key = DASHBOARD_CACHE_KEY.format(date=timezone.localdate().isoformat())
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = compute_dashboard_metrics()
+        cache.set(key, metrics, replica_cache_timeout(getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)))
+    return metrics
+
+
+async def aget_dashboard_metrics():
+    """
+    Versión async de get_dashboard_metrics(): si no están en caché, las
+    consultas independientes se ejecutan en paralelo (ver inventory.asyncdb).
+    """
+    from .asyncdb import gather_queries
+
+    key = DASHBOARD_CACHE_KEY.format(date=timezone.localdate().isoformat())
+    metrics = await cache.aget(key)
+    if metrics is None:
+        metrics = _merge_metrics(*await gather_queries(*METRIC_QUERIES))
+        await cache.aset(key, metrics, replica_cache_timeout(getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)))
+    return metrics
+
+
+def compute_dashboard_metrics():
+    """Calcula las métricas del dashboard directamente en la base de datos."""
+    return _merge_metrics(*(query() for query in METRIC_QUERIES))
+
+
+def _product_metrics():
+    return {'total_products': Product.objects.count()}
+
+
+def _low_stock_metrics():
+    # low_stock() filtra por el índice de expresión del margen de stock.
+    return {'products_low_stock_count': Product.objects.low_stock().count()}
+
+
+def _alert_metrics():
+    # Solo las activas (índice parcial), sin recorrer el histórico de alertas.
+    return {'active_stock_alerts_count': StockAlert.objects.filter(resolved=False).count()}
+
+
+def _user_metrics():
+    return CustomUser.objects.aggregate(
+        owner_count=Count('pk', filter=Q(role__name='OWNER')),
+        admin_count=Count('pk', filter=Q(role__name='ADMIN')),
+        employee_count=Count('pk', filter=Q(role__name='EMPLOYEE')),
+    )
+
+
+def _today_session():
+    return (DailySalesSession.objects.filter(sale_date=timezone.localdate())
+            .values('pk', 'total_revenue', 'total_quantity').first())
+
+
+# Consultas independientes entre sí: la versión async las lanza a la vez.
+METRIC_QUERIES = (_product_metrics, _low_stock_metrics, _alert_metrics, _user_metrics, _today_session)
+
+
+def _merge_metrics(*results):
+    *counts, today_session = results
+    metrics = {key: value for result in counts for key, value in result.items()}
+    return {
+        **metrics,
+        'today_sales_session_exists': today_session is not None,
+        'today_sales_session_pk': today_session['pk'] if today_session else None,
+        'total_revenue_today': today_session['total_revenue'] if today_session else 0,
+        'total_items_sold_today': today_session['total_quantity'] if today_session else 0,
+    }
+
+
+def invalidate_dashboard():
+    """
+    Descarta las métricas en caché cuando la transacción actual se confirme
+    (así ninguna petición concurrente vuelve a guardar en caché datos previos).
+    """
+    transaction.on_commit(clear_dashboard_cache)
+
+
+def clear_dashboard_cache():
+    """Descarta inmediatamente las métricas en caché."""
+    cache.delete(DASHBOARD_CACHE_KEY.format(date=timezone.localdate().isoformat()))
@@ -0,0 +1,56 @@
+"""
+Métricas del pool de conexiones de PostgreSQL (DATABASE_POOL=True en los
+settings; ver cafe_central_project.settings).
+
+psycopg_pool lleva sus propios contadores acumulados desde que se abrió el
+pool del proceso; pool_stats() los traduce a lo que interesa vigilar:
+
+- saturación: conexiones en uso frente al máximo del pool;
+- peticiones que tuvieron que esperar (sin conexión libre) y su espera media;
+- timeouts: peticiones que no consiguieron conexión en DATABASE_POOL_TIMEOUT;
+- conexiones rotas devueltas o descartadas por la comprobación de salud.
+
+Sin pool (SQLite, o PostgreSQL con conexiones persistentes) devuelve None.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def pool_enabled(alias=DEFAULT_DB_ALIAS):
+    return bool(connections[alias].settings_dict.get('OPTIONS', {}).get('pool'))
+
+
+def pool_stats(alias=DEFAULT_DB_ALIAS, reset=False):
+    """
+    Contadores del pool de `alias` en este proceso, o None si no usa pool.
+    Con `reset`, los contadores acumulados vuelven a cero tras leerlos (para
+    medir un intervalo, como hace `benchmark_pool`).
+    """
+    if not pool_enabled(alias):
+        return None
+    pool = connections[alias].pool
+    stats = pool.pop_stats() if reset else pool.get_stats()
+    # Django abre el pool con la primera conexión; antes, pool_size es el
+    # tamaño previsto (min_size), no conexiones reales.
+    size = 0 if pool.closed else stats.get('pool_size', 0)
+    available = stats.get('pool_available', 0)
+    maximum = stats.get('pool_max', 0)
+    queued = stats.get('requests_queued', 0)
+    wait_ms = stats.get('requests_wait_ms', 0)
+    return {
+        'minimo': stats.get('pool_min', 0),
+        'maximo': maximum,
+        'abiertas': size,
+        'libres': available,
+        'en_uso': size - available,
+        'saturacion': round((size - available) / maximum, 3) if maximum else 0,
+        'esperando': stats.get('requests_waiting', 0),
+        'peticiones': stats.get('requests_num', 0),
+        'peticiones_en_espera': queued,
+        'espera_total_ms': wait_ms,
+        'espera_media_ms': round(wait_ms / queued, 1) if queued else 0,
+        'timeouts': stats.get('requests_errors', 0),
+        'conexiones_abiertas_total': stats.get('connections_num', 0),
+        'conexiones_fallidas': stats.get('connections_errors', 0),
+        'conexiones_perdidas': stats.get('connections_lost', 0),
+        'devueltas_rotas': stats.get('returns_bad', 0),
+    }
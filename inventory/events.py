@@ -0,0 +1,222 @@
+"""
+Eventos en vivo de alertas y stock (server-sent events).
+
+Las escrituras publican un evento por lote de cambios (alertas creadas o
+resueltas, stock de los productos tocados) al confirmarse la transacción. Un
+EventBroker en memoria del proceso guarda los últimos EVENT_BUFFER_SIZE
+eventos con un id creciente y despierta a los clientes conectados, así que
+el trabajo del servidor crece con los cambios y no con las alertas, los
+clientes o los refrescos de página.
+
+Cada cliente reanuda desde su último id (cabecera Last-Event-ID, que el
+navegador envía al reconectar). Si ese id ya no está en el búfer o es de
+otro arranque del proceso, recibe un evento `reset` y recarga la página.
+
+El stream solo se sirve con ASGI (astream): cada cliente conectado es una
+corrutina en espera. Con WSGI cada conexión ocuparía un hilo del servidor
+durante STREAM_SECONDS, así que la vista responde 204 y la página se queda
+sin feed en vivo (ver is_live()).
+
+El broker es local al proceso: con varios procesos, cada uno solo ve sus
+escrituras. EventBroker define la interfaz (publish / since /
+await_events) que implementaría un broker compartido.
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Product, StockAlert
+
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión.
+HEARTBEAT_SECONDS = 15
+# Duración máxima de una conexión; el navegador reconecta solo (con Last-Event-ID).
+STREAM_SECONDS = 300
+# Milisegundos que espera el navegador antes de reconectar.
+RETRY_MS = 1000
+
+Event = namedtuple('Event', 'id type data')
+
+
+class EventBroker:
+    """Pub/sub en memoria: búfer circular de eventos y notificación a los suscriptores."""
+
+    def __init__(self, size):
+        # Distingue los ids de este arranque de los de uno anterior.
+        self.epoch = uuid.uuid4().hex[:8]
+        self._events = deque(maxlen=size)
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, type, data):
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, type, data)
+            self._events.append(event)
+            waiters = list(self._waiters)
+        for loop, flag in waiters:
+            try:
+                loop.call_soon_threadsafe(flag.set)
+            except RuntimeError:
+                pass  # Bucle ya cerrado: su suscripción se retira al terminar el stream.
+        return event
+
+    def since(self, last_id):
+        """Eventos posteriores a `last_id`, o None si ya no están todos en el búfer."""
+        with self._lock:
+            if last_id > self._last_id:
+                return None
+            first_id = self._events[0].id if self._events else self._last_id + 1
+            if last_id < first_id - 1:
+                return None
+            return list(islice(self._events, max(0, last_id - first_id + 1), None))
+
+    async def await_events(self, last_id, timeout):
+        """Espera (sin bloquear el bucle) eventos posteriores a `last_id`; False si pasa `timeout`."""
+        flag = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), flag)
+        with self._lock:
+            if self._last_id > last_id:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(flag.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+broker = EventBroker(getattr(settings, 'EVENT_BUFFER_SIZE', 1000))
+
+
+def publish(type, data):
+    """Publica el evento cuando la transacción actual se confirme (nunca cambios revertidos)."""
+    transaction.on_commit(partial(broker.publish, type, data))
+
+
+def publish_alerts_created(alerts):
+    """Publica las alertas del queryset `alerts` (recién creadas) en un solo evento y las devuelve."""
+    units = dict(Product.UNIT_CHOICES)
+    created = [
+        {
+            'id': pk,
+            'producto_id': product_id,
+            'producto': name,
+            'unidad': units.get(unit, unit),
+            'stock_al_alertar': stock_at_alert,
+            'stock': stock,
+            'stock_minimo': minimum,
+            'fecha': timestamp,
+        }
+        for pk, product_id, name, unit, stock_at_alert, stock, minimum, timestamp in alerts.values_list(
+            'pk', 'product_id', 'product__name', 'product__unit_of_measurement', 'current_stock_at_alert',
+            'product__current_stock', 'product__minimum_stock_level', 'alert_timestamp')
+    ]
+    if created:
+        publish('alertas_creadas', created)
+    return created
+
+
+def publish_alerts_resolved(alert_ids, resolved_at, resolved_by=None):
+    publish('alertas_resueltas', {
+        'ids': list(alert_ids),
+        'fecha_resolucion': resolved_at,
+        'resuelta_por': resolved_by.username if resolved_by else None,
+    })
+
+
+def publish_alert_saved(alert, created):
+    """Alta o edición de una sola alerta (StockAlert.save(), p. ej. desde StockAlertUpdateView)."""
+    if created:
+        publish_alerts_created(StockAlert.objects.filter(pk=alert.pk))
+    elif alert.resolved:
+        publish_alerts_resolved([alert.pk], alert.resolved_timestamp, alert.resolved_by_user)
+    else:
+        publish('alertas_reabiertas', {'ids': [alert.pk]})
+
+
+def publish_alert_deleted(alert):
+    publish('alertas_eliminadas', {'ids': [alert.pk]})
+
+
+def publish_stock_changes(changes):
+    """Stock nuevo de los productos de `changes` (StockChange) en un solo evento."""
+    products = [
+        {'producto_id': c.product_id, 'stock': c.new_stock, 'stock_minimo': c.minimum_stock_level}
+        for c in changes
+    ]
+    if products:
+        publish('stock', products)
+
+
+# --- Stream SSE ---
+
+def event_id(event):
+    return event_id_at(event.id)
+
+
+def event_id_at(position):
+    """Id SSE de la posición `position` del búfer (p. ej. broker.last_id al renderizar una página)."""
+    return f'{broker.epoch}-{position}'
+
+
+def parse_event_id(value):
+    """
+    Posición en el búfer de un id recibido del cliente: broker.last_id si no
+    envía ninguno y None si no es de este arranque (el cliente debe recargar).
+    """
+    if not value:
+        return broker.last_id
+    epoch, _, number = value.partition('-')
+    if epoch != broker.epoch or not number.isdigit():
+        return None
+    return int(number)
+
+
+def is_live(request):
+    """Si la petición llega por ASGI, el único servidor con el que se sirve el stream."""
+    return isinstance(request, ASGIRequest)
+
+
+async def astream(last_id):
+    """Stream SSE async (ASGI): cada cliente conectado es solo una corrutina en espera."""
+    deadline = time.monotonic() + STREAM_SECONDS
+    yield f'retry: {RETRY_MS}\n\n'
+    while True:
+        events, last_id = _pending(last_id)
+        for chunk in events:
+            yield chunk
+        if time.monotonic() >= deadline:
+            return
+        if not events and not await broker.await_events(last_id, HEARTBEAT_SECONDS):
+            yield ': ping\n\n'
+
+
+def _pending(last_id):
+    """(mensajes SSE pendientes, nuevo último id) desde `last_id`."""
+    events = broker.since(last_id) if last_id is not None else None
+    if events is None:
+        return [_message(event_id_at(broker.last_id), 'reset', {})], broker.last_id
+    return [_message(event_id(event), event.type, event.data) for event in events], (
+        events[-1].id if events else last_id)
+
+
+def _message(id, type, data):
+    return f'id: {id}\nevent: {type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
@@ -0,0 +1,165 @@
+"""
+Exportación en streaming (CSV / NDJSON) del historial de movimientos de
+stock, ventas y alertas.
+
+Las filas se leen con iterator(chunk_size=...) (cursor del lado del servidor
+en PostgreSQL) y se escriben una a una, de modo que una exportación de
+millones de filas usa memoria constante y empieza a enviar datos de
+inmediato. La usan tanto ExportView (StreamingHttpResponse) como el comando
+`export_data`.
+"""
+import csv
+import datetime
+import json
+from collections import namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import SaleItem, StockAlert, StockMovement
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# date_field: campo por el que se filtra el rango de fechas (y se ordena).
+# columns: [(cabecera, función que extrae el valor de la fila)].
+ExportSpec = namedtuple('ExportSpec', ['filename', 'date_field', 'get_queryset', 'columns'])
+
+
+def _username(user):
+    return user.username if user else ''
+
+
+def _supplier(product):
+    return product.supplier.name if product.supplier else ''
+
+
+EXPORTS = {
+    'movements': ExportSpec(
+        filename='movimientos',
+        date_field='movement_date',
+        get_queryset=lambda: (StockMovement.objects
+                              .select_related('product__supplier', 'registered_by')
+                              .order_by('movement_date', 'pk')),
+        columns=[
+            ('id', lambda m: m.pk),
+            ('fecha', lambda m: timezone.localtime(m.movement_date)),
+            ('producto', lambda m: m.product.name),
+            ('proveedor', lambda m: _supplier(m.product)),
+            ('tipo', lambda m: m.movement_type),
+            ('cantidad', lambda m: m.quantity),
+            ('unidad', lambda m: m.product.unit_of_measurement),
+            ('descripcion', lambda m: m.description or ''),
+            ('registrado_por', lambda m: _username(m.registered_by)),
+        ],
+    ),
+    'sales': ExportSpec(
+        filename='ventas',
+        date_field='sale_session__sale_date',
+        get_queryset=lambda: (SaleItem.objects
+                              .select_related('sale_session__registered_by_user', 'product__supplier')
+                              .order_by('sale_session__sale_date', 'pk')),
+        columns=[
+            ('id', lambda i: i.pk),
+            ('sesion', lambda i: i.sale_session_id),
+            ('fecha', lambda i: i.sale_session.sale_date),
+            ('producto', lambda i: i.product.name),
+            ('proveedor', lambda i: _supplier(i.product)),
+            ('cantidad', lambda i: i.quantity_sold),
+            ('precio_unitario', lambda i: i.price_at_sale),
+            ('subtotal', lambda i: i.subtotal),
+            ('registrado_por', lambda i: _username(i.sale_session.registered_by_user)),
+        ],
+    ),
+    'alerts': ExportSpec(
+        filename='alertas',
+        date_field='alert_timestamp',
+        get_queryset=lambda: (StockAlert.objects
+                              .select_related('product__supplier', 'resolved_by_user')
+                              .order_by('alert_timestamp', 'pk')),
+        columns=[
+            ('id', lambda a: a.pk),
+            ('fecha_alerta', lambda a: timezone.localtime(a.alert_timestamp)),
+            ('producto', lambda a: a.product.name),
+            ('proveedor', lambda a: _supplier(a.product)),
+            ('stock_en_alerta', lambda a: a.current_stock_at_alert),
+            ('stock_minimo', lambda a: a.product.minimum_stock_level),
+            ('resuelta', lambda a: a.resolved),
+            ('fecha_resolucion', lambda a: timezone.localtime(a.resolved_timestamp) if a.resolved_timestamp else ''),
+            ('resuelta_por', lambda a: _username(a.resolved_by_user)),
+        ],
+    ),
+}
+
+
+def export_queryset(kind, start_date=None, end_date=None):
+    """
+    QuerySet de la exportación `kind` limitado al rango [start_date, end_date]
+    (fechas locales, ambas incluidas). Para campos DateTime el rango se
+    convierte a instantes, de modo que el filtro puede usar los índices.
+    """
+    spec = EXPORTS[kind]
+    queryset = spec.get_queryset()
+    field = spec.date_field
+    if _is_datetime_field(queryset.model, field):
+        if start_date:
+            queryset = queryset.filter(**{f'{field}__gte': _local_midnight(start_date)})
+        if end_date:
+            queryset = queryset.filter(**{f'{field}__lt': _local_midnight(end_date + datetime.timedelta(days=1))})
+    else:
+        if start_date:
+            queryset = queryset.filter(**{f'{field}__gte': start_date})
+        if end_date:
+            queryset = queryset.filter(**{f'{field}__lte': end_date})
+    return queryset
+
+
+def stream_export(kind, queryset, fmt):
+    """Genera el contenido de la exportación como trozos de texto (cabecera primero)."""
+    spec = EXPORTS[kind]
+    headers = [header for header, _ in spec.columns]
+    getters = [getter for _, getter in spec.columns]
+    rows = ([getter(obj) for getter in getters] for obj in queryset.iterator(chunk_size=CHUNK_SIZE))
+
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+    elif fmt == 'ndjson':
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        for row in rows:
+            yield encoder.encode(dict(zip(headers, row))) + '\n'
+    else:
+        raise ValueError(f"Formato de exportación desconocido: {fmt}")
+
+
+def export_filename(kind, fmt, start_date=None, end_date=None):
+    parts = [EXPORTS[kind].filename]
+    if start_date:
+        parts.append(f"desde_{start_date.isoformat()}")
+    if end_date:
+        parts.append(f"hasta_{end_date.isoformat()}")
+    return f"{'_'.join(parts)}.{fmt}"
+
+
+def _is_datetime_field(model, field_path):
+    *relations, name = field_path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name).get_internal_type() == 'DateTimeField'
+
+
+def _local_midnight(date):
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+class _Echo:
+    """Pseudo-fichero para csv.writer: writerow() devuelve la línea en lugar de escribirla."""
+
+    def write(self, value):
+        return value
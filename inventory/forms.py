@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm as BaseUserChangeForm
-from .models import CustomUser, Product, Role, StockMovement, Supplier, DailySalesSession, SaleItem, StockAlert
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from .models import (CustomUser, Product, Role, StockMovement, Supplier, DailySalesSession, SaleItem, StockAlert,
+                     PurchaseOrder, PurchaseOrderLine)
 from django.utils import timezone
 #import logging
 
@@ -200,6 +202,67 @@ class SupplierForm(forms.ModelForm):
             'delivery_days': 'Días de Entrega',
         }
         
+# --- FORMULARIOS PARA LA IMPORTACIÓN DE CATÁLOGO ---
+class ProductImportForm(ProductForm):
+    """
+    Fila de un fichero de importación de productos: mismas reglas que
+    ProductForm, con el proveedor indicado por su nombre (sin distinguir
+    mayúsculas). El nombre repetido no es un error (la fila actualiza el
+    producto existente).
+    """
+    supplier = forms.CharField(required=False, label='Proveedor')
+    # {nombre en minúsculas: Supplier}; lo precarga la importación una sola vez
+    # para no consultar el proveedor fila a fila.
+    suppliers = {}
+
+    def clean_supplier(self):
+        name = self.cleaned_data['supplier']
+        if not name:
+            return None
+        try:
+            return self.suppliers[name.casefold()]
+        except KeyError:
+            raise forms.ValidationError(f"El proveedor '{name}' no existe.", code='invalid_choice')
+
+    def _get_validation_exclusions(self):
+        # El proveedor ya se resolvió desde el diccionario precargado.
+        exclude = super()._get_validation_exclusions()
+        exclude.add('supplier')
+        return exclude
+
+    def validate_unique(self):
+        pass
+
+
+class SupplierImportForm(SupplierForm):
+    """Fila de un fichero de importación de proveedores (ver ProductImportForm)."""
+    def validate_unique(self):
+        pass
+
+
+class CatalogImportForm(forms.Form):
+    """Ficheros CSV/XLSX de proveedores y/o productos a importar."""
+    suppliers_file = forms.FileField(
+        label='Proveedores (CSV o XLSX)', required=False,
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.txt,.xlsx'}),
+    )
+    products_file = forms.FileField(
+        label='Productos (CSV o XLSX)', required=False,
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.txt,.xlsx'}),
+    )
+    dry_run = forms.BooleanField(
+        label='Solo validar (no guardar cambios)', required=False,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'h-5 w-5 rounded border-coffee-300 text-coffee-600 focus:ring-coffee-500'
+        }),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('suppliers_file') and not cleaned_data.get('products_file'):
+            raise forms.ValidationError("Selecciona al menos un fichero para importar.")
+        return cleaned_data
+
 # --- FORMULARIO PARA DailySalesSession ---
 class DailySalesSessionForm(forms.ModelForm):
     class Meta:
@@ -257,6 +320,157 @@ class SaleItemForm(forms.ModelForm):
 
         return cleaned_data                
 
+# --- FORMSET PARA registrar varios SaleItem de una sola vez ---
+class PreloadedProductChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField que resuelve el producto desde un diccionario precargado
+    (si lo hay) en lugar de hacer una consulta por cada fila del formset.
+    """
+    preloaded = None
+
+    def to_python(self, value):
+        if self.preloaded is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.preloaded[int(value)]
+        except (KeyError, ValueError, TypeError):
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value}
+            )
+
+
+class BatchSaleItemForm(SaleItemForm):
+    """
+    Fila del formset de ventas. Comparte las validaciones de SaleItemForm, pero
+    la unicidad (sesión, producto), dentro del lote y contra la base de datos,
+    la comprueba el formset con una sola consulta.
+    """
+    def __init__(self, *args, products=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        field = PreloadedProductChoiceField(
+            queryset=self.fields['product'].queryset,
+            label=self.fields['product'].label,
+            widget=self.fields['product'].widget,
+        )
+        field.preloaded = products
+        self.fields['product'] = field
+
+    def _get_validation_exclusions(self):
+        # El campo del formulario ya comprobó que el producto existe (precargado);
+        # así el modelo no repite un SELECT por fila al validar la clave foránea.
+        exclude = super()._get_validation_exclusions()
+        if self.fields['product'].preloaded is not None:
+            exclude.add('product')
+        return exclude
+
+    def validate_unique(self):
+        pass
+
+
+class BaseSaleItemFormSet(BaseInlineFormSet):
+    """
+    Formset para añadir varios ítems a una DailySalesSession en una sola petición.
+    """
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['products'] = self._preloaded_products
+        return kwargs
+
+    @property
+    def _preloaded_products(self):
+        # Todos los productos elegidos en el POST, cargados con una sola consulta.
+        if not self.is_bound:
+            return None
+        if not hasattr(self, '_products_cache'):
+            product_ids = set()
+            for i in range(self.total_form_count()):
+                value = self.data.get(self.add_prefix(i) + '-product')
+                if value and str(value).isdigit():
+                    product_ids.add(int(value))
+            self._products_cache = Product.objects.in_bulk(product_ids)
+        return self._products_cache
+
+    def clean(self):
+        super().clean()
+        if any(self.errors):
+            return
+        forms_by_product = {}
+        for form in self.forms:
+            product = form.cleaned_data.get('product')
+            if not product:
+                continue
+            if product.pk in forms_by_product:
+                # Un solo ítem por producto y sesión: las cantidades van en una línea.
+                form.add_error('product', f"'{product.name}' ya está en otra línea de este lote.")
+            else:
+                forms_by_product[product.pk] = form
+        # Impide vender el mismo producto dos veces en la misma sesión (una sola consulta)
+        already_sold = SaleItem.objects.filter(
+            sale_session=self.instance, product_id__in=forms_by_product
+        ).values_list('product_id', flat=True)
+        for product_id in already_sold:
+            form = forms_by_product[product_id]
+            form.add_error('product', f"'{form.cleaned_data['product'].name}' ya tiene ventas registradas en esta sesión.")
+
+
+SaleItemFormSet = inlineformset_factory(
+    DailySalesSession, SaleItem,
+    form=BatchSaleItemForm,
+    formset=BaseSaleItemFormSet,
+    fields=['product', 'quantity_sold', 'price_at_sale'],
+    extra=10,
+    can_delete=False,
+)
+
+# --- FORMULARIO PARA las líneas de un lote de sincronización de los TPV ---
+class SyncLineForm(forms.Form):
+    """
+    Una línea de un lote de sincronización (ver inventory.sync): una venta o
+    un movimiento de stock, con las mismas reglas que SaleItemForm y
+    StockMovementForm. El producto se resuelve desde los precargados del lote.
+    """
+    KIND_CHOICES = (
+        ('venta', 'Venta'),
+        ('movimiento', 'Movimiento de stock'),
+    )
+
+    clave = forms.CharField(max_length=64)
+    tipo = forms.ChoiceField(choices=KIND_CHOICES)
+    producto = PreloadedProductChoiceField(queryset=Product.objects.all())
+    cantidad = forms.DecimalField(max_digits=10, decimal_places=2)
+    precio = forms.DecimalField(max_digits=10, decimal_places=2, required=False)
+    movimiento = forms.ChoiceField(choices=StockMovement.MOVEMENT_TYPE_CHOICES, required=False)
+    descripcion = forms.CharField(required=False)
+    fecha = forms.DateTimeField(required=False) # Cuándo ocurrió en el TPV (por defecto, al recibirla)
+
+    def __init__(self, *args, products=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['producto'].preloaded = products
+
+    def clean(self):
+        cleaned_data = super().clean()
+        kind = cleaned_data.get('tipo')
+        product = cleaned_data.get('producto')
+        quantity = cleaned_data.get('cantidad')
+        price = cleaned_data.get('precio')
+
+        if quantity is not None and quantity <= 0:
+            self.add_error('cantidad', "La cantidad debe ser un valor positivo.")
+
+        if kind == 'venta':
+            if price is None:
+                self.add_error('precio', "Las ventas necesitan el precio de venta por unidad.")
+            elif price <= 0:
+                self.add_error('precio', "El precio de venta debe ser mayor que cero.")
+            elif product and price < product.price_per_unit_from_supplier:
+                self.add_error('precio', f"El precio de venta ({price}) no puede ser menor que el precio de compra ({product.price_per_unit_from_supplier}).")
+        elif kind == 'movimiento' and not cleaned_data.get('movimiento'):
+            self.add_error('movimiento', "Indica el tipo de movimiento (IN u OUT).")
+        # El stock de las salidas no se comprueba aquí sino en inventory.sync,
+        # con los productos bloqueados y contando las líneas anteriores del lote.
+
+        return cleaned_data
+
 # ---FORMULARIO PARA StockAlert ---
 class StockAlertForm(forms.ModelForm):
     class Meta:
@@ -271,6 +485,15 @@ class StockAlertForm(forms.ModelForm):
             'resolved': 'Marcar como Resuelta',
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # Solo puede haber una alerta activa por producto (índice único parcial):
+        # no se puede reabrir una alerta si el producto ya tiene otra activa.
+        if (self.instance.resolved and cleaned_data.get('resolved') is False and
+                StockAlert.objects.filter(product_id=self.instance.product_id, resolved=False).exists()):
+            raise forms.ValidationError("Este producto ya tiene una alerta activa.")
+        return cleaned_data
+
 # --- FORMULARIO PARA Role ---
 class RoleForm(forms.ModelForm):
     class Meta:
@@ -351,3 +574,71 @@ class StockMovementForm(forms.ModelForm):
                 self.add_error('quantity', f"No hay suficiente stock de '{product.name}'. Stock actual: {product.current_stock} {product.get_unit_of_measurement_display()}.")
 
         return cleaned_data
+
+# --- FORMULARIO PARA Exportaciones ---
+class ExportFilterForm(forms.Form):
+    """Rango de fechas (opcional, ambas incluidas) para las exportaciones CSV/NDJSON."""
+    start_date = forms.DateField(required=False, label='Desde', widget=forms.DateInput(attrs={
+        'type': 'date',
+        'class': 'w-full rounded-md border-coffee-300 shadow-sm focus:border-coffee-500 focus:ring focus:ring-coffee-200 focus:ring-opacity-50 text-sm',
+    }))
+    end_date = forms.DateField(required=False, label='Hasta', widget=forms.DateInput(attrs={
+        'type': 'date',
+        'class': 'w-full rounded-md border-coffee-300 shadow-sm focus:border-coffee-500 focus:ring focus:ring-coffee-200 focus:ring-opacity-50 text-sm',
+    }))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date and start_date > end_date:
+            raise forms.ValidationError("La fecha inicial no puede ser posterior a la final.")
+        return cleaned_data
+
+
+class StockAtDateForm(forms.Form):
+    """Parámetros de la consulta de stock en una fecha (?date=AAAA-MM-DD&product=<id>...)."""
+    date = forms.DateField(label='Fecha')
+    product = forms.ModelMultipleChoiceField(queryset=Product.objects.all(), required=False, label='Productos')
+
+
+class SalesReportForm(ExportFilterForm):
+    """Agrupación (semana / mes) y rango de fechas opcional del informe de ventas."""
+    PERIOD_CHOICES = (
+        ('month', 'Mensual'),
+        ('week', 'Semanal'),
+    )
+    period = forms.ChoiceField(choices=PERIOD_CHOICES, required=False, label='Agrupar por', widget=forms.Select(attrs={
+        'class': 'w-full rounded-md border-coffee-300 shadow-sm focus:border-coffee-500 focus:ring focus:ring-coffee-200 focus:ring-opacity-50 text-sm',
+    }))
+
+
+# --- FORMULARIO PARA las líneas de un pedido en borrador ---
+class PurchaseOrderLineForm(forms.ModelForm):
+    class Meta:
+        model = PurchaseOrderLine
+        fields = ['quantity']
+        widgets = {
+            'quantity': forms.NumberInput(attrs={
+                'step': '0.01',
+                'class': 'w-32 rounded-md border-coffee-300 shadow-sm focus:border-coffee-500 focus:ring focus:ring-coffee-200 focus:ring-opacity-50 text-sm',
+            }),
+        }
+        labels = {
+            'quantity': 'Cantidad',
+        }
+
+    def clean_quantity(self):
+        quantity = self.cleaned_data['quantity']
+        if quantity < 0:
+            raise forms.ValidationError("La cantidad no puede ser negativa.")
+        return quantity
+
+
+PurchaseOrderLineFormSet = inlineformset_factory(
+    PurchaseOrder, PurchaseOrderLine,
+    form=PurchaseOrderLineForm,
+    fields=['quantity'],
+    extra=0,
+    can_delete=True,
+)
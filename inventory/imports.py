@@ -0,0 +1,383 @@
+"""
+Importación masiva del catálogo (proveedores y productos) desde CSV o XLSX.
+
+Cada fila se valida con las mismas reglas que los formularios de la interfaz
+(ProductForm / SupplierForm), por bloques y sin consultas por fila: los
+nombres existentes y los proveedores se cargan una vez por bloque o por
+importación. Las filas válidas se insertan o actualizan por nombre:
+
+- PostgreSQL: COPY a una tabla temporal y un único INSERT ... ON CONFLICT.
+- Resto de motores: bulk_create(update_conflicts=True) por bloque.
+
+Al terminar, las alertas de los productos importados (y solo de ellos) se
+re-evalúan en bloque (reconcile_alerts) en lugar de producto a producto. Las filas con errores no se importan y se
+devuelven con su número de fila. La usan CatalogImportView y el comando
+`import_catalog`.
+"""
+import csv
+import io
+import os
+from collections import namedtuple
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.forms import HiddenInput, modelform_factory
+
+from .caching import bump_versions
+from .forms import ProductImportForm, SupplierImportForm
+from .models import Product, Supplier
+
+CHUNK_SIZE = 1000
+
+# aliases: cabeceras alternativas aceptadas para cada campo, además del
+# nombre del campo y de la etiqueta del formulario.
+ImportSpec = namedtuple('ImportSpec', ['label', 'model', 'form_class', 'aliases'])
+
+IMPORTS = {
+    'suppliers': ImportSpec(
+        label='Proveedores',
+        model=Supplier,
+        form_class=SupplierImportForm,
+        aliases={
+            'nombre': 'name',
+            'proveedor': 'name',
+            'contacto': 'contact_person',
+            'telefono': 'phone',
+            'email': 'email',
+            'correo': 'email',
+            'direccion': 'address',
+            'dias_entrega': 'delivery_days',
+        },
+    ),
+    'products': ImportSpec(
+        label='Productos',
+        model=Product,
+        form_class=ProductImportForm,
+        aliases={
+            'nombre': 'name',
+            'producto': 'name',
+            'descripcion': 'description',
+            'unidad': 'unit_of_measurement',
+            'stock': 'current_stock',
+            'stock_actual': 'current_stock',
+            'stock_minimo': 'minimum_stock_level',
+            'precio': 'price_per_unit_from_supplier',
+            'precio_compra': 'price_per_unit_from_supplier',
+            'proveedor': 'supplier',
+        },
+    ),
+}
+
+
+class ImportResult:
+    """Resumen de una importación: filas creadas, actualizadas y errores por fila."""
+
+    def __init__(self, kind, ignored_columns=()):
+        self.kind = kind
+        self.label = IMPORTS[kind].label
+        self.ignored_columns = list(ignored_columns)
+        self.created = 0
+        self.updated = 0
+        self.errors = []  # [(fila, [mensajes])]
+        self.alerts_created = 0
+        self.alerts_resolved = 0
+        self.dry_run = False
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+    def add_error(self, row, messages):
+        self.errors.append((row, list(messages)))
+
+
+def import_catalog(kind, file, filename, dry_run=False):
+    """
+    Importa el fichero `file` (binario, CSV o XLSX según la extensión de
+    `filename`) como `kind` ('suppliers' o 'products'). Con dry_run se valida
+    y se escribe todo dentro de una transacción que después se revierte.
+
+    Lanza ValidationError si el fichero no se puede leer o le faltan columnas
+    obligatorias; los errores de cada fila van en el ImportResult.
+    """
+    spec = IMPORTS[kind]
+    rows = read_table(file, filename)
+    try:
+        headers = next(rows)
+    except StopIteration:
+        raise ValidationError("El fichero está vacío.")
+    columns, ignored = map_columns(spec, headers)
+    present = [field for field in columns if field]
+    if 'name' not in present:
+        raise ValidationError("Falta la columna obligatoria 'name' (nombre).")
+
+    result = ImportResult(kind, ignored)
+    result.dry_run = dry_run
+    with transaction.atomic():
+        importer = _Importer(spec, present, result)
+        numbered = enumerate(rows, start=2)  # la fila 1 es la cabecera
+        while chunk := list(islice(numbered, CHUNK_SIZE)):
+            importer.add([(row, dict(_pick(columns, values))) for row, values in chunk
+                          if any(value.strip() for value in values)])
+        importer.finish()
+        if dry_run:
+            transaction.set_rollback(True)
+    return result
+
+
+def write_error_report(results, file):
+    """Escribe como CSV (datos, fila, errores) los errores de las importaciones `results`."""
+    writer = csv.writer(file)
+    writer.writerow(['datos', 'fila', 'errores'])
+    for result in results:
+        for row, messages in result.errors:
+            writer.writerow([result.label, row, ' | '.join(messages)])
+
+
+# --- Lectura de ficheros ---
+
+def read_table(file, filename):
+    """Iterador de filas (listas de cadenas) de un CSV o XLSX; la primera es la cabecera."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.csv', '.txt'):
+        return _read_csv(file)
+    if extension == '.xlsx':
+        return _read_xlsx(file)
+    raise ValidationError(f"Formato de fichero no soportado: '{extension or filename}'. Usa CSV o XLSX.")
+
+
+def _read_csv(file):
+    # Se detecta el separador (',' o ';', habitual en hojas de cálculo en
+    # español) a partir del principio del fichero.
+    sample = file.read(4096)
+    file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample.decode('utf-8', errors='ignore'), delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text, dialect)
+    except UnicodeDecodeError:
+        raise ValidationError("El fichero CSV debe estar codificado en UTF-8.")
+
+
+def _read_xlsx(file):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValidationError("Para importar ficheros XLSX hace falta instalar openpyxl; usa CSV o instálalo.")
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield [_cell_text(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def map_columns(spec, headers):
+    """
+    Campo del modelo que corresponde a cada columna (None si se ignora) y la
+    lista de cabeceras ignoradas. Acepta el nombre del campo, la etiqueta del
+    formulario o un alias, sin distinguir mayúsculas.
+    """
+    known = {}
+    labels = spec.form_class._meta.labels or {}
+    for field in spec.form_class._meta.fields:
+        known[_normalize(field)] = field
+        if field in labels:
+            known[_normalize(labels[field])] = field
+    known.update({_normalize(alias): field for alias, field in spec.aliases.items()})
+
+    columns, ignored, seen = [], [], set()
+    for header in headers:
+        field = known.get(_normalize(header))
+        if field is None or field in seen:
+            columns.append(None)
+            if header.strip():
+                ignored.append(header)
+        else:
+            columns.append(field)
+            seen.add(field)
+    return columns, ignored
+
+
+def _normalize(header):
+    header = header.strip().casefold().replace(' ', '_')
+    return header.translate(str.maketrans('áéíóúü', 'aeiouu'))
+
+
+def _pick(columns, values):
+    for field, value in zip(columns, values):
+        if field:
+            yield field, value
+
+
+# --- Validación y escritura ---
+
+class _Importer:
+    def __init__(self, spec, fields, result):
+        self.model = spec.model
+        self.result = result
+        # Los formularios de importación no se renderizan: widgets simples, que
+        # son mucho más baratos de copiar al crear el formulario de cada fila.
+        self.form_class = modelform_factory(self.model, form=spec.form_class, fields=fields,
+                                            widgets={field: HiddenInput for field in fields})
+        if 'supplier' in fields:
+            self.form_class.suppliers = {s.name.casefold(): s for s in Supplier.objects.all()}
+        # Columnas sin las que no se puede crear una fila nueva (sin valor por defecto).
+        self.missing_for_create = [
+            f.name for f in self.model._meta.concrete_fields
+            if f.editable and not f.primary_key and not f.blank and not f.null
+            and not f.has_default() and f.name not in fields
+        ]
+        self.seen = {}
+        self.imported_names = []
+        if connection.vendor == 'postgresql':
+            self.writer = _CopyWriter(self.model, fields)
+        else:
+            self.writer = _BulkCreateWriter(self.model, fields)
+
+    def add(self, rows):
+        names = {data['name'].strip() for _, data in rows if data.get('name')}
+        existing = set(self.model.objects.filter(name__in=names).values_list('name', flat=True))
+
+        objs = []
+        for row, data in rows:
+            form = self.form_class(data)
+            if not form.is_valid():
+                self.result.add_error(row, [
+                    f"{form.fields[field].label}: {message}" if field in form.fields else message
+                    for field, messages in form.errors.items() for message in messages
+                ])
+                continue
+            name = form.cleaned_data['name']
+            if name in self.seen:
+                self.result.add_error(row, [f"'{name}' ya aparece en la fila {self.seen[name]} del fichero."])
+                continue
+            self.seen[name] = row
+            if name in existing:
+                self.result.updated += 1
+            elif self.missing_for_create:
+                self.result.add_error(row, [
+                    f"'{name}' no existe y para crearlo faltan las columnas: {', '.join(self.missing_for_create)}."
+                ])
+                continue
+            else:
+                self.result.created += 1
+            objs.append(form.save(commit=False))
+            self.imported_names.append(name)
+
+        if objs:
+            self.writer.write(objs)
+
+    def finish(self):
+        self.writer.finish()
+        if self.result.imported:
+            # Los INSERT / UPDATE en bloque no emiten post_save.
+            bump_versions(self.model)
+        if self.model is Product and self.result.imported:
+            # Imports locales para evitar ciclos (alerts -> models).
+            from .alerts import reconcile_alerts
+            from .dashboard import invalidate_dashboard
+
+            # Por bloques de nombres (índice único) para acotar cada IN.
+            for start in range(0, len(self.imported_names), CHUNK_SIZE):
+                names = self.imported_names[start:start + CHUNK_SIZE]
+                created, resolved = reconcile_alerts(Product.objects.filter(name__in=names))
+                self.result.alerts_created += created
+                self.result.alerts_resolved += resolved
+            invalidate_dashboard()
+
+
+def _write_fields(model, fields):
+    """Campos a escribir: los del fichero más los automáticos de fecha."""
+    write = [model._meta.get_field(f) for f in fields]
+    write += [f for f in model._meta.concrete_fields
+              if (getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)) and f not in write]
+    return write
+
+
+def _update_fields(write_fields):
+    """En las filas existentes se actualiza todo salvo el nombre y la fecha de alta."""
+    return [f for f in write_fields if f.name != 'name' and not getattr(f, 'auto_now_add', False)]
+
+
+class _BulkCreateWriter:
+    """INSERT ... ON CONFLICT (name) DO UPDATE por bloque."""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.update_fields = [f.name for f in _update_fields(_write_fields(model, fields))]
+
+    def write(self, objs):
+        self.model.objects.bulk_create(
+            objs, update_conflicts=True, unique_fields=['name'], update_fields=self.update_fields,
+        )
+
+    def finish(self):
+        pass
+
+
+class _CopyWriter:
+    """
+    PostgreSQL: las filas se envían con COPY a una tabla temporal (un flujo
+    por bloque, sin una sentencia por fila) y se vuelcan al final con un solo
+    INSERT ... SELECT ... ON CONFLICT (name) DO UPDATE.
+    """
+
+    def __init__(self, model, fields):
+        quote = connection.ops.quote_name
+        self.write_fields = _write_fields(model, fields)
+        self.table = quote(model._meta.db_table)
+        # Calificada con pg_temp: nunca puede referirse a una tabla real.
+        self.staging = 'pg_temp.' + quote(f'import_{model._meta.db_table}')
+        self.columns = ', '.join(quote(f.column) for f in self.write_fields)
+        self.updates = ', '.join(f'{quote(f.column)} = EXCLUDED.{quote(f.column)}'
+                                 for f in _update_fields(self.write_fields))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.staging}')
+            cursor.execute(f'CREATE TEMP TABLE {self.staging} ON COMMIT DROP AS '
+                           f'SELECT {self.columns} FROM {self.table} WITH NO DATA')
+
+    def write(self, objs):
+        buffer = io.StringIO()
+        for obj in objs:
+            values = (f.get_db_prep_save(f.pre_save(obj, add=True), connection) for f in self.write_fields)
+            buffer.write('\t'.join(_copy_text(value) for value in values) + '\n')
+        sql = f'COPY {self.staging} ({self.columns}) FROM STDIN'
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):  # psycopg2
+                buffer.seek(0)
+                raw.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+    def finish(self):
+        conflict = f'DO UPDATE SET {self.updates}' if self.updates else 'DO NOTHING'
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {self.table} ({self.columns}) '
+                           f'SELECT {self.columns} FROM {self.staging} '
+                           f'ON CONFLICT ({connection.ops.quote_name("name")}) {conflict}')
+            cursor.execute(f'DROP TABLE {self.staging}')
+
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_text(value):
+    """Valor en el formato de texto de COPY (\\N es NULL)."""
+    if value is None:
+        return '\\N'
+    return str(value).translate(_COPY_ESCAPES)
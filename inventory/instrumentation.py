@@ -0,0 +1,236 @@
+"""
+Instrumentación por petición: consultas SQL, tiempo de base de datos, de
+vista y de renderizado de plantilla.
+
+RequestTimingMiddleware mide cada petición con execute_wrapper en todas las
+conexiones (primario y, si la hay, réplica de lectura) y guarda un resumen
+en un búfer circular en memoria del proceso. La cabecera `Server-Timing`
+(visible en las herramientas de desarrollo del navegador) solo se añade con
+DEBUG o para el OWNER: revela tiempos y número de consultas. La página
+de rendimiento (solo OWNER) agrega ese búfer por endpoint y muestra las
+consultas que más tiempo consumen, agrupadas por "huella" (el SQL sin
+parámetros): una misma huella repetida decenas de veces en una
+petición es el síntoma típico de un N+1.
+"""
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+# Consultas distintas (por huella) que se guardan por petición.
+TOP_QUERIES_PER_REQUEST = 5
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL normalizado: listas IN (%s, %s, ...) colapsadas y espacios uniformes."""
+    return _WHITESPACE.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()
+
+
+class RequestLog:
+    """Búfer circular, seguro entre hilos, con las últimas peticiones medidas."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def endpoint_summary(self):
+        """
+        Agrupa las peticiones por endpoint y devuelve una lista ordenada de la
+        más lenta a la más rápida (por p95), con sus peores huellas de consulta.
+        """
+        groups = defaultdict(list)
+        for entry in self.entries():
+            groups[(entry['method'], entry['endpoint'])].append(entry)
+
+        summary = []
+        for (method, endpoint), entries in groups.items():
+            totals = sorted(e['total_ms'] for e in entries)
+            queries = defaultdict(lambda: {'count': 0, 'duration_ms': 0.0, 'max_per_request': 0})
+            for entry in entries:
+                for sql, count, duration in entry['top_queries']:
+                    stats = queries[sql]
+                    stats['count'] += count
+                    stats['duration_ms'] += duration
+                    stats['max_per_request'] = max(stats['max_per_request'], count)
+            worst = sorted(({'sql': sql, **stats} for sql, stats in queries.items()),
+                           key=lambda q: q['duration_ms'], reverse=True)[:3]
+            summary.append({
+                'method': method,
+                'endpoint': endpoint,
+                'requests': len(entries),
+                'p50_ms': statistics.median(totals),
+                'p95_ms': totals[max(0, round(0.95 * len(totals)) - 1)],
+                'max_ms': totals[-1],
+                'avg_queries': statistics.fmean(e['queries'] for e in entries),
+                'max_queries': max(e['queries'] for e in entries),
+                'avg_db_ms': statistics.fmean(e['db_ms'] for e in entries),
+                'worst_queries': worst,
+            })
+        summary.sort(key=lambda s: s['p95_ms'], reverse=True)
+        return summary
+
+
+request_log = RequestLog(getattr(settings, 'PERFORMANCE_LOG_SIZE', 500))
+
+
+class QueryRecorder:
+    """execute_wrapper que acumula el número de consultas y su duración por huella."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.by_fingerprint = defaultdict(lambda: [0, 0.0])
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            stats = self.by_fingerprint[fingerprint(sql)]
+            stats[0] += 1
+            stats[1] += elapsed
+
+    def top_queries(self, limit=TOP_QUERIES_PER_REQUEST):
+        """[(huella, veces, ms)] de las huellas con más tiempo acumulado."""
+        ranked = sorted(self.by_fingerprint.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, round(duration * 1000, 3)) for sql, (count, duration) in ranked[:limit]]
+
+
+@contextmanager
+def recording(recorder):
+    """Registra en `recorder` las consultas de todas las conexiones durante el bloque."""
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(recorder))
+        yield
+
+
+def shows_timing(request):
+    """Si la respuesta lleva `Server-Timing`: con DEBUG o para el OWNER."""
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or bool(user is not None and user.is_authenticated and user.is_owner())
+
+
+class RequestTimingMiddleware:
+    """
+    Mide cada petición y guarda los tiempos en request_log (y en
+    `Server-Timing` si shows_timing()).
+
+    El tiempo de vista va desde process_view hasta que la vista devuelve la
+    respuesta; el de plantilla, desde ese momento hasta que termina el
+    renderizado de la TemplateResponse. Las vistas que renderizan dentro de la
+    propia vista (render()) cuentan su plantilla como tiempo de vista.
+    Conviene colocarlo el último en MIDDLEWARE para que mida solo la vista.
+    Funciona con WSGI y con ASGI (sin pasar la petición a un hilo).
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = self._start(request)
+        with recording(recorder):
+            response = self.get_response(request)
+        request._timing['end'] = time.perf_counter()
+        return self._finish(request, response, recorder, shows_timing(request))
+
+    async def __acall__(self, request):
+        recorder = self._start(request)
+        # Las conexiones son por hilo y las consultas de la petición (vista
+        # síncrona o ORM async) se ejecutan en su hilo de sync_to_async: los
+        # wrappers se instalan y se quitan en ese hilo.
+        stack = ExitStack()
+        await sync_to_async(stack.enter_context)(recording(recorder))
+        try:
+            response = await self.get_response(request)
+        finally:
+            request._timing['end'] = time.perf_counter()
+            await sync_to_async(stack.close)()
+        # El usuario y su rol pueden no estar cargados aún: consulta síncrona.
+        show = settings.DEBUG or await sync_to_async(shows_timing)(request)
+        return self._finish(request, response, recorder, show)
+
+    def _start(self, request):
+        request._timing = {'start': time.perf_counter(), 'end': None,
+                           'view_start': None, 'view_end': None, 'render_end': None}
+        return QueryRecorder()
+
+    def _finish(self, request, response, recorder, show_timing):
+        timing = request._timing
+        start, end = timing['start'], timing['end']
+        view_ms = template_ms = 0.0
+        if timing['view_start'] is not None:
+            view_end = timing['view_end'] or end
+            view_ms = (view_end - timing['view_start']) * 1000
+            if timing['render_end'] is not None:
+                template_ms = (timing['render_end'] - view_end) * 1000
+        total_ms = (end - start) * 1000
+        db_ms = recorder.duration * 1000
+
+        if show_timing:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={db_ms:.1f};desc="{recorder.count} consultas"',
+                f'view;dur={view_ms:.1f};desc="Vista"',
+                f'tpl;dur={template_ms:.1f};desc="Plantilla"',
+                f'total;dur={total_ms:.1f}',
+            ])
+
+        match = request.resolver_match
+        request_log.append({
+            'timestamp': timezone.now(),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': (match.view_name or match.route) if match else request.path,
+            'status': response.status_code,
+            'total_ms': total_ms,
+            'view_ms': view_ms,
+            'template_ms': template_ms,
+            'db_ms': db_ms,
+            'queries': recorder.count,
+            'top_queries': recorder.top_queries(),
+        })
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timing = request._timing
+        timing['view_end'] = time.perf_counter()
+
+        def render_finished(rendered):
+            timing['render_end'] = time.perf_counter()
+
+        response.add_post_render_callback(render_finished)
+        return response
@@ -0,0 +1,274 @@
+import datetime
+import json
+import math
+import platform
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+from itertools import count
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory import urls as inventory_urls
+from inventory.exports import EXPORTS, FORMATS
+from inventory.models import (CustomUser, DailySalesSession, Product, PurchaseOrder, Role, SaleItem,
+                              StockAlert, StockMovement, Supplier)
+from inventory.rollups import refresh_daily_product_sales
+from inventory.synthetic import generate_dataset
+
+# Modelo del que se toma el <pk> de cada grupo de URLs (prefijo del nombre de la URL).
+PK_MODELS = {
+    'product': Product,
+    'supplier': Supplier,
+    'dailysalessession': DailySalesSession,
+    'saleitem': DailySalesSession,
+    'stockalert': StockAlert,
+    'role': Role,
+    'user': CustomUser,
+    'purchaseorder': PurchaseOrder,
+}
+
+# Vistas que no se miden y por qué (se listan en meta.skipped).
+NOT_MEASURED = {
+    'stockalert_stream': "stream de eventos solo con ASGI; con WSGI responde 204",
+}
+
+# Caché propia de la medición: se vacía antes de cada iteración en frío sin
+# tocar la caché compartida (FileBasedCache) de la aplicación.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cafecentral-benchmark',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = ("Genera un conjunto de datos sintético y determinista (dentro de una transacción que "
+            "se revierte) y mide todas las vistas GET de inventory y la página de inicio, además "
+            "de los guardados de SaleItem y StockMovement. Informa p50/p95, número de consultas y "
+            "pico de memoria en JSON, para comparar entre versiones. Cada vista se mide en frío "
+            "(caché vacía en cada iteración: primera visita tras un cambio) y en caliente (con la "
+            "caché que dejan las iteraciones anteriores).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000, help="Productos sintéticos.")
+        parser.add_argument('--movements-per-product', type=int, default=20,
+                            help="Movimientos de stock por producto.")
+        parser.add_argument('--sessions', type=int, default=365,
+                            help="Días con sesión de ventas (p. ej. 1825 para 5 años).")
+        parser.add_argument('--items-per-session', type=int, default=30, help="Ítems por sesión de ventas.")
+        parser.add_argument('--seed', type=int, default=0, help="Semilla del generador de datos.")
+        parser.add_argument('--iterations', type=int, default=20, help="Mediciones por objetivo.")
+        parser.add_argument('--warmup', type=int, default=2, help="Ejecuciones previas descartadas.")
+        parser.add_argument('--output', help="Fichero donde escribir el JSON (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        # DEBUG desactivado: sin registro de consultas en connection.queries.
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], CACHES=BENCHMARK_CACHES):
+            try:
+                with transaction.atomic():
+                    report = self._run(options)
+                    transaction.set_rollback(True)
+            finally:
+                cache.clear()
+
+        data = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+            self.stderr.write(f"Resultados escritos en {options['output']}.")
+        else:
+            self.stdout.write(data)
+
+    def _run(self, options):
+        started = time.perf_counter()
+        owner, dataset = generate_dataset(
+            products=options['products'],
+            movements_per_product=options['movements_per_product'],
+            sessions=options['sessions'],
+            items_per_session=options['items_per_session'],
+            seed=options['seed'],
+        )
+        # Las sesiones sintéticas quedan marcadas: el informe de ventas y las
+        # estadísticas de consumo leen el resumen, que en producción mantiene la tarea.
+        refresh_daily_product_sales()
+        self.stderr.write(f"Datos generados en {time.perf_counter() - started:.1f} s: {dataset}")
+
+        # Los errores de una vista se registran como status 500 en lugar de abortar.
+        client = Client(raise_request_exception=False)
+        client.force_login(owner)
+
+        results, skipped = {}, []
+        for label, target in self._view_targets(client, owner, skipped, options):
+            results[label] = {
+                'cold': self._measure(target, options, before=cache.clear),
+                'warm': self._measure(target, options),
+            }
+        for label, target in self._write_targets(owner, options):
+            results[label] = self._measure(target, options)
+        for reason in skipped:
+            self.stderr.write(f"Sin medir: {reason}")
+
+        return {
+            'meta': {
+                'generated_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'dataset': dataset,
+                'skipped': skipped,
+            },
+            'results': results,
+        }
+
+    # --- Objetivos ---
+
+    def _view_targets(self, client, owner, skipped, options):
+        # Parámetros GET obligatorios: una fecha a mitad del historial generado.
+        history_date = timezone.localdate() - datetime.timedelta(days=max(options['sessions'] // 2, 1))
+        query_params = {'stock_at_date': {'date': history_date.isoformat()}}
+
+        yield 'GET home', lambda: client.get(reverse('home'))
+        for pattern in inventory_urls.urlpatterns:
+            name = f"{inventory_urls.app_name}:{pattern.name}"
+            view_class = getattr(pattern.callback, 'view_class', None)
+            if view_class is None or not hasattr(view_class, 'get') or 'get' not in view_class.http_method_names:
+                skipped.append(f"{name} (sin GET)")
+                continue
+            if pattern.name in NOT_MEASURED:
+                skipped.append(f"{name} ({NOT_MEASURED[pattern.name]})")
+                continue
+            converters = set(pattern.pattern.converters)
+            if converters - {'pk', 'kind', 'fmt'}:
+                skipped.append(f"{name} (parámetros de URL)")
+                continue
+            kwargs = {}
+            if 'pk' in converters:
+                model = PK_MODELS[pattern.name.split('_')[0]]
+                kwargs['pk'] = (owner.pk if model is CustomUser else
+                                model.objects.order_by('pk').values_list('pk', flat=True).last())
+                if kwargs['pk'] is None:
+                    skipped.append(f"{name} (sin datos)")
+                    continue
+            # Exportaciones: una medición por cada tipo y formato.
+            variants = ([{'kind': kind, 'fmt': fmt} for kind in EXPORTS for fmt in FORMATS]
+                        if 'kind' in converters else [{}])
+            for variant in variants:
+                url = reverse(name, kwargs={**kwargs, **variant})
+                label = f"GET {name}" + (" ({kind}.{fmt})".format(**variant) if variant else "")
+                yield label, lambda url=url, data=query_params.get(pattern.name): _get(client, url, data)
+
+    def _write_targets(self, owner, options):
+        runs = options['warmup'] + options['iterations'] + 1  # +1: pasada de memoria
+        products = list(Product.objects.order_by('pk')[:runs])
+        used_dates = set(DailySalesSession.objects.values_list('sale_date', flat=True))
+        sale_date = timezone.localdate()
+        while sale_date in used_dates:
+            sale_date += datetime.timedelta(days=1)
+        session = DailySalesSession.objects.create(sale_date=sale_date, registered_by_user=owner)
+
+        created_items = []
+        product_index = count()
+
+        def create_sale_item():
+            product = products[next(product_index)]
+            item = SaleItem(sale_session=session, product=product, quantity_sold=Decimal('1'),
+                            price_at_sale=product.price_per_unit_from_supplier)
+            item.save()
+            created_items.append(item)
+
+        update_index = count()
+
+        def update_sale_item():
+            item = created_items[next(update_index)]
+            item.quantity_sold += 1
+            item.save()
+
+        def delete_sale_item():
+            created_items.pop().delete()
+
+        def stock_movement(movement_type):
+            product_iter = iter(products * 2)
+
+            def save():
+                StockMovement(product=next(product_iter), movement_type=movement_type,
+                              quantity=Decimal('1'), registered_by=owner).save()
+            return save
+
+        yield 'SaleItem.save (alta)', create_sale_item
+        yield 'SaleItem.save (modificación)', update_sale_item
+        yield 'SaleItem.delete', delete_sale_item
+        yield 'StockMovement.save (entrada)', stock_movement('IN')
+        yield 'StockMovement.save (salida)', stock_movement('OUT')
+
+    # --- Medición ---
+
+    def _measure(self, target, options, before=lambda: None):
+        """Mide `target`; `before` se ejecuta antes de cada llamada, fuera del tiempo medido."""
+        for _ in range(options['warmup']):
+            before()
+            target()
+
+        timings, query_counts, status = [], [], None
+        for _ in range(options['iterations']):
+            before()
+            queries = 0
+
+            def counter(execute, sql, params, many, context):
+                nonlocal queries
+                queries += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = target()
+                timings.append((time.perf_counter() - started) * 1000)
+            query_counts.append(queries)
+            status = getattr(response, 'status_code', None)
+
+        # El pico de memoria se mide en una pasada aparte: tracemalloc ralentiza
+        # la ejecución y falsearía los tiempos.
+        before()
+        tracemalloc.start()
+        try:
+            target()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        result = {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(_percentile(timings, 95), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': max(query_counts),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+        if status is not None:
+            result['status'] = status
+        return result
+
+
+def _get(client, url, data=None):
+    """GET que consume las respuestas en streaming (su coste está en generar el contenido)."""
+    response = client.get(url, data)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def _percentile(values, percent):
+    """Percentil por rango más cercano."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
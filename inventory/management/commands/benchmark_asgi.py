@@ -0,0 +1,173 @@
+import asyncio
+import json
+import platform
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.asyncdb import gather_queries
+from inventory.dashboard import METRIC_QUERIES, clear_dashboard_cache
+from inventory.models import CustomUser
+
+DEFAULT_URLS = ('home', 'inventory:sales_report')
+
+
+class Command(BaseCommand):
+    help = ("Compara la latencia de las vistas async (inicio e informe de ventas) servidas por "
+            "WSGI (WSGIHandler, un hilo por petición) y por ASGI (ASGIHandler, corrutinas en un "
+            "bucle de eventos) con varias peticiones concurrentes. Las consultas en paralelo "
+            "usan otras conexiones, así que mide los datos ya confirmados de la base de datos "
+            "(a diferencia de `benchmark`, no genera datos). Informa p50/p95 y peticiones por "
+            "segundo en JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls',
+                            help="Nombre de URL a medir (repetible). Por defecto: " + ', '.join(DEFAULT_URLS))
+        parser.add_argument('--username', help="Usuario con el que se inicia sesión (por defecto, el primer OWNER).")
+        parser.add_argument('--concurrency', type=int, default=10, help="Peticiones simultáneas.")
+        parser.add_argument('--requests', type=int, default=200, help="Peticiones por URL y servidor.")
+        parser.add_argument('--cached', action='store_true',
+                            help="Mantiene la caché del dashboard (por defecto se desactiva para medir las consultas).")
+        parser.add_argument('--output', help="Fichero donde escribir el JSON (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.select_related('role')
+        user = (users.filter(username=options['username']).first() if options['username']
+                else users.filter(role__name='OWNER').order_by('pk').first())
+        if user is None:
+            raise CommandError("No hay ningún usuario con el que iniciar sesión (usa --username).")
+
+        timeout = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60) if options['cached'] else 0
+        clear_dashboard_cache()
+        # DEBUG desactivado: sin registro de consultas en connection.queries.
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], DASHBOARD_CACHE_TIMEOUT=timeout):
+            client = Client()
+            client.force_login(user)
+            try:
+                report = self._run(client.cookies, options)
+            finally:
+                client.logout()
+        clear_dashboard_cache()
+
+        data = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+            self.stderr.write(f"Resultados escritos en {options['output']}.")
+        else:
+            self.stdout.write(data)
+
+    def _run(self, cookies, options):
+        results = {}
+        for name in options['urls'] or DEFAULT_URLS:
+            url = reverse(name)
+            results[name] = {
+                'wsgi': self._wsgi(url, cookies, options['concurrency'], options['requests']),
+                'asgi': asyncio.run(self._asgi(url, cookies, options['concurrency'], options['requests'])),
+            }
+        return {
+            'meta': {
+                'generated_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'cached': options['cached'],
+            },
+            'dashboard_queries': self._dashboard_queries(options['requests']),
+            'results': results,
+        }
+
+    # --- Servidores ---
+
+    def _wsgi(self, url, cookies, concurrency, total):
+        def worker(count):
+            client = Client()
+            client.cookies = cookies
+            try:
+                return [self._timed(client.get, url) for _ in range(count)]
+            finally:
+                connection.close()  # La conexión de este hilo
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = [t for chunk in pool.map(worker, _split(total, concurrency)) for t in chunk]
+        return _summary(timings, time.perf_counter() - started)
+
+    async def _asgi(self, url, cookies, concurrency, total):
+        async def worker(count):
+            client = AsyncClient()
+            client.cookies = cookies
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(url)
+                timings.append(self._check(response, url, started))
+            return timings
+
+        started = time.perf_counter()
+        chunks = await asyncio.gather(*(worker(count) for count in _split(total, concurrency)))
+        return _summary([t for chunk in chunks for t in chunk], time.perf_counter() - started)
+
+    def _timed(self, get, url):
+        started = time.perf_counter()
+        return self._check(get(url), url, started)
+
+    @staticmethod
+    def _check(response, url, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} respondió {response.status_code}; ¿tiene el usuario el rol necesario?")
+        return elapsed
+
+    # --- Consultas del dashboard ---
+
+    def _dashboard_queries(self, iterations):
+        """Cada consulta por separado, su suma en serie y las tres en paralelo (gather_queries)."""
+        def measure(func):
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - started) * 1000)
+            return round(statistics.median(timings), 3)
+
+        async def measure_parallel():
+            # En un solo bucle de eventos, como dentro de la vista.
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                await gather_queries(*METRIC_QUERIES)
+                timings.append((time.perf_counter() - started) * 1000)
+            return round(statistics.median(timings), 3)
+
+        return {
+            **{f'{query.__name__.lstrip("_")}_p50_ms': measure(query) for query in METRIC_QUERIES},
+            'serie_p50_ms': measure(lambda: [query() for query in METRIC_QUERIES]),
+            'paralelo_p50_ms': asyncio.run(measure_parallel()),
+        }
+
+
+def _split(total, parts):
+    """Reparte `total` peticiones entre `parts` clientes."""
+    parts = max(1, min(parts, total))
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def _summary(timings, wall):
+    timings = sorted(timings)
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[max(0, round(0.95 * len(timings)) - 1)], 3),
+        'max_ms': round(timings[-1], 3),
+        'requests_per_second': round(len(timings) / wall, 1),
+    }
@@ -0,0 +1,166 @@
+import json
+import platform
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.dbpool import pool_enabled, pool_stats
+from inventory.models import CustomUser
+
+DEFAULT_URLS = ('inventory:stockalert_list', 'inventory:api_products')
+DEFAULT_WORKERS = '1,2,4,8,16,32'
+
+
+class Command(BaseCommand):
+    help = ("Mide peticiones por segundo y latencia según el número de workers (hilos que "
+            "atienden peticiones a la vez, como gunicorn --threads) con la configuración de base "
+            "de datos actual. Informa de los contadores del pool (DATABASE_POOL=True) y del pico "
+            "de conexiones abiertas en el servidor PostgreSQL. Para comparar, ejecútalo contra la "
+            "base de datos de docker-compose.yml con y sin DATABASE_POOL=True. Como "
+            "benchmark_asgi, mide los datos ya confirmados (no genera datos).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default=DEFAULT_WORKERS,
+                            help=f"Números de workers a medir, separados por comas (por defecto {DEFAULT_WORKERS}).")
+        parser.add_argument('--duration', type=float, default=5.0, help="Segundos de carga por cada número de workers.")
+        parser.add_argument('--url', action='append', dest='urls',
+                            help="Nombre de URL a pedir (repetible, se alternan). Por defecto: " + ', '.join(DEFAULT_URLS))
+        parser.add_argument('--username', help="Usuario con el que se inicia sesión (por defecto, el primer OWNER).")
+        parser.add_argument('--output', help="Fichero donde escribir el JSON (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        try:
+            levels = sorted({int(value) for value in options['workers'].split(',')})
+        except ValueError:
+            raise CommandError("--workers debe ser una lista de enteros separados por comas.")
+        if not levels or levels[0] < 1:
+            raise CommandError("--workers debe contener números mayores que cero.")
+
+        users = CustomUser.objects.select_related('role')
+        user = (users.filter(username=options['username']).first() if options['username']
+                else users.filter(role__name='OWNER').order_by('pk').first())
+        if user is None:
+            raise CommandError("No hay ningún usuario con el que iniciar sesión (usa --username).")
+
+        urls = [reverse(name) for name in options['urls'] or DEFAULT_URLS]
+        # DEBUG desactivado: sin registro de consultas en connection.queries.
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            client = Client()
+            client.force_login(user)
+            try:
+                results = [self._level(urls, client.cookies, workers, options['duration']) for workers in levels]
+            finally:
+                client.logout()
+
+        settings_dict = connection.settings_dict
+        report = {
+            'meta': {
+                'generated_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'pool': settings_dict.get('OPTIONS', {}).get('pool') if pool_enabled() else None,
+                'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+                'duration_s': options['duration'],
+                'urls': urls,
+            },
+            'results': results,
+        }
+        data = json.dumps(report, indent=2, sort_keys=True, default=str)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+            self.stderr.write(f"Resultados escritos en {options['output']}.")
+        else:
+            self.stdout.write(data)
+
+    def _level(self, urls, cookies, workers, duration):
+        pool_stats(reset=True)  # Contadores solo de este intervalo
+        sampler = _ServerConnectionSampler()
+        sampler.start()
+        deadline = time.perf_counter() + duration
+
+        def worker(offset):
+            client = Client(raise_request_exception=False)
+            client.cookies = cookies
+            timings, errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    url = urls[(offset + len(timings) + errors) % len(urls)]
+                    started = time.perf_counter()
+                    # Como el servidor al empezar y terminar cada petición (el
+                    # cliente de pruebas no lo hace): sin pool la conexión del
+                    # hilo persiste; con pool vuelve al pool.
+                    close_old_connections()
+                    response = client.get(url)
+                    close_old_connections()
+                    if response.status_code == 200:
+                        timings.append((time.perf_counter() - started) * 1000)
+                    else:
+                        errors += 1  # P. ej. 500 por timeout del pool
+            finally:
+                connection.close()
+            return timings, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(worker, range(workers)))
+        wall = time.perf_counter() - started
+        peak_connections = sampler.stop()
+
+        timings = sorted(t for chunk, _ in outcomes for t in chunk)
+        errors = sum(count for _, count in outcomes)
+        return {
+            'workers': workers,
+            'requests': len(timings),
+            'errors': errors,
+            'requests_per_second': round(len(timings) / wall, 1),
+            'p50_ms': round(statistics.median(timings), 3) if timings else None,
+            'p95_ms': round(timings[max(0, round(0.95 * len(timings)) - 1)], 3) if timings else None,
+            'server_connections_peak': peak_connections,
+            'pool': pool_stats(reset=True),
+        }
+
+
+class _ServerConnectionSampler(threading.Thread):
+    """
+    Pico de conexiones de la base de datos en el servidor PostgreSQL
+    (pg_stat_activity) durante la carga, sin contar la del propio muestreo.
+    """
+    interval = 0.2
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._done = threading.Event()
+        self.peak = None
+
+    def run(self):
+        if connection.vendor != 'postgresql':
+            return
+        # Conexión propia, fuera del pool: no compite con los workers.
+        sampler = connections.create_connection('default')
+        sampler.settings_dict = {**sampler.settings_dict,
+                                 'OPTIONS': {k: v for k, v in sampler.settings_dict['OPTIONS'].items() if k != 'pool'},
+                                 'CONN_MAX_AGE': 0}
+        try:
+            with sampler.cursor() as cursor:
+                while True:
+                    cursor.execute("SELECT count(*) - 1 FROM pg_stat_activity WHERE datname = current_database()")
+                    self.peak = max(self.peak or 0, cursor.fetchone()[0])
+                    if self._done.wait(self.interval):
+                        break
+        finally:
+            sampler.close()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.peak
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from inventory.dashboard import clear_dashboard_cache
+from inventory.queryplans import check_query_plans
+from inventory.rollups import refresh_daily_product_sales
+from inventory.synthetic import generate_dataset
+
+
+class Command(BaseCommand):
+    help = ("Genera un conjunto de datos sintético (dentro de una transacción que se revierte), "
+            "recorre las vistas principales y ejecuta EXPLAIN sobre cada consulta SELECT. Falla si "
+            "alguna recorre una tabla completa cuando debería usar un índice (ver inventory.queryplans).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000,
+                            help="Número de productos sintéticos (por defecto 2000).")
+        parser.add_argument('--seed', type=int, default=0, help="Semilla del generador de datos.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f"Motor de base de datos no soportado: {connection.vendor}")
+
+        setup_test_environment()
+        clear_dashboard_cache()
+        try:
+            with transaction.atomic():
+                problems, checked = self._check(options)
+                transaction.set_rollback(True)
+        finally:
+            clear_dashboard_cache()
+            teardown_test_environment()
+
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(f"{problem.url}: {', '.join(line for _, line in problem.scans)}"))
+            if problem.sql:
+                self.stdout.write(f"    {problem.sql[:300]}")
+        if problems:
+            raise CommandError(f"{len(problems)} problemas en {checked} consultas revisadas.")
+        self.stdout.write(self.style.SUCCESS(f"{checked} consultas revisadas, todas usan índices."))
+
+    def _check(self, options):
+        owner, _ = generate_dataset(products=options['products'], seed=options['seed'])
+        refresh_daily_product_sales()
+
+        client = Client()
+        client.force_login(owner)
+
+        def show_plan(url, sql, plan):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{url}: {sql[:200]}\n    " + "\n    ".join(plan))
+
+        return check_query_plans(client, on_plan=show_plan)
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.exports import EXPORTS, FORMATS, export_queryset, stream_export
+from inventory.forms import ExportFilterForm
+
+
+class Command(BaseCommand):
+    help = ("Exporta en streaming (memoria constante) el historial de movimientos de stock, "
+            "ventas o alertas en CSV o NDJSON, con un rango de fechas opcional.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS), help="Datos a exportar.")
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv', dest='fmt',
+                            help="Formato de salida (por defecto csv).")
+        parser.add_argument('--start', help="Fecha inicial incluida (AAAA-MM-DD).")
+        parser.add_argument('--end', help="Fecha final incluida (AAAA-MM-DD).")
+        parser.add_argument('--output', help="Fichero de salida (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        form = ExportFilterForm({'start_date': options['start'], 'end_date': options['end']})
+        if not form.is_valid():
+            raise CommandError(" ".join(error for errors in form.errors.values() for error in errors))
+
+        queryset = export_queryset(options['kind'], form.cleaned_data['start_date'],
+                                   form.cleaned_data['end_date'])
+        chunks = stream_export(options['kind'], queryset, options['fmt'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(chunks)
+            self.stderr.write(f"Exportación escrita en {options['output']}.")
+        else:
+            sys.stdout.writelines(chunks)
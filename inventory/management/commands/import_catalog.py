@@ -0,0 +1,55 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.imports import import_catalog, write_error_report
+
+
+class Command(BaseCommand):
+    help = ("Importa proveedores y/o productos desde ficheros CSV o XLSX (alta o actualización "
+            "por nombre), validando cada fila con las reglas de los formularios. Los proveedores "
+            "se importan primero para que los productos puedan referenciarlos.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', help="Fichero de proveedores (CSV o XLSX).")
+        parser.add_argument('--products', help="Fichero de productos (CSV o XLSX).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Solo valida: no guarda ningún cambio.")
+        parser.add_argument('--errors', help="Fichero CSV donde escribir el informe de errores por fila.")
+
+    def handle(self, *args, **options):
+        files = [(kind, options[kind]) for kind in ('suppliers', 'products') if options[kind]]
+        if not files:
+            raise CommandError("Indica al menos --suppliers o --products.")
+
+        results = []
+        for kind, path in files:
+            try:
+                with open(path, 'rb') as f:
+                    result = import_catalog(kind, f, path, dry_run=options['dry_run'])
+            except OSError as e:
+                raise CommandError(f"No se pudo leer {path}: {e}")
+            except ValidationError as e:
+                raise CommandError(f"{path}: {' '.join(e.messages)}")
+            results.append(result)
+            self._report(result)
+
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8', newline='') as f:
+                write_error_report(results, f)
+            self.stdout.write(f"Informe de errores escrito en {options['errors']}.")
+
+    def _report(self, result):
+        prefix = "[simulación] " if result.dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result.label}: {result.created} creados, {result.updated} actualizados, "
+            f"{len(result.errors)} filas con errores."
+        ))
+        if result.ignored_columns:
+            self.stdout.write(f"  Columnas ignoradas: {', '.join(result.ignored_columns)}")
+        if result.alerts_created or result.alerts_resolved:
+            self.stdout.write(f"  Alertas: {result.alerts_created} creadas, {result.alerts_resolved} resueltas.")
+        if result.errors:
+            for line, messages in result.errors[:20]:
+                self.stdout.write(self.style.ERROR(f"  Fila {line}: {'; '.join(messages)}"))
+            if len(result.errors) > 20:
+                self.stdout.write(f"  ... y {len(result.errors) - 20} más (usa --errors para el informe completo).")
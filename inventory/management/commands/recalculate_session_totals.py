@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import DailySalesSession
+from inventory.sales import recalculate_session_totals, stale_session_totals
+
+
+class Command(BaseCommand):
+    help = ("Recalcula los totales desnormalizados (ingresos, cantidad e ítems) de las "
+            "sesiones de venta a partir de sus SaleItem.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', type=int, action='append', dest='sessions',
+                            help="ID de sesión a recalcular (se puede repetir). Por defecto, todas.")
+        parser.add_argument('--check', action='store_true',
+                            help="Solo informa de las sesiones con totales incorrectos, sin modificarlas.")
+
+    def handle(self, *args, **options):
+        queryset = DailySalesSession.objects.all()
+        if options['sessions']:
+            queryset = queryset.filter(pk__in=options['sessions'])
+
+        stale = list(stale_session_totals(queryset).values_list('pk', 'sale_date'))
+        for pk, sale_date in stale:
+            self.stdout.write(f" - Sesión {pk} ({sale_date}) con totales desactualizados.")
+
+        if options['check']:
+            self.stdout.write(f"{len(stale)} sesiones con totales desactualizados.")
+            return
+
+        if stale:
+            updated = recalculate_session_totals(queryset.filter(pk__in=[pk for pk, _ in stale]))
+        else:
+            updated = 0
+        self.stdout.write(self.style.SUCCESS(f"Totales recalculados en {updated} sesiones."))
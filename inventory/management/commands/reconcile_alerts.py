@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from inventory.alerts import alerts_to_resolve, products_missing_alert, reconcile_alerts
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = ("Re-evalúa las alertas de stock de todos los productos en bloque: crea las que "
+            "faltan y resuelve las de productos que ya superan su stock mínimo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='products',
+                            help="ID de producto a revisar (se puede repetir). Por defecto, todos.")
+        parser.add_argument('--check', action='store_true',
+                            help="Solo informa de las alertas pendientes de crear o resolver, sin modificarlas.")
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options['products']:
+            queryset = queryset.filter(pk__in=options['products'])
+
+        if options['check']:
+            missing = products_missing_alert(queryset).count()
+            stale = alerts_to_resolve(queryset).count()
+            self.stdout.write(f"{missing} productos con stock bajo sin alerta activa.")
+            self.stdout.write(f"{stale} alertas activas de productos que ya superan el mínimo.")
+            return
+
+        created, resolved = reconcile_alerts(queryset)
+        self.stdout.write(self.style.SUCCESS(
+            f"Alertas creadas: {created}. Alertas resueltas: {resolved}."))
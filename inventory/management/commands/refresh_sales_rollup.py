@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import DailySalesSession
+from inventory.rollups import refresh_daily_product_sales, stale_sessions
+
+
+class Command(BaseCommand):
+    help = ("Recalcula el resumen de ventas por producto y día (DailyProductSales) de las "
+            "sesiones marcadas como desactualizadas. Con --all lo reconstruye por completo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Recalcula todas las sesiones, no solo las desactualizadas.")
+        parser.add_argument('--check', action='store_true',
+                            help="Solo informa de cuántas sesiones están desactualizadas.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.stdout.write(f"{stale_sessions().count()} sesiones con el resumen desactualizado.")
+            return
+
+        sessions = DailySalesSession.objects.all() if options['all'] else None
+        refreshed = refresh_daily_product_sales(sessions)
+        self.stdout.write(self.style.SUCCESS(f"Resumen de ventas recalculado en {refreshed} sesiones."))
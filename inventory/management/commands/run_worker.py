@@ -0,0 +1,74 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Ejecuta las tareas en segundo plano encoladas en la base de datos (correos de "
+            "alertas, refresco del resumen de ventas, exportaciones por correo; ver "
+            "inventory.tasks). Con --processes arranca varios workers en paralelo. Se detiene "
+            "con Ctrl+C o SIGTERM tras terminar la tarea en curso.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Número de procesos worker (por defecto 1, en este mismo proceso).")
+        parser.add_argument('--burst', action='store_true',
+                            help="Termina cuando no quedan tareas listas (útil desde cron o en pruebas).")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Segundos de espera cuando la cola está vacía.")
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1:
+            raise CommandError("--processes debe ser al menos 1.")
+        if options['processes'] == 1:
+            processed = self._work_here(options['burst'], options['poll_interval'])
+            self.stdout.write(self.style.SUCCESS(f"Worker detenido: {processed} tareas ejecutadas."))
+            return
+
+        # 'spawn': cada worker arranca Django y abre sus propias conexiones
+        # (también en Windows, donde no existe fork).
+        context = multiprocessing.get_context('spawn')
+        stop = context.Event()
+        workers = [
+            context.Process(target=_worker_process, args=(stop, options['burst'], options['poll_interval']),
+                            name=f'cafecentral-worker-{number}')
+            for number in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"{len(workers)} workers en marcha.")
+        _stop_on_signals(stop)
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS("Workers detenidos."))
+
+    def _work_here(self, burst, poll_interval):
+        from inventory.tasks import work
+
+        stop = threading.Event()
+        _stop_on_signals(stop)
+        return work(stop=stop, burst=burst, poll_interval=poll_interval)
+
+
+def _stop_on_signals(stop):
+    """Ctrl+C y SIGTERM piden parar: se termina la tarea en curso y se sale."""
+    def handler(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def _worker_process(stop, burst, poll_interval):
+    # Proceso nuevo ('spawn'): hay que configurar Django antes de importar modelos.
+    import django
+
+    django.setup()
+    from inventory.tasks import work
+
+    # Ctrl+C llega a todo el grupo de procesos: el proceso principal es quien activa `stop`.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    work(stop=stop, burst=burst, poll_interval=poll_interval)
@@ -0,0 +1,31 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory.snapshots import take_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Guarda la instantánea de cierre (stock y valoración por producto) de un día; por "
+            "defecto, el de ayer. Pensado para ejecutarse a diario (p. ej. desde cron poco después "
+            "de medianoche). Con --days rellena también los días anteriores.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat,
+                            help="Día a registrar (AAAA-MM-DD). Por defecto, ayer (hora local).")
+        parser.add_argument('--days', type=int, default=1,
+                            help="Número de días a registrar hacia atrás desde --date (por defecto 1).")
+
+    def handle(self, *args, **options):
+        snapshot_date = options['date'] or timezone.localdate() - datetime.timedelta(days=1)
+        if snapshot_date > timezone.localdate():
+            raise CommandError("No se puede tomar una instantánea de un día futuro.")
+        if options['days'] < 1:
+            raise CommandError("--days debe ser al menos 1.")
+
+        written = take_snapshot(snapshot_date, days=options['days'])
+        first_date = snapshot_date - datetime.timedelta(days=options['days'] - 1)
+        self.stdout.write(self.style.SUCCESS(
+            f"{written} instantáneas guardadas ({first_date} a {snapshot_date})."
+        ))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:12
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_session_totals(apps, schema_editor):
+    DailySalesSession = apps.get_model('inventory', 'DailySalesSession')
+    SaleItem = apps.get_model('inventory', 'SaleItem')
+    items = SaleItem.objects.filter(sale_session=OuterRef('pk')).order_by().values('sale_session')
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+    DailySalesSession.objects.update(
+        total_revenue=Coalesce(Subquery(items.annotate(total=Sum('subtotal')).values('total')),
+                               Value(Decimal('0')), output_field=money),
+        total_quantity=Coalesce(Subquery(items.annotate(total=Sum('quantity_sold')).values('total')),
+                                Value(Decimal('0')), output_field=money),
+        item_count=Coalesce(Subquery(items.annotate(total=Count('pk')).values('total')),
+                            Value(0), output_field=models.IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_alter_stockalert_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailysalessession',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Número de ítems de venta de la sesión.'),
+        ),
+        migrations.AddField(
+            model_name='dailysalessession',
+            name='total_quantity',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Suma de las cantidades vendidas en la sesión.', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='dailysalessession',
+            name='total_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Suma de los subtotales de los ítems de la sesión.', max_digits=12),
+        ),
+        migrations.RunPython(backfill_session_totals, migrations.RunPython.noop),
+    ]
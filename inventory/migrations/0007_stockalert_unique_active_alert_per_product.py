@@ -0,0 +1,30 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def resolve_duplicate_active_alerts(apps, schema_editor):
+    """Deja una sola alerta activa por producto (la más antigua) antes de crear el índice."""
+    StockAlert = apps.get_model('inventory', 'StockAlert')
+    oldest_active = (StockAlert.objects.filter(product=OuterRef('product'), resolved=False)
+                     .order_by('alert_timestamp', 'pk').values('pk')[:1])
+    (StockAlert.objects.filter(resolved=False)
+     .exclude(pk=Subquery(oldest_active))
+     .update(resolved=True, resolved_by_user=None, resolved_timestamp=timezone.now()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_dailysalessession_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicate_active_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved', False)), fields=('product',), name='unique_active_alert_per_product', violation_error_message='Este producto ya tiene una alerta activa.'),
+        ),
+    ]
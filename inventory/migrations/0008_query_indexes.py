@@ -0,0 +1,61 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:19
+
+import django.db.models.expressions
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyIfPostgres(AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY en PostgreSQL: las tablas de productos, alertas y
+    movimientos siguen admitiendo escrituras (ventas, recepciones) mientras se
+    construye el índice. En otros motores (SQLite en desarrollo), AddIndex normal.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY no puede ejecutarse dentro de una transacción.
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0007_stockalert_unique_active_alert_per_product'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('current_stock'), '-', models.F('minimum_stock_level')), name='product_stock_margin_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='stockalert',
+            index=models.Index(fields=['-alert_timestamp', '-id'], name='stockalert_recent_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='stockalert',
+            index=models.Index(condition=models.Q(('resolved', False)), fields=['-alert_timestamp', '-id'], name='stockalert_active_recent_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='stockmovement',
+            index=models.Index(fields=['-movement_date', '-id'], name='stockmovement_recent_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='stockmovement',
+            index=models.Index(fields=['movement_type', '-movement_date'], name='stockmovement_type_date_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', '-movement_date'], name='stockmovement_product_date_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField(help_text='Día (hora local) cuyo cierre se registra.')),
+                ('closing_stock', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('unit_cost', models.DecimalField(decimal_places=2, help_text='Precio de compra del producto al tomar la instantánea.', max_digits=10)),
+                ('stock_value', models.DecimalField(decimal_places=2, help_text='Valoración del stock de cierre (stock × precio de compra).', max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Instantánea de Inventario',
+                'verbose_name_plural': 'Instantáneas de Inventario',
+                'ordering': ['-snapshot_date', 'product__name'],
+                'indexes': [models.Index(fields=['snapshot_date'], name='snapshot_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'snapshot_date'), name='unique_snapshot_per_product_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_sessions_stale(apps, schema_editor):
+    # El resumen empieza vacío: las sesiones con ventas se marcan para que el
+    # primer `refresh_sales_rollup` lo rellene.
+    DailySalesSession = apps.get_model('inventory', 'DailySalesSession')
+    SaleItem = apps.get_model('inventory', 'SaleItem')
+    DailySalesSession.objects.filter(pk__in=SaleItem.objects.values('sale_session')).update(rollup_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_inventory_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sale_date', models.DateField()),
+                ('quantity_sold', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cost', models.DecimalField(decimal_places=2, help_text='Cantidad vendida × precio de compra al proveedor (al recalcular).', max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria por Producto',
+                'verbose_name_plural': 'Ventas Diarias por Producto',
+                'ordering': ['-sale_date', 'product__name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='dailysalessession',
+            name='rollup_stale',
+            field=models.BooleanField(default=False, editable=False, help_text='El resumen de ventas por producto está desactualizado.'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysalessession',
+            index=models.Index(condition=models.Q(('rollup_stale', True)), fields=['sale_date'], name='session_rollup_stale_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='inventory.product'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='sale_session',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_sales', to='inventory.dailysalessession'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductsales',
+            index=models.Index(fields=['sale_date', 'product'], name='dailyproductsales_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductsales',
+            index=models.Index(fields=['product', 'sale_date'], name='dailyproductsales_product_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('sale_session', 'product'), name='unique_daily_product_sales'),
+        ),
+        migrations.RunPython(mark_sessions_stale, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_daily_product_sales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('DRAFT', 'Borrador'), ('CONFIRMED', 'Confirmado'), ('RECEIVED', 'Recibido'), ('CANCELLED', 'Cancelado')], default='DRAFT', max_length=10)),
+                ('expected_delivery_date', models.DateField(blank=True, help_text='Próximo día de reparto del proveedor al generar el pedido.', null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('confirmed_at', models.DateTimeField(blank=True, null=True)),
+                ('received_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchase_orders_created', to=settings.AUTH_USER_MODEL)),
+                ('received_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchase_orders_received', to=settings.AUTH_USER_MODEL)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='purchase_orders', to='inventory.supplier')),
+            ],
+            options={
+                'verbose_name': 'Pedido a Proveedor',
+                'verbose_name_plural': 'Pedidos a Proveedores',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PurchaseOrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, help_text='Cantidad a pedir (en la unidad de medida del producto).', max_digits=10)),
+                ('unit_price', models.DecimalField(decimal_places=2, help_text='Precio de compra por unidad al generar el pedido.', max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.purchaseorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='purchase_order_lines', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Línea de Pedido',
+                'verbose_name_plural': 'Líneas de Pedido',
+                'ordering': ['product__name'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['-created_at', '-id'], name='purchaseorder_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['status', 'supplier'], name='purchaseorder_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='purchaseorderline',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='unique_product_per_purchase_order'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:05
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_alerts_notified(apps, schema_editor):
+    # Las alertas anteriores ya se ven en la lista: el primer resumen solo incluye las nuevas.
+    StockAlert = apps.get_model('inventory', 'StockAlert')
+    StockAlert.objects.update(notified_at=F('alert_timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockalert',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Momento en que la alerta se envió en un resumen por correo.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(condition=models.Q(('notified_at__isnull', True), ('resolved', False)), fields=['alert_timestamp'], name='stockalert_unnotified_idx'),
+        ),
+        migrations.RunPython(mark_existing_alerts_notified, migrations.RunPython.noop),
+    ]
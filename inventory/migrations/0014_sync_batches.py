@@ -0,0 +1,50 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:14
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_stockalert_notified_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Clave de idempotencia del lote, generada por el TPV.', max_length=64, unique=True)),
+                ('device', models.CharField(blank=True, help_text='Identificador del TPV que envió el lote.', max_length=100)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('results', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Resultado por línea devuelto al TPV (se repite si reenvía el lote).', null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sync_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lote de Sincronización',
+                'verbose_name_plural': 'Lotes de Sincronización',
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Clave de idempotencia de la línea, generada por el cliente.', max_length=64, unique=True)),
+                ('kind', models.CharField(choices=[('SALE', 'Venta'), ('MOVEMENT', 'Movimiento de stock')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.syncbatch')),
+                ('sale_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sync_lines', to='inventory.saleitem')),
+                ('stock_movement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sync_lines', to='inventory.stockmovement')),
+            ],
+            options={
+                'verbose_name': 'Línea Sincronizada',
+                'verbose_name_plural': 'Líneas Sincronizadas',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
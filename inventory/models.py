@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone # Para fechas y horas
-from decimal import Decimal # Importar Decimal para precisión en cálculos
+from decimal import Decimal, ROUND_HALF_UP # Importar Decimal para precisión en cálculos
+
+from .caching import bump_versions
 
 # --- MODELOS DE ROLES Y USUARIOS ---
 
@@ -80,6 +83,63 @@ class Supplier(models.Model):
     def __str__(self):
         return self.name
 
+# Margen de stock sobre el mínimo; <= 0 significa stock bajo.
+STOCK_MARGIN = models.F('current_stock') - models.F('minimum_stock_level')
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    update() y bulk_update() no pasan por Product.save(): actualizan
+    last_updated igual que auto_now y, si tocan el stock o el mínimo,
+    re-evalúan las alertas de los productos afectados en bloque.
+    """
+    ALERT_FIELDS = {'current_stock', 'minimum_stock_level'}
+
+    def low_stock(self):
+        """
+        Productos con stock por debajo/igual al mínimo. Se expresa como margen
+        (stock - mínimo <= 0) para que use el índice de expresión product_stock_margin_idx.
+        ExpressionWrapper no cambia el SQL en PostgreSQL; en SQLite añade el
+        mismo CAST que Django pone en la expresión del índice, sin el cual no coincide.
+        """
+        margin = models.ExpressionWrapper(STOCK_MARGIN, output_field=models.DecimalField())
+        return self.alias(stock_margin=margin).filter(stock_margin__lte=0)
+
+    def update(self, **kwargs):
+        # Como save() (auto_now): last_updated es la versión que usa la API (ver inventory.api).
+        kwargs.setdefault('last_updated', timezone.now())
+        # Sin post_save: invalida aquí las páginas en caché (ver inventory.caching).
+        bump_versions(self.model)
+        if not self.ALERT_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        from .alerts import reconcile_alerts
+
+        with transaction.atomic():
+            pks = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            reconcile_alerts(self.model.objects.filter(pk__in=pks))
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        bump_versions(self.model)
+        if 'last_updated' not in fields:
+            now = timezone.now()
+            for obj in objs:
+                obj.last_updated = now
+            fields = [*fields, 'last_updated']
+        if not self.ALERT_FIELDS.intersection(fields):
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+        from .alerts import reconcile_alerts
+
+        with transaction.atomic():
+            rows = super().bulk_update(objs, fields, batch_size=batch_size)
+            reconcile_alerts(self.model.objects.filter(pk__in=[obj.pk for obj in objs]))
+        for obj in objs:
+            obj._loaded_stock = obj.current_stock
+        return rows
+
+
 class Product(models.Model):
     """
     Representa un producto en el inventario del café.
@@ -106,54 +166,53 @@ class Product(models.Model):
                                                         help_text="Precio de compra al proveedor.")
     last_updated = models.DateTimeField(auto_now=True) # Se actualiza automáticamente en cada guardado
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         ordering = ['name']
+        indexes = [
+            models.Index(STOCK_MARGIN, name='product_stock_margin_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.current_stock} {self.get_unit_of_measurement_display()})" # Usar get_unit_of_measurement_display
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stock con el que se cargó la instancia: permite a save() saber si el
+        # stock subió sin volver a leer el producto.
+        instance._loaded_stock = instance.__dict__.get('current_stock')
+        return instance
+
     def save(self, *args, **kwargs):
-        # Guardar el valor original de current_stock antes de la actualización
-        # Esto es crucial para detectar si el stock ha cambiado
+        """
+        Guarda el producto y sincroniza sus alertas de stock (ver
+        inventory.alerts.sync_stock_alerts): crea una alerta si el stock está
+        por debajo/igual al mínimo y la resuelve si el stock SUBE y SUPERA el mínimo.
+        """
+        from .alerts import sync_stock_alerts
+        from .events import publish_stock_changes
+        from .stock import StockChange
+
         original_stock = None
-        if self.pk: # Si el objeto ya existe, obtenemos su estado actual de la base de datos
-            try:
-                original_product = Product.objects.get(pk=self.pk)
-                original_stock = original_product.current_stock
-            except Product.DoesNotExist:
-                pass # Esto no debería pasar si self.pk existe, pero es un buen control
-
-        super().save(*args, **kwargs) # Llama al método save original para guardar el producto
-
-        # Lógica para crear o resolver alertas de stock DESPUÉS de guardar
-        # Usamos Decimal para comparaciones precisas
-        
-        # 1. Lógica para CREAR alertas
-        # Crea una alerta si el stock está por debajo/igual al mínimo,
-        # y si NO hay ya una alerta ACTIVA para este producto.
-        # (Esto evita duplicados y alertas falsas).
-        if self.current_stock <= self.minimum_stock_level:
-            # Solo crear alerta si no existe una activa
-            if not StockAlert.objects.filter(product=self, resolved=False).exists():
-                StockAlert.objects.create(
-                    product=self,
-                    current_stock_at_alert=self.current_stock,
-                    alert_timestamp=timezone.now()
-                )
-        
-        # 2. Lógica para RESOLVER alertas
-        # Resuelve alertas si el stock SUBE y SUPERA el nivel mínimo.
-        if (original_stock is not None and self.current_stock > original_stock and
-            self.current_stock > self.minimum_stock_level):
-            
-            active_alerts = StockAlert.objects.filter(product=self, resolved=False)
-            for alert in active_alerts:
-                alert.resolved = True
-                alert.resolved_by_user = None # O podrías buscar un usuario 'sistema' si lo creas.
-                alert.resolved_timestamp = timezone.now()
-                alert.save()
+        if not self._state.adding:
+            original_stock = getattr(self, '_loaded_stock', None)
+            if original_stock is None and self.pk:
+                # Instancia no cargada desde la base de datos (o con campos diferidos).
+                original_stock = (Product.objects.filter(pk=self.pk)
+                                  .values_list('current_stock', flat=True).first())
+
+        with transaction.atomic():
+            super().save(*args, **kwargs) # Llama al método save original para guardar el producto
+            delta = self.current_stock - original_stock if original_stock is not None else Decimal('0')
+            change = StockChange(self.pk, delta, self.current_stock, self.minimum_stock_level)
+            sync_stock_alerts([change])
+            if delta:
+                publish_stock_changes([change])
+        self._loaded_stock = self.current_stock
 
 class StockAlert(models.Model):
     """
@@ -166,13 +225,30 @@ class StockAlert(models.Model):
     resolved_by_user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True,
                                          related_name='resolved_alerts')
     resolved_timestamp = models.DateTimeField(blank=True, null=True)
+    # Lo marca el resumen por correo que incluyó la alerta (ver inventory.notifications).
+    notified_at = models.DateTimeField(blank=True, null=True, editable=False,
+                                       help_text="Momento en que la alerta se envió en un resumen por correo.")
 
     class Meta:
         verbose_name = "Alerta de Stock"
         verbose_name_plural = "Alertas de Stock"
         ordering = ['-alert_timestamp'] # Ordena las alertas más nuevas primero
-        # Nota: Removemos unique_together porque debe permitir múltiples alertas resueltas
-        # La lógica de negocio en Product.save() se encarga de evitar alertas duplicadas no resueltas
+        # Puede haber muchas alertas resueltas por producto, pero como mucho una activa.
+        # El índice único parcial lo garantiza aunque dos guardados ocurran a la vez.
+        constraints = [
+            models.UniqueConstraint(fields=['product'], condition=models.Q(resolved=False),
+                                    name='unique_active_alert_per_product',
+                                    violation_error_message="Este producto ya tiene una alerta activa."),
+        ]
+        indexes = [
+            # Lista de alertas (paginación por cursor) y alertas activas más recientes.
+            models.Index(fields=['-alert_timestamp', '-id'], name='stockalert_recent_idx'),
+            models.Index(fields=['-alert_timestamp', '-id'], condition=models.Q(resolved=False),
+                         name='stockalert_active_recent_idx'),
+            # Alertas pendientes del próximo resumen por correo.
+            models.Index(fields=['alert_timestamp'], condition=models.Q(resolved=False, notified_at__isnull=True),
+                         name='stockalert_unnotified_idx'),
+        ]
 
     def __str__(self):
         status = "Resuelta" if self.resolved else "Activa"
@@ -194,22 +270,35 @@ class DailySalesSession(models.Model):
     # Si 'updated_at' es útil para auditoría de la sesión misma, podrías añadirla.
     # updated_at = models.DateTimeField(auto_now=True) 
 
+    # Totales desnormalizados: los mantiene el flujo de escritura de SaleItem
+    # (ver inventory.sales.update_session_totals). Se pueden recalcular con
+    # `python manage.py recalculate_session_totals`.
+    total_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False,
+                                        help_text="Suma de los subtotales de los ítems de la sesión.")
+    total_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False,
+                                         help_text="Suma de las cantidades vendidas en la sesión.")
+    item_count = models.PositiveIntegerField(default=0, editable=False,
+                                             help_text="Número de ítems de venta de la sesión.")
+    # Marca la sesión para que `refresh_sales_rollup` recalcule sus filas de
+    # DailyProductSales; la activa el mismo UPDATE que ajusta los totales.
+    rollup_stale = models.BooleanField(default=False, editable=False,
+                                       help_text="El resumen de ventas por producto está desactualizado.")
+
     class Meta:
         verbose_name = "Sesión de Venta Diaria"
         verbose_name_plural = "Sesiones de Ventas Diarias"
         ordering = ['-sale_date']
+        indexes = [
+            # Sesiones pendientes de recalcular en el resumen (normalmente muy pocas).
+            models.Index(fields=['sale_date'], condition=models.Q(rollup_stale=True),
+                         name='session_rollup_stale_idx'),
+        ]
 
     def __str__(self):
         # Aseguramos que registered_by_user no sea None
         user_display = self.registered_by_user.username if self.registered_by_user else 'N/A'
         return f"Ventas del {self.sale_date.strftime('%Y-%m-%d')} por {user_display}"
 
-    @property
-    def total_revenue(self):
-        """Calcula el total de ingresos para esta sesión de venta."""
-        # Usa aggregate para eficiencia
-        return self.sale_items.aggregate(total=models.Sum('subtotal'))['total'] or Decimal('0.00')
-
 class SaleItem(models.Model):
     """
     Representa un ítem individual vendido dentro de una DailySalesSession.
@@ -229,43 +318,114 @@ class SaleItem(models.Model):
         unique_together = ('sale_session', 'product') 
         ordering = ['sale_session__sale_date', 'product__name']
 
+    # Campos cuyo valor en la base de datos se recuerda para calcular los deltas
+    # de stock y de totales de la sesión al guardar.
+    TRACKED_FIELDS = ('sale_session_id', 'product_id', 'quantity_sold', 'subtotal')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Recordamos lo que hay en la base de datos para calcular los deltas
+        # al guardar sin tener que volver a consultar la fila.
+        instance._loaded_state = tuple(instance.__dict__.get(name) for name in cls.TRACKED_FIELDS)
+        return instance
+
     def save(self, *args, **kwargs):
         """
-        Calcula el subtotal antes de guardar y ajusta el stock del producto.
+        Calcula el subtotal antes de guardar y ajusta el stock del producto
+        y los totales de la sesión.
         """
+        from .sales import update_session_totals
+        from .stock import apply_stock_deltas
+
         # Calcular subtotal antes de guardar
-        self.subtotal = self.quantity_sold * self.price_at_sale
-
-        # Lógica para ajustar el stock del producto
-        if self.pk: # Si es una actualización de un SaleItem existente
-            original_item = SaleItem.objects.get(pk=self.pk)
-            # Diferencia neta en la cantidad vendida
-            stock_change_amount = self.quantity_sold - original_item.quantity_sold
-            # Revertir el stock original y aplicar el nuevo cambio
-            self.product.current_stock -= stock_change_amount
-        else: # Si es un nuevo SaleItem
-            self.product.current_stock -= self.quantity_sold
-        
-        # Primero guardamos el SaleItem. Si el SaleItem tiene un PK nulo, Django lo creará.
-        # Si tiene un PK, lo actualizará.
-        super().save(*args, **kwargs) 
-        
-        # Despues de que SaleItem se ha guardado, guardamos el producto
-        # Esto activa el Product.save() modificado, que manejará las alertas.
-        self.product.save() # Llama al método save del Producto. No necesitamos update_fields aquí.
+        self.subtotal = self.calculate_subtotal()
+
+        # Delta de stock por producto: lo vendido ahora menos lo que ya se había descontado
+        stock_deltas = {self.product_id: -self.quantity_sold}
+        session_deltas = {self.sale_session_id: (self.subtotal, self.quantity_sold, 1)}
+        if not self._state.adding: # Si es una actualización de un SaleItem existente
+            loaded_state = getattr(self, '_loaded_state', None)
+            if loaded_state is None or None in loaded_state:
+                loaded_state = SaleItem.objects.filter(pk=self.pk).values_list(*self.TRACKED_FIELDS).get()
+            original_session_id, original_product_id, original_quantity, original_subtotal = loaded_state
+            stock_deltas[original_product_id] = stock_deltas.get(original_product_id, 0) + original_quantity
+            revenue, quantity, count = session_deltas.get(original_session_id, (0, 0, 0))
+            session_deltas[original_session_id] = (revenue - original_subtotal,
+                                                   quantity - original_quantity,
+                                                   count - 1)
+
+        # Sin SAVEPOINT dentro de otra transacción (como Model.save_base): un
+        # error deshace la transacción exterior, que de todos modos lo propaga.
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            # UPDATE atómico (current_stock = current_stock + delta); también evalúa las alertas.
+            changes = apply_stock_deltas(stock_deltas)
+            update_session_totals(session_deltas)
+        self._loaded_state = tuple(getattr(self, name) for name in self.TRACKED_FIELDS)
+        self._refresh_cached_product_stock(changes)
 
     def delete(self, *args, **kwargs):
         """
-        Cuando se elimina un SaleItem, devuelve el stock al producto.
+        Cuando se elimina un SaleItem, devuelve el stock al producto y lo
+        descuenta de los totales de la sesión.
         """
-        self.product.current_stock += self.quantity_sold
-        self.product.save() # Llama al método save del Producto, que manejará las alertas.
-        super().delete(*args, **kwargs)
+        from .sales import update_session_totals
+        from .stock import apply_stock_deltas
+
+        with transaction.atomic(savepoint=False):
+            result = super().delete(*args, **kwargs)
+            changes = apply_stock_deltas({self.product_id: self.quantity_sold})
+            update_session_totals({self.sale_session_id: (-self.subtotal, -self.quantity_sold, -1)})
+        self._refresh_cached_product_stock(changes)
+        return result
+
+    def calculate_subtotal(self):
+        """Subtotal redondeado a 2 decimales, igual que se almacena en la base de datos."""
+        return (self.quantity_sold * self.price_at_sale).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
+    def _refresh_cached_product_stock(self, changes):
+        # Mantiene sincronizado el producto en memoria sin volver a leerlo.
+        if SaleItem.product.is_cached(self) and self.product_id in changes:
+            self.product.current_stock = self.product._loaded_stock = changes[self.product_id].new_stock
 
     def __str__(self):
         return f"{self.quantity_sold} de {self.product.name} en Venta del {self.sale_session.sale_date}"
 
+class DailyProductSales(models.Model):
+    """
+    Resumen materializado de ventas por producto y día (cantidad, ingresos y
+    coste a precio de proveedor), para que los informes y las analíticas no
+    tengan que agregar SaleItem ni unirlo con DailySalesSession.
+
+    Se recalcula por sesión: cualquier cambio de SaleItem marca su sesión
+    (rollup_stale) y inventory.rollups.refresh_daily_product_sales reprocesa
+    solo las sesiones marcadas.
+    """
+    sale_session = models.ForeignKey(DailySalesSession, on_delete=models.CASCADE, related_name='product_sales')
+    # Copia de sale_session.sale_date para filtrar y agrupar sin unir tablas.
+    sale_date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity_sold = models.DecimalField(max_digits=12, decimal_places=2)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+    cost = models.DecimalField(max_digits=12, decimal_places=2,
+                               help_text="Cantidad vendida × precio de compra al proveedor (al recalcular).")
+
+    class Meta:
+        verbose_name = "Venta Diaria por Producto"
+        verbose_name_plural = "Ventas Diarias por Producto"
+        ordering = ['-sale_date', 'product__name']
+        constraints = [
+            models.UniqueConstraint(fields=['sale_session', 'product'], name='unique_daily_product_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['sale_date', 'product'], name='dailyproductsales_date_idx'),
+            models.Index(fields=['product', 'sale_date'], name='dailyproductsales_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} el {self.sale_date}: {self.quantity_sold}"
+
 # --- MODELO PARA MOVIMIENTOS DE STOCK ---
 
 class StockMovement(models.Model):
@@ -295,42 +455,281 @@ class StockMovement(models.Model):
         verbose_name = "Movimiento de Stock"
         verbose_name_plural = "Movimientos de Stock"
         ordering = ['-movement_date', 'product__name']
+        indexes = [
+            # Lista de movimientos (paginación por cursor) y estadísticas por periodo.
+            models.Index(fields=['-movement_date', '-id'], name='stockmovement_recent_idx'),
+            models.Index(fields=['movement_type', '-movement_date'], name='stockmovement_type_date_idx'),
+            # Historial de un producto.
+            models.Index(fields=['product', '-movement_date'], name='stockmovement_product_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_movement_type_display()} de {self.quantity} {self.product.get_unit_of_measurement_display()} de {self.product.name} ({self.movement_date.strftime('%Y-%m-%d %H:%M')})"
 
-    def save(self, *args, **kwargs):
-        # Guardar el movimiento para obtener un PK si es nuevo
-        super().save(*args, **kwargs)
-        
-        # Necesitamos la instancia más reciente del producto desde la base de datos
-        # para evitar problemas de concurrencia si el stock ya cambió en otro lugar.
-        product = Product.objects.get(pk=self.product.pk)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Efecto sobre el stock tal como está en la base de datos (si se cargaron los campos).
+        if all(name in instance.__dict__ for name in ('product_id', 'movement_type', 'quantity')):
+            instance._loaded_stock_effect = instance.stock_effect()
+        return instance
 
+    def stock_effect(self):
+        """Devuelve (product_id, delta) con el efecto de este movimiento sobre el stock."""
         if self.movement_type == 'IN':
-            product.current_stock += self.quantity
+            return self.product_id, self.quantity
         elif self.movement_type == 'OUT':
-            if product.current_stock < self.quantity:
-                print(f"Advertencia: Intentando reducir stock de {product.name} a negativo. Stock actual: {product.current_stock}, Cantidad a retirar: {self.quantity}")
-                product.current_stock = Decimal('0.00') # Asegura que no baje de cero
-            else:
-                product.current_stock -= self.quantity
-        
-        # Guarda el producto actualizado. Esto activará el método save() del producto,
-        # el cual ya contiene la lógica de `StockAlert`.
-        product.save()
+            return self.product_id, -self.quantity
+        return self.product_id, Decimal('0.00')
+
+    def save(self, *args, **kwargs):
+        from .stock import apply_stock_deltas
+
+        product_id, delta = self.stock_effect()
+        deltas = {product_id: delta}
+        if not self._state.adding: # Si se edita un movimiento existente, se revierte su efecto anterior
+            original_product_id, original_delta = getattr(self, '_loaded_stock_effect', (None, None))
+            if original_product_id is None:
+                original = StockMovement.objects.get(pk=self.pk)
+                original_product_id, original_delta = original.stock_effect()
+            deltas[original_product_id] = deltas.get(original_product_id, 0) - original_delta
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Una salida nunca deja el stock por debajo de cero; el UPDATE lo recorta a cero
+            # incluso si dos salidas concurrentes pasan la validación del formulario.
+            changes = apply_stock_deltas(deltas, allow_negative=False)
+        self._loaded_stock_effect = (product_id, delta)
+        self._refresh_cached_product_stock(changes)
 
     def delete(self, *args, **kwargs):
         """
         Cuando se elimina un StockMovement, se revierte el cambio en el stock del producto.
         """
-        product = Product.objects.get(pk=self.product.pk) # Obtener la instancia más reciente
-        if self.movement_type == 'IN':
-            # Si era una entrada, al eliminarla se resta la cantidad del stock
-            product.current_stock -= self.quantity
-        elif self.movement_type == 'OUT':
-            # Si era una salida, al eliminarla se suma la cantidad al stock
-            product.current_stock += self.quantity
-        
-        product.save() # Guarda el producto actualizado, lo que manejará las alertas.
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        from .stock import apply_stock_deltas
+
+        product_id, delta = self.stock_effect()
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            changes = apply_stock_deltas({product_id: -delta})
+        self._refresh_cached_product_stock(changes)
+        return result
+
+    def _refresh_cached_product_stock(self, changes):
+        # Mantiene sincronizado el producto en memoria sin volver a leerlo.
+        if StockMovement.product.is_cached(self) and self.product_id in changes:
+            self.product.current_stock = self.product._loaded_stock = changes[self.product_id].new_stock
+
+# --- INSTANTÁNEAS DE INVENTARIO ---
+
+class InventorySnapshot(models.Model):
+    """
+    Stock de cierre (y su valoración) de un producto al final de un día.
+
+    Las escribe el comando `snapshot_inventory` (programado a diario) y
+    permiten responder el stock en cualquier fecha partiendo de la instantánea
+    más cercana y aplicando solo los movimientos y ventas posteriores
+    (ver inventory.snapshots.stock_at).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='snapshots')
+    snapshot_date = models.DateField(help_text="Día (hora local) cuyo cierre se registra.")
+    closing_stock = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2,
+                                    help_text="Precio de compra del producto al tomar la instantánea.")
+    stock_value = models.DecimalField(max_digits=14, decimal_places=2,
+                                      help_text="Valoración del stock de cierre (stock × precio de compra).")
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Instantánea de Inventario"
+        verbose_name_plural = "Instantáneas de Inventario"
+        ordering = ['-snapshot_date', 'product__name']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'snapshot_date'], name='unique_snapshot_per_product_day'),
+        ]
+        indexes = [
+            # Fechas con instantánea (la más cercana a una fecha dada).
+            models.Index(fields=['snapshot_date'], name='snapshot_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} al cierre del {self.snapshot_date}: {self.closing_stock}"
+
+# --- PEDIDOS A PROVEEDORES ---
+
+class PurchaseOrder(models.Model):
+    """
+    Pedido a un proveedor. Los borradores los genera el motor de sugerencias
+    (inventory.purchasing) agrupando por proveedor y próximo día de reparto;
+    al recibir un pedido confirmado sus líneas se registran como entradas de
+    stock en una sola transacción.
+    """
+    STATUS_CHOICES = (
+        ('DRAFT', 'Borrador'),
+        ('CONFIRMED', 'Confirmado'),
+        ('RECEIVED', 'Recibido'),
+        ('CANCELLED', 'Cancelado'),
+    )
+
+    supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, related_name='purchase_orders')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='DRAFT')
+    expected_delivery_date = models.DateField(blank=True, null=True,
+                                              help_text="Próximo día de reparto del proveedor al generar el pedido.")
+    notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='purchase_orders_created')
+    confirmed_at = models.DateTimeField(blank=True, null=True)
+    received_at = models.DateTimeField(blank=True, null=True)
+    received_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='purchase_orders_received')
+
+    class Meta:
+        verbose_name = "Pedido a Proveedor"
+        verbose_name_plural = "Pedidos a Proveedores"
+        ordering = ['-created_at']
+        indexes = [
+            # Lista de pedidos (paginación por cursor) y pedidos pendientes de recibir.
+            models.Index(fields=['-created_at', '-id'], name='purchaseorder_recent_idx'),
+            models.Index(fields=['status', 'supplier'], name='purchaseorder_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pedido #{self.pk} a {self.supplier.name} ({self.get_status_display()})"
+
+    @property
+    def is_draft(self):
+        return self.status == 'DRAFT'
+
+    @property
+    def is_confirmed(self):
+        return self.status == 'CONFIRMED'
+
+
+class PurchaseOrderLine(models.Model):
+    """
+    Línea de un pedido: cantidad a pedir de un producto y su precio de compra
+    al generar el pedido.
+    """
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='purchase_order_lines')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2,
+                                   help_text="Cantidad a pedir (en la unidad de medida del producto).")
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2,
+                                     help_text="Precio de compra por unidad al generar el pedido.")
+
+    class Meta:
+        verbose_name = "Línea de Pedido"
+        verbose_name_plural = "Líneas de Pedido"
+        ordering = ['product__name']
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='unique_product_per_purchase_order'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} {self.product.get_unit_of_measurement_display()} de {self.product.name}"
+
+    @property
+    def subtotal(self):
+        return (self.quantity * self.unit_price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+# --- COLA DE TAREAS EN SEGUNDO PLANO ---
+
+class Task(models.Model):
+    """
+    Tarea pendiente de ejecutar fuera de la petición (correos, refresco del
+    resumen de ventas, exportaciones). Se encola con inventory.tasks.enqueue
+    y la ejecutan los procesos de `python manage.py run_worker`.
+    """
+    STATUS_CHOICES = (
+        ('PENDING', 'Pendiente'),
+        ('RUNNING', 'En ejecución'),
+        ('DONE', 'Completada'),
+        ('FAILED', 'Fallida'),
+    )
+
+    name = models.CharField(max_length=100, help_text="Nombre de la tarea registrada (ver inventory.tasks).")
+    kwargs = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder,
+                              help_text="Argumentos con nombre de la tarea.")
+    key = models.CharField(max_length=100, blank=True, null=True,
+                           help_text="Clave de deduplicación: como mucho una tarea pendiente por clave.")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="No se ejecuta antes de este momento.")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='PENDING'),
+                                    name='unique_pending_task_key'),
+        ]
+        indexes = [
+            # Tareas por reclamar (normalmente muy pocas frente al historial).
+            models.Index(fields=['run_at', 'id'], condition=models.Q(status__in=['PENDING', 'RUNNING']),
+                         name='task_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+# --- SINCRONIZACIÓN DE LOS TPV ---
+
+class SyncBatch(models.Model):
+    """
+    Lote de ventas y movimientos enviado por un TPV (ver inventory.sync). Su
+    clave, generada por el TPV, hace que reenviar el mismo lote devuelva el
+    resultado guardado en lugar de aplicarlo otra vez.
+    """
+    key = models.CharField(max_length=64, unique=True, help_text="Clave de idempotencia del lote, generada por el TPV.")
+    device = models.CharField(max_length=100, blank=True, help_text="Identificador del TPV que envió el lote.")
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='sync_batches')
+    received_at = models.DateTimeField(auto_now_add=True)
+    line_count = models.PositiveIntegerField(default=0)
+    results = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder,
+                               help_text="Resultado por línea devuelto al TPV (se repite si reenvía el lote).")
+
+    class Meta:
+        verbose_name = "Lote de Sincronización"
+        verbose_name_plural = "Lotes de Sincronización"
+        ordering = ['-received_at']
+
+    def __str__(self):
+        return f"Lote {self.key} ({self.device or 'TPV'}, {self.line_count} líneas)"
+
+
+class SyncLine(models.Model):
+    """
+    Venta o movimiento ya aplicado, por su clave de idempotencia. El índice
+    único sobre `key` impide aplicar dos veces la misma línea, aunque llegue
+    en otro lote o desde un formulario enviado dos veces.
+    """
+    KIND_CHOICES = (
+        ('SALE', 'Venta'),
+        ('MOVEMENT', 'Movimiento de stock'),
+    )
+
+    key = models.CharField(max_length=64, unique=True, help_text="Clave de idempotencia de la línea, generada por el cliente.")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Sin lote: la línea viene de un formulario de la interfaz.
+    batch = models.ForeignKey(SyncBatch, on_delete=models.CASCADE, null=True, blank=True, related_name='lines')
+    sale_item = models.ForeignKey(SaleItem, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='sync_lines')
+    stock_movement = models.ForeignKey(StockMovement, on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='sync_lines')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Línea Sincronizada"
+        verbose_name_plural = "Líneas Sincronizadas"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.key}"
@@ -0,0 +1,97 @@
+"""
+Resúmenes por correo de las alertas de stock bajo.
+
+Crear alertas no envía nada: create_alerts() encola (ver inventory.tasks)
+una única tarea `send_alert_digests` con retraso ALERT_DIGEST_WINDOW. Las
+alertas creadas durante la ventana encuentran esa tarea pendiente y no
+encolan otra, así que una mañana con 40 productos bajo mínimos produce un
+solo resumen en lugar de 40 correos.
+
+Al ejecutarse, el resumen reclama todas las alertas activas aún sin
+notificar (SELECT ... FOR UPDATE SKIP LOCKED y un UPDATE condicional de
+notified_at, de modo que dos workers nunca envían la misma alerta) y
+confirma la reclamación antes de enviar: las alertas no quedan bloqueadas
+durante la conversación SMTP, que haría esperar a las ventas que las
+resuelven o actualizan (ver sync_stock_alerts). Después las agrupa por
+proveedor, renderiza el cuerpo una sola vez y envía un mensaje por
+destinatario con una única conexión al backend de correo. El coste crece
+con el número de resúmenes y destinatarios, no con el de alertas. Si el
+envío falla, se les quita la marca y la tarea se reintenta.
+"""
+from collections import namedtuple
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import CustomUser, StockAlert
+
+# Roles que reciben los resúmenes de alertas.
+DIGEST_ROLES = ('OWNER', 'ADMIN')
+
+SupplierGroup = namedtuple('SupplierGroup', ['supplier', 'alerts'])
+
+
+def pending_alerts():
+    """Alertas activas que todavía no se han incluido en ningún resumen."""
+    return StockAlert.objects.filter(resolved=False, notified_at__isnull=True)
+
+
+def digest_recipients():
+    return list(CustomUser.objects.filter(role__name__in=DIGEST_ROLES, is_active=True)
+                .exclude(email='').values_list('email', flat=True))
+
+
+def group_by_supplier(alerts):
+    """
+    Agrupa `alerts` (con product__supplier cargado) por proveedor, por
+    nombre, con los productos sin proveedor al final.
+    """
+    groups = {}
+    for alert in alerts:
+        supplier = alert.product.supplier
+        groups.setdefault(supplier.pk if supplier else None, SupplierGroup(supplier, [])).alerts.append(alert)
+    return sorted(groups.values(), key=lambda group: (group.supplier is None,
+                                                      group.supplier.name if group.supplier else ''))
+
+
+def send_alert_digests():
+    """
+    Envía un resumen con las alertas pendientes a cada destinatario y las
+    marca como notificadas. Devuelve el número de alertas incluidas.
+    """
+    recipients = digest_recipients()
+    if not recipients:
+        return 0  # Se quedan pendientes para cuando alguien tenga correo.
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Reclama las pendientes: otro worker que ejecute a la vez no las ve.
+        claimed = list(pending_alerts().select_for_update(skip_locked=True).values_list('pk', flat=True))
+        if claimed:
+            pending_alerts().filter(pk__in=claimed).update(notified_at=now)
+    if not claimed:
+        return 0
+
+    alerts = list(StockAlert.objects.filter(pk__in=claimed)
+                  .select_related('product__supplier').order_by('product__name'))
+    groups = group_by_supplier(alerts)
+    subject = f"CafeCentral: {len(alerts)} producto(s) con stock bajo"
+    body = render_to_string('inventory/email/alert_digest.txt', {
+        'groups': groups,
+        'alert_count': len(alerts),
+        'sent_at': now,
+    })
+    try:
+        # Un mensaje por destinatario (no comparten direcciones), todos por la misma conexión.
+        connection = get_connection()
+        connection.send_messages([
+            EmailMessage(subject=subject, body=body, to=[recipient], connection=connection)
+            for recipient in recipients
+        ])
+    except Exception:
+        # Vuelven a quedar pendientes para el reintento de la tarea.
+        StockAlert.objects.filter(pk__in=claimed, notified_at=now).update(notified_at=None)
+        raise
+    return len(alerts)
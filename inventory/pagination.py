@@ -0,0 +1,159 @@
+"""
+Paginación por cursor (keyset) para las vistas de lista.
+
+En lugar de LIMIT/OFFSET (que obliga a la base de datos a recorrer y descartar
+todas las filas anteriores) y de un COUNT(*) sobre la tabla completa, cada
+página se pide "a partir de" los valores de ordenación de la última fila vista:
+
+    WHERE (movement_date, id) < (<última fecha>, <último id>)
+    ORDER BY movement_date DESC, id DESC
+    LIMIT 51
+
+El coste de cada página es el mismo sea cual sea su posición en la lista.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class KeysetPage:
+    """
+    Página de resultados con enlaces por cursor. Expone la misma interfaz
+    básica que django.core.paginator.Page (object_list, has_next, has_previous,
+    has_other_pages) para que las plantillas la usen como `page_obj`.
+    """
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """
+    Mixin para ListView que sustituye la paginación por número de página por
+    paginación por cursor.
+
+    `keyset_ordering` debe terminar en una columna única (normalmente 'pk' o
+    '-pk') para que el orden sea estable aunque varias filas compartan fecha,
+    y sus campos no pueden ser nulos.
+    """
+    paginate_by = 50
+    keyset_ordering = ('pk',)
+    after_param = 'after'
+    before_param = 'before'
+
+    def get_ordering(self):
+        return list(self.keyset_ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self._parsed_ordering(queryset.model)
+        after = self.request.GET.get(self.after_param)
+        before = self.request.GET.get(self.before_param)
+
+        if before:
+            # Página anterior: se recorre el orden invertido y se da la vuelta al resultado.
+            values = self.decode_cursor(before, ordering)
+            queryset = queryset.filter(self._keyset_filter(ordering, values, forward=False))
+            queryset = queryset.order_by(*self._order_by(ordering, reverse=True))
+            rows = list(queryset[:page_size + 1])
+            has_more = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            has_previous, has_next = has_more, True
+        else:
+            if after:
+                values = self.decode_cursor(after, ordering)
+                queryset = queryset.filter(self._keyset_filter(ordering, values, forward=True))
+            queryset = queryset.order_by(*self._order_by(ordering))
+            rows = list(queryset[:page_size + 1])
+            has_next = len(rows) > page_size
+            rows = rows[:page_size]
+            has_previous = bool(after)
+
+        page = KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], ordering) if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], ordering) if rows and has_previous else None,
+        )
+        return None, page, rows, page.has_other_pages()
+
+    # --- Utilidades internas ---
+
+    def _parsed_ordering(self, model):
+        """Devuelve [(campo, descendente)] resolviendo 'pk' al campo real."""
+        ordering = []
+        for name in self.keyset_ordering:
+            descending = name.startswith('-')
+            field_name = name.lstrip('-')
+            field = model._meta.pk if field_name == 'pk' else model._meta.get_field(field_name)
+            ordering.append((field, descending))
+        return ordering
+
+    @staticmethod
+    def _order_by(ordering, reverse=False):
+        return [('-' if descending != reverse else '') + field.name for field, descending in ordering]
+
+    @staticmethod
+    def _keyset_filter(ordering, values, forward):
+        """
+        Construye la comparación de tuplas (a, b, c) > (x, y, z) expandida como
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z), respetando
+        el sentido de cada columna.
+        """
+        condition = Q()
+        equal_prefix = Q()
+        for (field, descending), value in zip(ordering, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal_prefix & Q(**{f'{field.name}__{lookup}': value})
+            equal_prefix &= Q(**{field.name: value})
+        # Cota redundante sobre la primera columna: permite al planificador
+        # resolver la página como un rango del índice.
+        (first_field, descending), first_value = ordering[0], values[0]
+        lookup = 'lte' if descending == forward else 'gte'
+        return Q(**{f'{first_field.name}__{lookup}': first_value}) & condition
+
+    @staticmethod
+    def encode_cursor(obj, ordering):
+        values = [getattr(obj, field.attname) for field, _ in ordering]
+        data = json.dumps(values, default=_json_default).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor, ordering):
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(data)
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+            return [field.to_python(value) for (field, _), value in zip(ordering, values)]
+        except (ValueError, TypeError, ValidationError):
+            raise Http404("Cursor de paginación no válido.")
+
+
+def _json_default(value):
+    # A diferencia de DjangoJSONEncoder, conserva los microsegundos: el cursor
+    # debe reproducir exactamente el valor almacenado.
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipo no serializable en el cursor: {type(value).__name__}")
@@ -0,0 +1,243 @@
+"""
+Sugerencias de pedidos a proveedores y recepción de pedidos.
+
+suggest_purchase_orders() calcula en una pasada la cantidad a pedir de todo
+el catálogo (tres consultas: productos, proveedores y cantidades pendientes
+de recibir, más las estadísticas de consumo en caché de inventory.analytics)
+y agrupa las líneas por proveedor y próximo día de reparto.
+
+Para cada producto con proveedor:
+
+    d1 = días hasta el próximo reparto
+    d2 = días entre ese reparto y el siguiente
+    objetivo = stock mínimo + consumo diario previsto × (d1 + d2)
+    disponible = stock actual + pedidos confirmados pendientes de recibir
+
+Si disponible <= objetivo se pide lo necesario para superar el objetivo en
+unidades enteras: el pedido que llega en el próximo reparto debe cubrir el
+consumo hasta el reparto siguiente sin bajar del mínimo.
+
+Los días de reparto se leen del texto libre Supplier.delivery_days
+("Lunes, Miércoles", "martes y jueves", "de lunes a viernes", "diario"...).
+Los proveedores sin días reconocibles se tratan como reparto al día
+siguiente y revisión semanal.
+"""
+import datetime
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .analytics import get_consumption_stats
+from .models import Product, PurchaseOrder, PurchaseOrderLine, StockMovement, Supplier
+from .stock import apply_stock_deltas
+
+WEEKDAYS = {
+    'lunes': 0, 'lun': 0,
+    'martes': 1, 'mar': 1,
+    'miercoles': 2, 'mie': 2,
+    'jueves': 3, 'jue': 3,
+    'viernes': 4, 'vie': 4,
+    'sabado': 5, 'sab': 5,
+    'domingo': 6, 'dom': 6,
+}
+EVERY_DAY = ('diario', 'diaria', 'diariamente', 'todos')
+RANGE_WORDS = ('a', 'al', 'hasta')
+
+# Ciclo de revisión de los proveedores sin días de reparto reconocibles.
+DEFAULT_REVIEW_DAYS = 7
+
+SuggestedLine = namedtuple('SuggestedLine', [
+    'product_id', 'product_name', 'unit', 'current_stock', 'minimum_stock_level',
+    'on_order', 'daily_consumption', 'quantity', 'unit_price', 'subtotal',
+])
+SupplierSuggestion = namedtuple('SupplierSuggestion', ['supplier', 'delivery_date', 'lines', 'total'])
+
+
+@lru_cache(maxsize=256)
+def parse_delivery_days(text):
+    """
+    Días de la semana (0 = lunes) mencionados en `text`. Entiende nombres
+    completos o abreviados, con o sin tildes, rangos ("lunes a viernes") y
+    "diario" / "todos los días". Devuelve un frozenset (vacío si no reconoce nada).
+    """
+    if not text:
+        return frozenset()
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    words = re.findall(r'[a-z]+', ''.join(c for c in normalized if not unicodedata.combining(c)))
+    if any(word in EVERY_DAY for word in words):
+        return frozenset(range(7))
+
+    days = set()
+    previous = None
+    pending_range = False
+    for word in words:
+        if word in WEEKDAYS:
+            day = WEEKDAYS[word]
+            if pending_range and previous is not None:
+                # lunes a viernes, viernes a lunes (cruzando el domingo)
+                span = (day - previous) % 7
+                days.update((previous + i) % 7 for i in range(span + 1))
+            days.add(day)
+            previous, pending_range = day, False
+        elif word in RANGE_WORDS and previous is not None:
+            pending_range = True
+    return frozenset(days)
+
+
+def next_delivery_dates(weekdays, today):
+    """
+    (próximo reparto, reparto siguiente) posteriores a `today` para un
+    proveedor que reparte los días `weekdays`.
+    """
+    if not weekdays:
+        first = today + datetime.timedelta(days=1)
+        return first, first + datetime.timedelta(days=DEFAULT_REVIEW_DAYS)
+    first = _next_weekday(weekdays, today)
+    return first, _next_weekday(weekdays, first)
+
+
+def _next_weekday(weekdays, after):
+    for offset in range(1, 8):
+        date = after + datetime.timedelta(days=offset)
+        if date.weekday() in weekdays:
+            return date
+
+
+def pending_quantities(product_ids=None):
+    """{product_id: cantidad} de los pedidos confirmados que aún no se han recibido."""
+    lines = PurchaseOrderLine.objects.filter(order__status='CONFIRMED')
+    if product_ids is not None:
+        lines = lines.filter(product_id__in=product_ids)
+    return dict(lines.order_by().values('product_id').annotate(total=Sum('quantity'))
+                .values_list('product_id', 'total'))
+
+
+def suggest_purchase_orders(today=None, stats=None):
+    """
+    Sugerencias de pedido para todo el catálogo: lista de SupplierSuggestion
+    ordenada por fecha de reparto y proveedor, con las líneas por nombre de producto.
+    """
+    if today is None:
+        today = timezone.localdate()
+    if stats is None:
+        stats = get_consumption_stats()
+
+    suppliers = Supplier.objects.in_bulk()
+    on_order = pending_quantities()
+    schedule = {}
+    groups = defaultdict(list)
+
+    products = (Product.objects.filter(supplier__isnull=False)
+                .order_by('name')
+                .values_list('pk', 'name', 'unit_of_measurement', 'supplier_id', 'current_stock',
+                             'minimum_stock_level', 'price_per_unit_from_supplier'))
+    for pk, name, unit, supplier_id, stock, minimum, price in products:
+        if supplier_id not in schedule:
+            schedule[supplier_id] = next_delivery_dates(
+                parse_delivery_days(suppliers[supplier_id].delivery_days), today)
+        first, following = schedule[supplier_id]
+
+        consumption = stats.get(pk)
+        rate = Decimal(str(round(consumption.ewma, 4))) if consumption else Decimal('0')
+        target = minimum + rate * (following - today).days
+        pending = on_order.get(pk, Decimal('0'))
+        available = stock + pending
+        if available > target:
+            continue
+        # Unidades enteras justo por encima del objetivo.
+        quantity = Decimal(int(target - available) + 1)
+        groups[supplier_id, first].append(SuggestedLine(
+            pk, name, unit, stock, minimum, pending, rate.quantize(Decimal('0.01')),
+            quantity, price, quantity * price,
+        ))
+
+    suggestions = [
+        SupplierSuggestion(suppliers[supplier_id], delivery_date, lines, sum(line.subtotal for line in lines))
+        for (supplier_id, delivery_date), lines in groups.items()
+    ]
+    suggestions.sort(key=lambda suggestion: (suggestion.delivery_date, suggestion.supplier.name))
+    return suggestions
+
+
+def create_draft_orders(suggestions, user=None):
+    """
+    Guarda las sugerencias como pedidos en borrador (un pedido por proveedor y
+    fecha de reparto), sustituyendo los borradores anteriores de esos mismos
+    proveedores: los de los demás se conservan. Devuelve los pedidos creados.
+    """
+    with transaction.atomic():
+        replaced_drafts(suggestions).delete()
+        orders = PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(supplier=suggestion.supplier, expected_delivery_date=suggestion.delivery_date,
+                          created_by=user)
+            for suggestion in suggestions
+        ])
+        PurchaseOrderLine.objects.bulk_create([
+            PurchaseOrderLine(order=order, product_id=line.product_id, quantity=line.quantity,
+                              unit_price=line.unit_price)
+            for order, suggestion in zip(orders, suggestions)
+            for line in suggestion.lines
+        ], batch_size=1000)
+    return orders
+
+
+def replaced_drafts(suggestions):
+    """Borradores que create_draft_orders(suggestions) sustituiría."""
+    return PurchaseOrder.objects.filter(status='DRAFT',
+                                        supplier__in={suggestion.supplier.pk for suggestion in suggestions})
+
+
+def confirm_purchase_order(order):
+    """Pasa un borrador a confirmado (sus cantidades cuentan como pendientes de recibir)."""
+    if not order.lines.filter(quantity__gt=0).exists():
+        raise ValidationError("El pedido no tiene ninguna línea con cantidad.")
+    _transition(order, 'DRAFT', 'CONFIRMED', confirmed_at=timezone.now())
+
+
+def cancel_purchase_order(order):
+    """Cancela un pedido en borrador o confirmado (sin efecto sobre el stock)."""
+    _transition(order, ('DRAFT', 'CONFIRMED'), 'CANCELLED')
+
+
+def receive_purchase_order(order, user=None):
+    """
+    Registra la llegada de un pedido confirmado: una entrada de stock (IN) por
+    línea con un único INSERT y un único UPDATE de stock, en la misma
+    transacción que marca el pedido como recibido. Devuelve los movimientos creados.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # El UPDATE condicional bloquea el pedido: dos recepciones simultáneas
+        # no pueden registrar las entradas dos veces.
+        _transition(order, 'CONFIRMED', 'RECEIVED', received_at=now, received_by=user)
+        description = f"Recepción del pedido #{order.pk} ({order.supplier.name})"
+        movements = StockMovement.objects.bulk_create([
+            StockMovement(product_id=line.product_id, movement_type='IN', quantity=line.quantity,
+                          movement_date=now, description=description, registered_by=user)
+            for line in order.lines.filter(quantity__gt=0)
+        ])
+        deltas = defaultdict(Decimal)
+        for movement in movements:
+            deltas[movement.product_id] += movement.quantity
+        apply_stock_deltas(deltas)
+    return movements
+
+
+def _transition(order, from_status, to_status, **fields):
+    statuses = (from_status,) if isinstance(from_status, str) else from_status
+    updated = (PurchaseOrder.objects.filter(pk=order.pk, status__in=statuses)
+               .update(status=to_status, **fields))
+    if not updated:
+        order.refresh_from_db(fields=['status'])
+        raise ValidationError(f"El pedido está {order.get_status_display().lower()}: "
+                              f"no se puede pasar a {dict(PurchaseOrder.STATUS_CHOICES)[to_status].lower()}.")
+    order.status = to_status
+    for name, value in fields.items():
+        setattr(order, name, value)
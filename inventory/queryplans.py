@@ -0,0 +1,155 @@
+"""
+Revisión de los planes de consulta de las vistas principales.
+
+check_query_plans() recorre CHECKED_VIEWS con un cliente de pruebas, captura
+todas las consultas SELECT de cada petición y ejecuta EXPLAIN sobre cada una:
+
+- SQLite no usa estadísticas (salvo ANALYZE explícito): recorre una tabla
+  completa solo si no tiene ningún índice utilizable, así que cualquier SCAN
+  sin índice es un problema.
+- PostgreSQL decide con estadísticas, que se actualizan (ANALYZE) antes de
+  empezar. Leer secuencialmente una tabla pequeña, o buena parte de una
+  grande, es lo correcto; solo es un problema un Seq Scan selectivo (menos de
+  SELECTIVE_FRACTION de las filas) sobre una tabla de al menos MIN_TABLE_ROWS
+  filas, que es lo que ocurre cuando falta un índice.
+
+Algunos resúmenes de tabla completa recorren la tabla por diseño: se
+declaran en FULL_SCANS_BY_DESIGN. Lo usan el comando check_query_plans
+(sobre un conjunto de datos sintético) y las pruebas.
+"""
+import json
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.urls import reverse
+
+from .models import DailySalesSession, Product, PurchaseOrder, Supplier
+
+# Vistas cuyas consultas se revisan (nombre de URL, modelo del que tomar un pk o None).
+CHECKED_VIEWS = [
+    ('home', None),
+    ('inventory:product_list', None),
+    ('inventory:product_detail', Product),
+    ('inventory:supplier_list', None),
+    ('inventory:supplier_detail', Supplier),
+    ('inventory:dailysalessession_list', None),
+    ('inventory:dailysalessession_detail', DailySalesSession),
+    ('inventory:sales_report', None),
+    ('inventory:stockalert_list', None),
+    ('inventory:stockmovement_list', None),
+    ('inventory:purchaseorder_list', None),
+    ('inventory:purchaseorder_detail', PurchaseOrder),
+    ('inventory:user_list', None),
+    ('inventory:role_list', None),
+    ('inventory:api_products', None),
+    ('inventory:api_alerts', None),
+]
+
+# Tablas que una vista recorre enteras a propósito: {nombre de URL: {tabla}}.
+FULL_SCANS_BY_DESIGN = {
+    # Totales del catálogo completo sobre la lista (total, stock bajo, con proveedor).
+    'inventory:product_list': {'inventory_product'},
+    # Número, suma y media de todas las sesiones sobre la lista.
+    'inventory:dailysalessession_list': {'inventory_dailysalessession'},
+    # Sin rango de fechas el informe agrega todo el historial del resumen.
+    'inventory:sales_report': {'inventory_dailyproductsales'},
+    # Validador de la lista completa (número de productos y última modificación) para el ETag.
+    'inventory:api_products': {'inventory_product'},
+}
+
+MIN_TABLE_ROWS = 1000
+SELECTIVE_FRACTION = 0.1
+
+# "SCAN tabla" sin "USING INDEX" en EXPLAIN QUERY PLAN de SQLite.
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?!\()(\S+)$')
+
+# Consulta con recorridos completos: scans = [(tabla, línea del plan)].
+QueryPlanProblem = namedtuple('QueryPlanProblem', ['url', 'sql', 'scans'])
+
+
+def check_query_plans(client, on_plan=None):
+    """
+    Revisa las consultas de CHECKED_VIEWS pedidas con `client` (con sesión
+    iniciada). Devuelve (problemas, consultas revisadas); una vista que no
+    responde 200 también es un problema. on_plan(url, sql, plan) recibe cada
+    plan, para mostrarlo.
+    """
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        raise ValueError(f"Motor de base de datos no soportado: {connection.vendor}")
+    if connection.vendor == 'postgresql':
+        # Estadísticas de los datos actuales (también los aún sin confirmar).
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    problems, checked = [], 0
+    for name, url in _urls(client):
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = client.get(url)
+        if response.status_code != 200:
+            problems.append(QueryPlanProblem(url, '', [('', f"respondió {response.status_code}")]))
+            continue
+
+        allowed = FULL_SCANS_BY_DESIGN.get(name, set())
+        for sql, params in queries:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            checked += 1
+            plan, scans = _explain(sql, params)
+            if on_plan is not None:
+                on_plan(url, sql, plan)
+            scans = [(table, line) for table, line in scans if table not in allowed]
+            if scans:
+                problems.append(QueryPlanProblem(url, sql, scans))
+    return problems, checked
+
+
+def _urls(client):
+    for name, model in CHECKED_VIEWS:
+        if model is None:
+            url = reverse(name)
+            yield name, url
+            # Segunda página de las listas paginadas por cursor.
+            page = (client.get(url).context or {}).get('page_obj')
+            if getattr(page, 'next_cursor', None):
+                yield name, f"{url}?after={page.next_cursor}"
+        else:
+            pk = model.objects.order_by('pk').values_list('pk', flat=True).last()
+            if pk is not None:
+                yield name, reverse(name, args=[pk])
+
+
+def _explain(sql, params):
+    """(líneas del plan, [(tabla, línea) de cada recorrido completo problemático])."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+            return plan, [(match[1], line) for line in plan if (match := SQLITE_FULL_SCAN.match(line))]
+
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        document = cursor.fetchone()[0]
+        if isinstance(document, str):
+            document = json.loads(document)
+        plan, scans = [], []
+        for node in _plan_nodes(document[0]['Plan']):
+            line = f"{node['Node Type']} {node.get('Relation Name', '')} (filas: {node['Plan Rows']})"
+            plan.append(line)
+            if node['Node Type'] == 'Seq Scan':
+                cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [node['Relation Name']])
+                table_rows = cursor.fetchone()[0]
+                if table_rows >= MIN_TABLE_ROWS and node['Plan Rows'] < table_rows * SELECTIVE_FRACTION:
+                    scans.append((node['Relation Name'], line))
+        return plan, scans
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _plan_nodes(child)
@@ -0,0 +1,158 @@
+"""
+Réplica de lectura (DATABASE_REPLICA_URL en los settings).
+
+Las vistas de consulta pesadas (listas de ventas y movimientos,
+exportaciones, dashboard, informes) leen de la réplica para no competir con
+las escrituras del punto de venta en el primario. Es opcional por vista:
+ReplicaReadMixin en las CBV, @read_from_replica en las vistas de función o
+replica_reads() alrededor de un bloque concreto. Todo lo demás, y cualquier
+escritura, va al primario.
+
+La réplica va por detrás del primario. Para que quien acaba de escribir vea
+su cambio (la redirección tras registrar una venta), PrimaryPinningMiddleware
+marca con una cookie a los clientes que envían una petición de escritura y,
+durante DATABASE_REPLICA_PIN_SECONDS, sus lecturas vuelven al primario.
+Dentro de una transacción también se lee del primario, porque la réplica no
+ve lo que aún no se ha confirmado.
+
+Sin DATABASE_REPLICA_URL no se instala el router y read_alias() siempre
+devuelve 'default'. Para probarlo en local con dos SQLite, copia la base de
+datos (cp db.sqlite3 replica.sqlite3) y apunta DATABASE_REPLICA_URL a la
+copia: lo que se escriba después solo aparece en las páginas de consulta
+mientras la cookie fija el primario.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+PIN_COOKIE = 'cafecentral_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Si las lecturas de la petición o tarea actual pueden ir a la réplica.
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def pin_seconds():
+    return getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5)
+
+
+def pinned_to_primary(request):
+    """Peticiones de escritura y clientes que han escrito hace menos de pin_seconds()."""
+    return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+
+def read_alias():
+    """Alias del que leer ahora mismo: la réplica si está activa para este contexto."""
+    if (_replica_reads.get() and replica_configured()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+        return REPLICA_DB_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+def replica_cache_timeout(timeout):
+    """
+    Tiempo de caché para datos leídos ahora: si vienen de la réplica pueden
+    ser anteriores a la última invalidación, así que no se guardan más de
+    pin_seconds() (el retraso que se asume para la réplica).
+    """
+    if read_alias() == REPLICA_DB_ALIAS:
+        return min(timeout, pin_seconds())
+    return timeout
+
+
+@contextmanager
+def replica_reads(request=None, enabled=True):
+    """
+    Envía a la réplica las lecturas del bloque, salvo que `request` esté
+    fijada al primario o `enabled` sea falso.
+    """
+    token = _replica_reads.set(enabled and not (request is not None and pinned_to_primary(request)))
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_from_replica(view_func):
+    """Decorador para vistas de función (síncronas o async) de solo lectura."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            with replica_reads(request):
+                return await view_func(request, *args, **kwargs)
+    else:
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            with replica_reads(request):
+                return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+class ReplicaReadMixin:
+    """
+    Lecturas de la vista desde la réplica. Va después de RoleRequiredMixin
+    para que el usuario de la sesión se cargue del primario. Las respuestas en
+    streaming se consumen después de dispatch(): su queryset debe fijar el
+    alias con .using(read_alias()) (ver ExportView).
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(request):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """Lecturas a read_alias(), escrituras y migraciones solo al primario."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Relaciones de un objeto ya cargado: de la misma base de datos.
+            return instance._state.db
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # La réplica tiene los mismos datos que el primario.
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación.
+        return db != REPLICA_DB_ALIAS
+
+
+class PrimaryPinningMiddleware:
+    """
+    Tras una petición de escritura, fija al primario las lecturas del cliente
+    durante pin_seconds() con una cookie (la réplica aún puede no tener el cambio).
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._pin(request, await self.get_response(request))
+
+    def _pin(self, request, response):
+        if request.method not in SAFE_METHODS and replica_configured():
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), secure=request.is_secure(),
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,131 @@
+"""
+Resumen materializado de ventas por producto y día (DailyProductSales).
+
+El flujo de escritura de SaleItem no toca el resumen: solo marca la sesión
+afectada (DailySalesSession.rollup_stale, en el mismo UPDATE que ajusta sus
+totales). refresh_daily_product_sales() reprocesa únicamente las sesiones
+marcadas, con una consulta agregada por lote, de modo que mantener el
+resumen cuesta lo mismo que la actividad desde el último refresco y no crece
+con el historial. Lo invocan la tarea y el comando `refresh_sales_rollup`
+(la venta que marca una sesión encola la tarea), nunca una petición de
+lectura: el informe de ventas y las estadísticas de consumo leen el resumen
+tal cual y pending_refresh() les dice qué sesiones aún faltan por incorporar.
+
+El coste se calcula con el precio de compra actual del producto al
+recalcular la sesión (no hay histórico de precios).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Min, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import DailyProductSales, DailySalesSession, SaleItem
+
+# Sesiones recalculadas por lote (acota la memoria al reconstruir años de historial).
+BATCH_SIZE = 100
+
+PERIODS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+TOTALS = {
+    'total_quantity': Sum('quantity_sold'),
+    'total_revenue': Sum('revenue'),
+    'total_cost': Sum('cost'),
+}
+MARGIN = F('total_revenue') - F('total_cost')
+
+
+def stale_sessions():
+    """Sesiones cuyo resumen de ventas por producto está desactualizado."""
+    return DailySalesSession.objects.filter(rollup_stale=True)
+
+
+def pending_refresh(start_date=None, end_date=None):
+    """
+    Sesiones del rango cuyas últimas ventas aún no están en el resumen:
+    {'sessions': número, 'oldest': fecha de la más antigua o None}.
+    """
+    sessions = stale_sessions()
+    if start_date:
+        sessions = sessions.filter(sale_date__gte=start_date)
+    if end_date:
+        sessions = sessions.filter(sale_date__lte=end_date)
+    return sessions.aggregate(sessions=Count('pk'), oldest=Min('sale_date'))
+
+
+def refresh_daily_product_sales(sessions=None):
+    """
+    Recalcula las filas de DailyProductSales de `sessions` (por defecto, las
+    marcadas como desactualizadas) y les quita la marca. Devuelve el número
+    de sesiones procesadas.
+
+    Las sesiones se bloquean (SELECT ... FOR UPDATE) mientras se recalculan:
+    una venta concurrente espera y vuelve a marcar su sesión al terminar, así
+    que ningún cambio se pierde.
+    """
+    if sessions is None:
+        sessions = stale_sessions()
+    session_ids = list(sessions.order_by('sale_date').values_list('pk', flat=True))
+    for start in range(0, len(session_ids), BATCH_SIZE):
+        _refresh_batch(session_ids[start:start + BATCH_SIZE])
+    return len(session_ids)
+
+
+def _refresh_batch(session_ids):
+    cost = ExpressionWrapper(F('quantity_sold') * F('product__price_per_unit_from_supplier'),
+                             output_field=DecimalField(max_digits=20, decimal_places=4))
+    with transaction.atomic():
+        session_ids = list(DailySalesSession.objects.select_for_update()
+                           .filter(pk__in=session_ids).values_list('pk', flat=True))
+        rows = (SaleItem.objects.filter(sale_session_id__in=session_ids)
+                .order_by()
+                .values('sale_session_id', 'sale_session__sale_date', 'product_id')
+                .annotate(quantity=Sum('quantity_sold'), revenue=Sum('subtotal'), cost=Sum(cost)))
+        DailyProductSales.objects.filter(sale_session_id__in=session_ids).delete()
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(
+                sale_session_id=row['sale_session_id'],
+                sale_date=row['sale_session__sale_date'],
+                product_id=row['product_id'],
+                quantity_sold=row['quantity'],
+                revenue=row['revenue'],
+                cost=row['cost'].quantize(Decimal('0.01')),
+            )
+            for row in rows
+        ], batch_size=1000)
+        DailySalesSession.objects.filter(pk__in=session_ids).update(rollup_stale=False)
+
+
+def sales_by_period(period, start_date=None, end_date=None):
+    """
+    Totales de venta por semana o mes ('week' / 'month') leídos del resumen:
+    filas {'period', 'total_quantity', 'total_revenue', 'total_cost', 'margin'}
+    ordenadas por periodo.
+    """
+    return (_rollup_rows(start_date, end_date)
+            .annotate(period=PERIODS[period]('sale_date'))
+            .values('period')
+            .annotate(**TOTALS)
+            .annotate(margin=MARGIN)
+            .order_by('period'))
+
+
+def sales_by_product(start_date=None, end_date=None):
+    """Totales de venta por producto en el rango, de mayor a menor ingreso."""
+    return (_rollup_rows(start_date, end_date)
+            .values('product_id', 'product__name', 'product__unit_of_measurement')
+            .annotate(**TOTALS)
+            .annotate(margin=MARGIN)
+            .order_by('-total_revenue', 'product__name'))
+
+
+def _rollup_rows(start_date, end_date):
+    rows = DailyProductSales.objects.order_by()
+    if start_date:
+        rows = rows.filter(sale_date__gte=start_date)
+    if end_date:
+        rows = rows.filter(sale_date__lte=end_date)
+    return rows
@@ -0,0 +1,129 @@
+"""
+Registro de ventas y mantenimiento de los totales de cada sesión.
+
+Permite guardar muchos SaleItem de una vez (por ejemplo, el cierre de un día
+completo) con un único INSERT y un único UPDATE de stock, en lugar de pasar
+por SaleItem.save() ítem a ítem.
+
+Los totales de DailySalesSession (total_revenue, total_quantity, item_count)
+se actualizan con deltas atómicos (F() + delta) en el mismo flujo de escritura,
+de modo que leerlos nunca requiere agregar los SaleItem.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .caching import bump_versions
+from .dashboard import invalidate_dashboard
+from .models import DailySalesSession, SaleItem
+from .stock import apply_stock_deltas
+from .tasks import enqueue
+
+
+def record_sale_items(sale_items):
+    """
+    Inserta `sale_items` (SaleItem sin guardar) con bulk_create y descuenta el
+    stock sumado por producto en una sola sentencia, todo en una transacción.
+
+    Las alertas de stock se evalúan una sola vez por producto afectado.
+    Devuelve la lista de ítems creados.
+    """
+    sale_items = list(sale_items)
+    if not sale_items:
+        return []
+
+    stock_deltas = defaultdict(Decimal)
+    session_deltas = defaultdict(lambda: (Decimal('0'), Decimal('0'), 0))
+    for item in sale_items:
+        item.subtotal = item.calculate_subtotal()
+        stock_deltas[item.product_id] -= item.quantity_sold
+        revenue, quantity, count = session_deltas[item.sale_session_id]
+        session_deltas[item.sale_session_id] = (revenue + item.subtotal,
+                                                quantity + item.quantity_sold,
+                                                count + 1)
+
+    with transaction.atomic():
+        created = SaleItem.objects.bulk_create(sale_items)
+        apply_stock_deltas(stock_deltas)
+        update_session_totals(session_deltas)
+
+    for item in created:
+        item._loaded_state = tuple(getattr(item, name) for name in SaleItem.TRACKED_FIELDS)
+    return created
+
+
+def update_session_totals(deltas):
+    """
+    Aplica deltas a los totales desnormalizados de las sesiones y las marca
+    para recalcular su resumen de ventas por producto (ver inventory.rollups).
+
+    `deltas` es un diccionario {session_id: (revenue, quantity, item_count)}.
+
+    Lo habitual es que la sesión ya esté marcada, con su refresco encolado:
+    entonces basta un UPDATE. El refresco solo se encola cuando la sesión pasa
+    de estar al día a marcada, no en cada venta.
+    """
+    changed = newly_stale = False
+    for session_id, (revenue, quantity, count) in deltas.items():
+        if not (revenue or quantity or count):
+            continue
+        changed = True
+        totals = {
+            'total_revenue': F('total_revenue') + revenue,
+            'total_quantity': F('total_quantity') + quantity,
+            'item_count': F('item_count') + count,
+        }
+        sessions = DailySalesSession.objects.filter(pk=session_id)
+        if not sessions.filter(rollup_stale=True).update(**totals):
+            # Sus filas de DailyProductSales se recalculan en el próximo refresco.
+            sessions.update(**totals, rollup_stale=True)
+            newly_stale = True
+    if changed:
+        invalidate_dashboard()
+        bump_versions(DailySalesSession)
+    if newly_stale:
+        # El resumen se recalcula en segundo plano, no durante la venta.
+        enqueue('refresh_sales_rollup', key='refresh_sales_rollup')
+
+
+def recalculate_session_totals(queryset=None):
+    """
+    Recalcula desde los SaleItem los totales de las sesiones de `queryset`
+    (todas por defecto) con un único UPDATE. Devuelve el número de sesiones
+    actualizadas.
+    """
+    if queryset is None:
+        queryset = DailySalesSession.objects.all()
+    invalidate_dashboard()
+    bump_versions(DailySalesSession)
+    enqueue('refresh_sales_rollup', key='refresh_sales_rollup')
+    items = (SaleItem.objects.filter(sale_session=OuterRef('pk'))
+             .order_by().values('sale_session'))
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return queryset.update(
+        total_revenue=Coalesce(Subquery(items.annotate(total=Sum('subtotal')).values('total')),
+                               Value(Decimal('0')), output_field=money),
+        total_quantity=Coalesce(Subquery(items.annotate(total=Sum('quantity_sold')).values('total')),
+                                Value(Decimal('0')), output_field=money),
+        item_count=Coalesce(Subquery(items.annotate(total=Count('pk')).values('total')),
+                            Value(0), output_field=IntegerField()),
+        rollup_stale=True,
+    )
+
+
+def stale_session_totals(queryset=None):
+    """
+    Devuelve las sesiones cuyos totales almacenados no coinciden con los SaleItem.
+    """
+    if queryset is None:
+        queryset = DailySalesSession.objects.all()
+    return (queryset
+            .annotate(actual_revenue=Coalesce(Sum('sale_items__subtotal'), Value(Decimal('0'))),
+                      actual_quantity=Coalesce(Sum('sale_items__quantity_sold'), Value(Decimal('0'))),
+                      actual_count=Count('sale_items'))
+            .exclude(total_revenue=F('actual_revenue'),
+                     total_quantity=F('actual_quantity'),
+                     item_count=F('actual_count')))
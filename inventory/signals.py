@@ -0,0 +1,69 @@
+"""
+Receptores de señales de la app inventory.
+
+Invalidan las métricas en caché del dashboard cuando cambian los datos que
+resume y suben la versión de los modelos que muestran las páginas en caché
+(ver inventory.caching). Los flujos de escritura en bloque (bulk_create /
+update) no emiten estas señales y llaman a invalidate_dashboard() y
+bump_versions() por su cuenta.
+
+Publican en el feed en vivo (ver inventory.events) las altas, ediciones y
+bajas de alertas sueltas; las creadas y resueltas en bloque se publican en
+inventory.alerts.
+
+También mantienen la fecha copiada en DailyProductSales si se cambia la
+fecha de una sesión de ventas.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from .caching import bump_versions
+from .dashboard import invalidate_dashboard
+from .events import publish_alert_deleted, publish_alert_saved
+from .models import CustomUser, DailyProductSales, DailySalesSession, Product, SaleItem, StockAlert, Supplier
+
+DASHBOARD_MODELS = (Product, StockAlert, SaleItem, DailySalesSession, CustomUser)
+# Modelos cuyas versiones forman parte de las claves de CachedContentMixin.
+VERSIONED_MODELS = (Product, Supplier, DailySalesSession, CustomUser)
+
+
+def invalidate_dashboard_on_change(sender, **kwargs):
+    invalidate_dashboard()
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(invalidate_dashboard_on_change, sender=model,
+                      dispatch_uid=f'dashboard_post_save_{model.__name__}')
+    post_delete.connect(invalidate_dashboard_on_change, sender=model,
+                        dispatch_uid=f'dashboard_post_delete_{model.__name__}')
+
+
+def bump_version_on_change(sender, **kwargs):
+    bump_versions(sender)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version_on_change, sender=model,
+                      dispatch_uid=f'version_post_save_{model.__name__}')
+    post_delete.connect(bump_version_on_change, sender=model,
+                        dispatch_uid=f'version_post_delete_{model.__name__}')
+
+
+def sync_rollup_sale_date(sender, instance, created, **kwargs):
+    if not created:
+        DailyProductSales.objects.filter(sale_session=instance).exclude(
+            sale_date=instance.sale_date).update(sale_date=instance.sale_date)
+
+
+post_save.connect(sync_rollup_sale_date, sender=DailySalesSession, dispatch_uid='rollup_sale_date_post_save')
+
+
+def publish_alert_on_save(sender, instance, created, **kwargs):
+    publish_alert_saved(instance, created)
+
+
+def publish_alert_on_delete(sender, instance, **kwargs):
+    publish_alert_deleted(instance)
+
+
+post_save.connect(publish_alert_on_save, sender=StockAlert, dispatch_uid='events_alert_post_save')
+post_delete.connect(publish_alert_on_delete, sender=StockAlert, dispatch_uid='events_alert_post_delete')
@@ -0,0 +1,157 @@
+"""
+Instantáneas diarias de inventario y stock en una fecha pasada.
+
+El stock de un producto en el día D (al cierre, hora local) se calcula a
+partir de la instantánea más cercana a D, aplicando solo los movimientos de
+stock y las ventas entre ambas fechas:
+
+    stock(D) = cierre(S) + cambios en (S, D]     si S <= D
+    stock(D) = cierre(S) - cambios en (D, S]     si S > D
+
+Si no hay ninguna instantánea más cercana se parte del stock actual
+(stock(D) = stock actual - cambios posteriores a D). Con instantáneas diarias
+el coste queda acotado por la actividad de un día, sin recorrer el historial.
+
+Los cambios de stock que no dejan rastro (la edición manual del stock de un
+producto, la importación de catálogo) solo los recogen las instantáneas
+tomadas después: las instantáneas son la referencia y los cambios se
+reconstruyen a partir de StockMovement (entradas y salidas, por fecha) y
+SaleItem (por fecha de la sesión).
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Max, Min, Sum, Value, When
+from django.utils import timezone
+
+from .models import InventorySnapshot, Product, SaleItem, StockMovement
+
+ZERO = Decimal('0.00')
+ONE_DAY = datetime.timedelta(days=1)
+
+# Efecto de cada movimiento sobre el stock (ver StockMovement.stock_effect).
+SIGNED_QUANTITY = Case(
+    When(movement_type='IN', then=F('quantity')),
+    When(movement_type='OUT', then=-F('quantity')),
+    default=Value(ZERO),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def stock_deltas(after=None, until=None, product_ids=None):
+    """
+    Cambio neto de stock por producto debido a los movimientos y ventas de los
+    días (after, until] (fechas locales; None = sin límite). Devuelve un
+    defaultdict {product_id: Decimal} con dos consultas agregadas.
+    """
+    movements = StockMovement.objects.all()
+    sales = SaleItem.objects.all()
+    if after is not None:
+        movements = movements.filter(movement_date__gte=day_start(after + ONE_DAY))
+        sales = sales.filter(sale_session__sale_date__gt=after)
+    if until is not None:
+        movements = movements.filter(movement_date__lt=day_start(until + ONE_DAY))
+        sales = sales.filter(sale_session__sale_date__lte=until)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+        sales = sales.filter(product_id__in=product_ids)
+
+    deltas = defaultdict(lambda: ZERO)
+    for product_id, total in (movements.order_by().values('product_id')
+                              .annotate(total=Sum(SIGNED_QUANTITY)).values_list('product_id', 'total')):
+        deltas[product_id] += total
+    for product_id, total in (sales.order_by().values('product_id')
+                              .annotate(total=Sum('quantity_sold')).values_list('product_id', 'total')):
+        deltas[product_id] -= total
+    return deltas
+
+
+def take_snapshot(snapshot_date, days=1):
+    """
+    Escribe (o reescribe) las instantáneas de cierre de `snapshot_date` y de
+    los `days - 1` días anteriores para todos los productos.
+
+    El cierre de `snapshot_date` es el stock actual menos los cambios
+    posteriores; el de cada día anterior, el cierre del día siguiente menos
+    los cambios de ese día. Devuelve el número de instantáneas escritas.
+    """
+    with transaction.atomic():
+        products = list(Product.objects.values_list('pk', 'current_stock', 'price_per_unit_from_supplier'))
+        costs = {pk: cost for pk, _, cost in products}
+        later = stock_deltas(after=snapshot_date)
+        closing = {pk: stock - later[pk] for pk, stock, _ in products}
+
+        snapshots = []
+        day = snapshot_date
+        for i in range(days):
+            if i:
+                changes = stock_deltas(after=day, until=day + ONE_DAY)
+                closing = {pk: stock - changes[pk] for pk, stock in closing.items()}
+            snapshots += [
+                InventorySnapshot(product_id=pk, snapshot_date=day, closing_stock=stock,
+                                  unit_cost=costs[pk], stock_value=stock * costs[pk])
+                for pk, stock in closing.items()
+            ]
+            day -= ONE_DAY
+
+        InventorySnapshot.objects.bulk_create(
+            snapshots, batch_size=1000, update_conflicts=True,
+            unique_fields=['product', 'snapshot_date'],
+            update_fields=['closing_stock', 'unit_cost', 'stock_value', 'created_at'],
+        )
+    return len(snapshots)
+
+
+def stock_at(date, product_ids=None):
+    """
+    Stock de cierre del día `date` por producto. Devuelve
+    ({product_id: Decimal}, fecha de la instantánea de partida o None si se
+    partió del stock actual). Los productos sin instantánea en esa fecha (creados
+    después, por ejemplo) se calculan desde su stock actual.
+    """
+    snapshots = InventorySnapshot.objects.all()
+    if product_ids is not None:
+        snapshots = snapshots.filter(product_id__in=product_ids)
+    base_date = _nearest_snapshot_date(snapshots, date)
+
+    stocks = {}
+    if base_date is not None:
+        base = dict(snapshots.filter(snapshot_date=base_date).values_list('product_id', 'closing_stock'))
+        if base_date <= date:
+            changes = stock_deltas(after=base_date, until=date, product_ids=list(base))
+            stocks = {pk: stock + changes[pk] for pk, stock in base.items()}
+        else:
+            changes = stock_deltas(after=date, until=base_date, product_ids=list(base))
+            stocks = {pk: stock - changes[pk] for pk, stock in base.items()}
+
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    current = {pk: stock for pk, stock in products.values_list('pk', 'current_stock') if pk not in stocks}
+    if current:
+        later = stock_deltas(after=date, product_ids=list(current) if stocks else product_ids)
+        stocks.update({pk: stock - later[pk] for pk, stock in current.items()})
+    return stocks, base_date
+
+
+def _nearest_snapshot_date(snapshots, date):
+    """
+    Fecha de instantánea más cercana a `date` (en días), o None si el stock
+    actual está más cerca. A igual distancia se prefiere la anterior.
+    """
+    previous = snapshots.filter(snapshot_date__lte=date).aggregate(d=Max('snapshot_date'))['d']
+    following = snapshots.filter(snapshot_date__gt=date).aggregate(d=Min('snapshot_date'))['d']
+    candidates = []
+    if previous is not None:
+        candidates.append(((date - previous).days, 0, previous))
+    if following is not None:
+        candidates.append(((following - date).days, 1, following))
+    candidates.append(((timezone.localdate() - date).days, 2, None))
+    return min(candidates)[2]
+
+
+def day_start(date):
+    """Medianoche (hora local) al comienzo de `date`, como instante con zona horaria."""
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
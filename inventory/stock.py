@@ -0,0 +1,155 @@
+"""
+Motor de mutaciones de stock.
+
+Todas las escrituras sobre Product.current_stock que provienen de ventas y
+movimientos pasan por aquí. En lugar de leer el producto, modificar el valor
+en Python y volver a guardarlo (lo que pierde actualizaciones cuando dos cajas
+venden el mismo producto a la vez), los cambios se aplican como deltas
+relativos al valor de la fila, con un único UPDATE:
+
+    UPDATE inventory_product
+       SET current_stock = current_stock + <delta>
+     WHERE id IN (...)
+ RETURNING id, current_stock, minimum_stock_level,
+           EXISTS (SELECT 1 FROM inventory_stockalert
+                    WHERE product_id = inventory_product.id AND NOT resolved)
+
+La base de datos serializa los UPDATE concurrentes sobre la misma fila, por lo
+que el resultado final siempre es la suma de todos los deltas (sin
+actualizaciones perdidas) y el valor devuelto es el stock exacto tras aplicar
+el delta propio. La última columna (sobre el índice parcial de alertas
+activas) evita consultar las alertas en cada venta de un producto que ya
+tiene la suya. El UPDATE no lleva más condición que, para las salidas de
+StockMovement (allow_negative=False), recortar el resultado a cero.
+"""
+import logging
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .caching import bump_versions
+from .models import Product, StockAlert
+
+logger = logging.getLogger(__name__)
+
+StockChange = namedtuple('StockChange', ['product_id', 'delta', 'new_stock', 'minimum_stock_level',
+                                         'has_active_alert'], defaults=[None])
+StockChange.__doc__ = ("Resultado de aplicar un delta al stock de un producto. has_active_alert "
+                       "es None si no se sabe si el producto tiene una alerta activa.")
+
+
+def apply_stock_delta(product_id, delta, allow_negative=True):
+    """
+    Suma `delta` (positivo o negativo) al stock de un producto.
+
+    Devuelve un StockChange con el stock resultante, o None si el delta es cero.
+    """
+    changes = apply_stock_deltas({product_id: delta}, allow_negative=allow_negative)
+    return changes.get(product_id)
+
+
+def apply_stock_deltas(deltas, allow_negative=True):
+    """
+    Aplica varios deltas de stock en una sola sentencia y evalúa las alertas.
+
+    `deltas` es un diccionario {product_id: Decimal}. Si `allow_negative` es
+    False, el stock resultante nunca baja de cero (comportamiento histórico
+    de los movimientos de salida).
+
+    Devuelve un diccionario {product_id: StockChange}.
+    """
+    from .alerts import sync_stock_alerts
+    from .dashboard import invalidate_dashboard
+    from .events import publish_stock_changes
+
+    deltas = {pk: Decimal(delta) for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+
+    with transaction.atomic(savepoint=False):
+        rows = _update_stock(deltas, allow_negative)
+        changes = {
+            pk: StockChange(pk, deltas[pk], current_stock, minimum_stock_level, bool(has_active_alert))
+            for pk, current_stock, minimum_stock_level, has_active_alert in rows
+        }
+        if not allow_negative:
+            for change in changes.values():
+                if change.delta < 0 and change.new_stock == 0:
+                    logger.warning("El stock del producto %s quedó en cero tras una salida de %s.",
+                                   change.product_id, -change.delta)
+        sync_stock_alerts(changes.values())
+        publish_stock_changes(changes.values())
+        # El UPDATE directo no emite post_save: el dashboard y las páginas en caché se invalidan aquí.
+        invalidate_dashboard()
+        bump_versions(Product)
+    return changes
+
+
+def _supports_update_returning():
+    """PostgreSQL y SQLite (>= 3.35) permiten UPDATE ... RETURNING."""
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+
+
+def _update_stock(deltas, allow_negative):
+    """
+    Ejecuta el UPDATE set-based y devuelve filas
+    (id, current_stock, minimum_stock_level, tiene alerta activa).
+    """
+    qn = connection.ops.quote_name
+    stock_field = Product._meta.get_field('current_stock')
+    table = qn(Product._meta.db_table)
+    pk_col = qn(Product._meta.pk.column)
+    stock_col = qn(stock_field.column)
+    minimum_col = qn(Product._meta.get_field('minimum_stock_level').column)
+    updated_col = qn(Product._meta.get_field('last_updated').column)
+    alert_table = qn(StockAlert._meta.db_table)
+    active_alert_sql = 'EXISTS (SELECT 1 FROM %s WHERE %s.%s = %s.%s AND NOT %s.%s)' % (
+        alert_table, alert_table, qn(StockAlert._meta.get_field('product').column), table, pk_col,
+        alert_table, qn(StockAlert._meta.get_field('resolved').column),
+    )
+
+    # CASE id WHEN 1 THEN 2.00 WHEN 7 THEN -1.50 END
+    delta_sql = 'CASE %s %s END' % (pk_col, ' '.join(['WHEN %s THEN %s'] * len(deltas)))
+    delta_params = []
+    for pk, delta in deltas.items():
+        delta_params += [pk, connection.ops.adapt_decimalfield_value(
+            delta, stock_field.max_digits, stock_field.decimal_places)]
+
+    new_stock_sql = '%s + (%s)' % (stock_col, delta_sql)
+    params = list(delta_params)
+    if not allow_negative:
+        # Equivalente portable de GREATEST(current_stock + delta, 0)
+        new_stock_sql = 'CASE WHEN %s < 0 THEN 0 ELSE %s END' % (new_stock_sql, new_stock_sql)
+        params = delta_params * 2
+
+    sql = 'UPDATE %s SET %s = %s, %s = %%s WHERE %s IN (%s)' % (
+        table, stock_col, new_stock_sql, updated_col, pk_col, ', '.join(['%s'] * len(deltas)),
+    )
+    params += [connection.ops.adapt_datetimefield_value(timezone.now())]
+    params += list(deltas)
+
+    with connection.cursor() as cursor:
+        if _supports_update_returning():
+            cursor.execute(sql + ' RETURNING %s, %s, %s, %s' % (pk_col, stock_col, minimum_col, active_alert_sql),
+                           params)
+            rows = cursor.fetchall()
+            return [(pk, _to_decimal(stock), _to_decimal(minimum), has_alert)
+                    for pk, stock, minimum, has_alert in rows]
+        cursor.execute(sql, params)
+
+    # Sin RETURNING leemos las filas dentro de la misma transacción: el UPDATE
+    # mantiene el bloqueo de fila, así que el valor leído es el recién escrito.
+    active_alert = Exists(StockAlert.objects.filter(product=OuterRef('pk'), resolved=False))
+    return list(Product.objects.filter(pk__in=deltas).annotate(has_active_alert=active_alert)
+                .values_list('pk', 'current_stock', 'minimum_stock_level', 'has_active_alert'))
+
+
+def _to_decimal(value):
+    """Normaliza el valor crudo devuelto por el driver a Decimal con 2 decimales."""
+    field = Product._meta.get_field('current_stock')
+    return field.to_python(value).quantize(Decimal(1).scaleb(-field.decimal_places))
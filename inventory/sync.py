@@ -0,0 +1,348 @@
+"""
+Sincronización por lotes de los TPV (POST /api/v1/sync/).
+
+Sin conexión, el TPV guarda las ventas y movimientos y, al reconectar, los
+envía todos en un lote JSON:
+
+    {"lote": "<clave>", "dispositivo": "caja-1", "lineas": [
+        {"clave": "<clave>", "tipo": "venta", "producto": 7,
+         "cantidad": "2", "precio": "3.50", "fecha": "2026-05-04T09:15:00"},
+        {"clave": "<clave>", "tipo": "movimiento", "producto": 7,
+         "movimiento": "OUT", "cantidad": "1", "descripcion": "Merma"}
+    ]}
+
+Las claves (p. ej. UUID) las genera el TPV, una por lote y una por línea, y
+no cambian al reintentar:
+
+- Un lote ya recibido (el TPV no llegó a ver la respuesta) devuelve el
+  resultado guardado sin aplicar nada.
+- Cada línea aplicada deja una fila SyncLine con su clave. Las claves se
+  reclaman con un INSERT ... ON CONFLICT DO NOTHING sobre su índice único
+  (como las alertas y las tareas): una línea que ya llegó en otro lote se
+  marca como "duplicada" y no se vuelve a aplicar, aunque los dos lotes
+  lleguen a la vez.
+- Las líneas con errores no se aplican ni consumen su clave: el TPV puede
+  corregirlas y enviarlas en otro lote.
+- Una salida mayor que el stock se rechaza. Se comprueba con los productos
+  bloqueados y en el orden del lote, de modo que el movimiento registra
+  exactamente lo que se descuenta (borrarlo o editarlo deshace eso mismo).
+
+Todo el lote se aplica en una transacción con operaciones en bloque: un
+INSERT de los ítems de venta nuevos, un UPDATE de los que ya existían, un
+INSERT de los movimientos y un UPDATE de stock para las ventas y otro para
+los movimientos (ver inventory.stock), más un SELECT ... FOR UPDATE de los
+productos si el lote trae salidas y un SELECT de los precios ya registrados
+si trae ventas. SaleItem admite un solo ítem por
+producto y sesión, así que las ventas de un producto que ya tiene ítem ese
+día se suman a él. Como el ítem tiene un solo precio, una venta con otro
+precio (distinto del ítem ya registrado o de la primera venta del producto
+ese día en el lote) se rechaza con un error en su línea en lugar de sumarse
+a un precio que no es el suyo.
+
+Los formularios de venta y de movimiento de la interfaz usan las mismas
+claves (claim_line) para que un doble envío no registre dos veces.
+"""
+import uuid
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .api import API_VERSION
+from .forms import SyncLineForm
+from .models import DailySalesSession, Product, SaleItem, StockMovement, SyncBatch, SyncLine
+from .sales import update_session_totals
+from .stock import apply_stock_deltas
+
+# Reintentos si otro lote crea a la vez el mismo ítem de venta (sesión, producto).
+CONFLICT_RETRIES = 3
+
+LINE_KINDS = {'venta': 'SALE', 'movimiento': 'MOVEMENT'}
+
+
+def new_line_key():
+    """Clave para el campo oculto `clave` de los formularios de la interfaz."""
+    return uuid.uuid4().hex
+
+
+def claim_line(key, kind):
+    """
+    Reclama la clave de una línea enviada desde un formulario, dentro de la
+    transacción que la aplica. Devuelve la SyncLine, o None si esa clave ya
+    se aplicó (el formulario se envió dos veces).
+    """
+    try:
+        with transaction.atomic():
+            return SyncLine.objects.create(key=key[:64], kind=kind)
+    except IntegrityError:
+        return None
+
+
+def sync_batch(data, user=None):
+    """
+    Aplica un lote (`data`, el JSON ya decodificado) y devuelve la respuesta
+    para el TPV. Lanza ValidationError si el lote está mal formado (sin clave
+    o sin lista de líneas); entonces no se aplica nada.
+    """
+    key, device, lines = _parse_batch(data)
+    for attempt in range(CONFLICT_RETRIES):
+        try:
+            with transaction.atomic():
+                return _sync(key, device, lines, user)
+        except IntegrityError:
+            # Otro lote creó a la vez un ítem (sesión, producto) que este
+            # también creaba: al repetir, las ventas se suman a ese ítem.
+            if attempt == CONFLICT_RETRIES - 1:
+                raise
+
+
+def _parse_batch(data):
+    if not isinstance(data, dict):
+        raise ValidationError("El lote debe ser un objeto JSON.")
+    key = data.get('lote')
+    if not isinstance(key, str) or not key.strip() or len(key) > 64:
+        raise ValidationError("El lote necesita una clave ('lote') de hasta 64 caracteres.")
+    lines = data.get('lineas')
+    if not isinstance(lines, list) or not lines:
+        raise ValidationError("El lote necesita una lista de líneas ('lineas').")
+    max_lines = getattr(settings, 'SYNC_BATCH_MAX_LINES', 500)
+    if len(lines) > max_lines:
+        raise ValidationError(f"Un lote admite como mucho {max_lines} líneas.")
+    return key, str(data.get('dispositivo') or '')[:100], lines
+
+
+def _sync(key, device, lines, user):
+    # Reclama el lote; si ya existía (reenvío), se devuelve su resultado.
+    SyncBatch.objects.bulk_create([SyncBatch(key=key, device=device, user=user)], ignore_conflicts=True)
+    batch = SyncBatch.objects.get(key=key)
+    if batch.results is not None:
+        return _response(batch, replayed=True)
+
+    # Todos los productos del lote con una sola consulta.
+    product_ids = {str(line.get('producto')) for line in lines if isinstance(line, dict)}
+    products = Product.objects.in_bulk([int(pk) for pk in product_ids if pk.isdigit()])
+
+    results = []
+    valid = [] # (posición en results, cleaned_data)
+    seen = set()
+    for line in lines:
+        form = SyncLineForm(line if isinstance(line, dict) else {}, products=products)
+        if not form.is_valid():
+            results.append({'clave': line.get('clave') if isinstance(line, dict) else None,
+                            'estado': 'error', 'errores': form.errors.get_json_data()})
+        elif form.cleaned_data['clave'] in seen:
+            results.append({'clave': form.cleaned_data['clave'], 'estado': 'error',
+                            'errores': {'clave': [{'message': "Clave repetida en el lote.", 'code': 'unique'}]}})
+        else:
+            seen.add(form.cleaned_data['clave'])
+            results.append(None)
+            valid.append((len(results) - 1, form.cleaned_data))
+
+    # Reclama las claves: las que ya existían son de líneas aplicadas antes.
+    SyncLine.objects.bulk_create(
+        [SyncLine(key=line['clave'], kind=LINE_KINDS[line['tipo']], batch=batch) for _, line in valid],
+        ignore_conflicts=True,
+    )
+    claimed = {sync_line.key: sync_line for sync_line in batch.lines.all()}
+    now = timezone.now()
+    _reject_mismatched_prices([(i, line) for i, line in valid if line['clave'] in claimed], claimed, results, now)
+    _reject_oversold([(i, line) for i, line in valid if line['clave'] in claimed], claimed, results)
+    previous = {
+        line_key: (sale_item_id, movement_id)
+        for line_key, sale_item_id, movement_id in SyncLine.objects.filter(
+            key__in=[line['clave'] for i, line in valid if results[i] is None and line['clave'] not in claimed]
+        ).values_list('key', 'sale_item_id', 'stock_movement_id')
+    }
+
+    sale_items = _apply_sales([(i, line) for i, line in valid
+                               if line['clave'] in claimed and line['tipo'] == 'venta'], user, now)
+    movements = _apply_movements([(i, line) for i, line in valid
+                                  if line['clave'] in claimed and line['tipo'] == 'movimiento'], user, now)
+
+    for index, line in valid:
+        line_key = line['clave']
+        if results[index] is not None:
+            continue  # Rechazada por precio o por falta de stock
+        if line_key not in claimed:
+            sale_item_id, movement_id = previous.get(line_key, (None, None))
+            results[index] = {'clave': line_key, 'estado': 'duplicada', 'tipo': line['tipo'],
+                              'venta_id': sale_item_id, 'movimiento_id': movement_id}
+        elif index in sale_items:
+            item = claimed[line_key].sale_item = sale_items[index]
+            results[index] = {'clave': line_key, 'estado': 'aplicada', 'tipo': 'venta', 'venta_id': item.pk,
+                              'sesion_id': item.sale_session_id, 'precio': item.price_at_sale}
+        else:
+            movement = claimed[line_key].stock_movement = movements[index]
+            results[index] = {'clave': line_key, 'estado': 'aplicada', 'tipo': 'movimiento',
+                              'movimiento_id': movement.pk}
+    SyncLine.objects.bulk_update(claimed.values(), ['sale_item', 'stock_movement'])
+
+    batch.line_count = len(lines)
+    batch.results = results
+    batch.save(update_fields=['line_count', 'results'])
+    return _response(batch, replayed=False)
+
+
+def _reject_mismatched_prices(lines, claimed, results, now):
+    """
+    Marca como error las ventas cuyo precio no coincide con el del ítem al
+    que se sumarían: el ya registrado ese día para el producto o, si no hay,
+    el de la primera venta del producto ese día en el lote. Sus claves se
+    liberan para que el TPV pueda reenviarlas.
+    """
+    sales = [(index, line) for index, line in lines if line['tipo'] == 'venta']
+    if not sales:
+        return
+    prices = {
+        (sale_date, product_id): price
+        for sale_date, product_id, price in SaleItem.objects.filter(
+            sale_session__sale_date__in={timezone.localdate(line['fecha'] or now) for _, line in sales},
+            product_id__in={line['producto'].pk for _, line in sales},
+        ).values_list('sale_session__sale_date', 'product_id', 'price_at_sale')
+    }
+    rejected = []
+    for index, line in sales:
+        product, price = line['producto'], line['precio'].quantize(Decimal('0.01'))
+        expected = prices.setdefault((timezone.localdate(line['fecha'] or now), product.pk), price)
+        if price != expected:
+            message = (f"Las ventas de '{product.name}' de ese día ya están registradas a {expected}; "
+                       f"esta línea trae {price}.")
+            results[index] = {'clave': line['clave'], 'estado': 'error',
+                              'errores': {'precio': [{'message': message, 'code': 'price_mismatch'}]}}
+            rejected.append(claimed.pop(line['clave']).pk)
+    if rejected:
+        SyncLine.objects.filter(pk__in=rejected).delete()
+
+
+def _reject_oversold(lines, claimed, results):
+    """
+    Marca como error las salidas que superan el stock del producto, leído con
+    la fila bloqueada hasta el final de la transacción y recorriendo el lote
+    en orden (las ventas y movimientos anteriores cuentan). Sus claves se
+    liberan para que el TPV pueda reenviarlas.
+    """
+    out_products = {line['producto'].pk for _, line in lines
+                    if line['tipo'] == 'movimiento' and line['movimiento'] == 'OUT'}
+    if not out_products:
+        return
+    stock = dict(Product.objects.select_for_update().filter(pk__in=out_products)
+                 .order_by('pk').values_list('pk', 'current_stock'))
+    rejected = []
+    for index, line in lines:
+        product, quantity = line['producto'], line['cantidad']
+        if product.pk not in stock:
+            continue
+        if line['tipo'] == 'venta':
+            stock[product.pk] -= quantity
+        elif line['movimiento'] == 'IN':
+            stock[product.pk] += quantity
+        elif quantity <= stock[product.pk]:
+            stock[product.pk] -= quantity
+        else:
+            message = (f"No hay suficiente stock de '{product.name}'. Stock actual: {stock[product.pk]} "
+                       f"{product.get_unit_of_measurement_display()}.")
+            results[index] = {'clave': line['clave'], 'estado': 'error',
+                              'errores': {'cantidad': [{'message': message, 'code': 'insufficient_stock'}]}}
+            rejected.append(claimed.pop(line['clave']).pk)
+    if rejected:
+        SyncLine.objects.filter(pk__in=rejected).delete()
+
+
+def _apply_sales(sales, user, now):
+    """
+    Suma las ventas a los ítems de sus sesiones (una por día, creándolas si
+    no existen) y descuenta el stock. Devuelve {posición: SaleItem}.
+    """
+    if not sales:
+        return {}
+    dates = {timezone.localdate(line['fecha'] or now) for _, line in sales}
+    DailySalesSession.objects.bulk_create(
+        [DailySalesSession(sale_date=date, registered_by_user=user) for date in dates], ignore_conflicts=True)
+    sessions = dict(DailySalesSession.objects.filter(sale_date__in=dates).values_list('sale_date', 'pk'))
+
+    # Ventas del lote agrupadas por ítem (sesión, producto).
+    positions = defaultdict(list)
+    quantities = defaultdict(Decimal)
+    prices = {}
+    for index, line in sales:
+        pair = (sessions[timezone.localdate(line['fecha'] or now)], line['producto'].pk)
+        positions[pair].append(index)
+        quantities[pair] += line['cantidad']
+        prices.setdefault(pair, line['precio'].quantize(Decimal('0.01')))
+
+    # Ítems ya existentes, bloqueados (en orden de pk) hasta el final de la transacción.
+    existing = {
+        (item.sale_session_id, item.product_id): item
+        for item in SaleItem.objects.select_for_update().filter(
+            sale_session_id__in={session_id for session_id, _ in quantities},
+            product_id__in={product_id for _, product_id in quantities},
+        ).order_by('pk')
+    }
+
+    items, new_items, updated_items = {}, [], []
+    stock_deltas = defaultdict(Decimal)
+    session_deltas = defaultdict(lambda: (Decimal('0'), Decimal('0'), 0))
+    for pair, quantity in quantities.items():
+        session_id, product_id = pair
+        item = existing.get(pair)
+        if item is None:
+            item = SaleItem(sale_session_id=session_id, product_id=product_id,
+                            quantity_sold=quantity, price_at_sale=prices[pair])
+            item.subtotal = item.calculate_subtotal()
+            new_items.append(item)
+            revenue_delta, count_delta = item.subtotal, 1
+        else:
+            previous_subtotal = item.subtotal
+            item.quantity_sold += quantity
+            item.subtotal = item.calculate_subtotal()
+            updated_items.append(item)
+            revenue_delta, count_delta = item.subtotal - previous_subtotal, 0
+        items[pair] = item
+        stock_deltas[product_id] -= quantity
+        revenue, total_quantity, count = session_deltas[session_id]
+        session_deltas[session_id] = (revenue + revenue_delta, total_quantity + quantity, count + count_delta)
+
+    SaleItem.objects.bulk_create(new_items)
+    SaleItem.objects.bulk_update(updated_items, ['quantity_sold', 'subtotal'])
+    apply_stock_deltas(stock_deltas)
+    update_session_totals(session_deltas)
+    return {index: items[pair] for pair, indexes in positions.items() for index in indexes}
+
+
+def _apply_movements(movements, user, now):
+    """Registra los movimientos y aplica su stock. Devuelve {posición: StockMovement}."""
+    if not movements:
+        return {}
+    created = StockMovement.objects.bulk_create([
+        StockMovement(product=line['producto'], movement_type=line['movimiento'], quantity=line['cantidad'],
+                      movement_date=line['fecha'] or now, description=line['descripcion'] or None,
+                      registered_by=user)
+        for _, line in movements
+    ])
+    deltas = defaultdict(Decimal)
+    for movement in created:
+        product_id, delta = movement.stock_effect()
+        deltas[product_id] += delta
+    # Sin el recorte a cero de StockMovement.save(): _reject_oversold ya
+    # comprobó cada salida con el stock bloqueado, y el delta aplicado debe
+    # ser el que registra el movimiento.
+    apply_stock_deltas(deltas)
+    return {index: movement for (index, _), movement in zip(movements, created)}
+
+
+def _response(batch, replayed):
+    statuses = Counter(result['estado'] for result in batch.results)
+    return {
+        'version': API_VERSION,
+        'lote': batch.key,
+        'repetido': replayed,
+        'resumen': {
+            'aplicadas': statuses['aplicada'],
+            'duplicadas': statuses['duplicada'],
+            'errores': statuses['error'],
+        },
+        'lineas': batch.results,
+    }
@@ -0,0 +1,156 @@
+"""
+Generador determinista de datos sintéticos.
+
+Crea con bulk_create un catálogo, alertas, movimientos, sesiones de venta y
+pedidos a proveedores de tamaño configurable. Con la misma semilla produce siempre los mismos datos,
+así que sirve para comprobar planes de consulta y comparar mediciones entre
+ejecuciones. Los datos se insertan sin pasar por save() (no se aplican
+deltas de stock ni se evalúan alertas): el stock y las alertas se generan
+directamente en un estado coherente.
+"""
+import datetime
+import random
+from itertools import islice
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (CustomUser, DailySalesSession, Product, PurchaseOrder, PurchaseOrderLine, Role,
+                     SaleItem, StockAlert, StockMovement, Supplier)
+
+BATCH_SIZE = 1000
+# Líneas por pedido sintético (uno por proveedor).
+LINES_PER_ORDER = 20
+
+
+def generate_dataset(products=500, movements_per_product=10, sessions=90, items_per_session=20,
+                     seed=0):
+    """
+    Inserta un conjunto de datos sintéticos en una transacción.
+
+    `sessions` es el número de días con ventas (uno por sesión, hacia atrás
+    desde ayer); los movimientos se reparten en ese mismo periodo.
+
+    Devuelve (usuario OWNER sintético, {modelo: filas creadas}).
+    """
+    rng = random.Random(seed)
+    prefix = f"SYN{seed}"
+    now = timezone.now()
+    history_days = max(sessions, 1)
+    created = {}
+
+    with transaction.atomic():
+        owner_role, _ = Role.objects.get_or_create(name='OWNER')
+        user, _ = CustomUser.objects.get_or_create(username=f'{prefix.lower()}_owner',
+                                                   defaults={'role': owner_role})
+
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(name=f"{prefix} Proveedor {i:03d}", delivery_days=rng.choice(['Lunes', 'Martes y Jueves', 'Viernes']))
+            for i in range(max(1, products // 50))
+        ], batch_size=BATCH_SIZE)
+        created['suppliers'] = len(suppliers)
+
+        product_objs = []
+        for i in range(products):
+            minimum = Decimal(rng.randint(5, 50))
+            # Aproximadamente un 20 % del catálogo queda con stock bajo.
+            stock = minimum * Decimal(rng.uniform(0.1, 0.99) if rng.random() < 0.2 else rng.uniform(1.1, 6))
+            product_objs.append(Product(
+                name=f"{prefix} Producto {i:06d}",
+                unit_of_measurement=rng.choice(Product.UNIT_CHOICES)[0],
+                current_stock=stock.quantize(Decimal('0.01')),
+                minimum_stock_level=minimum,
+                supplier=rng.choice(suppliers),
+                price_per_unit_from_supplier=Decimal(rng.randint(100, 5000)) / 100,
+            ))
+        product_objs = Product.objects.bulk_create(product_objs, batch_size=BATCH_SIZE)
+        created['products'] = len(product_objs)
+
+        alerts = []
+        for product in product_objs:
+            # Historial de alertas resueltas y una activa si el stock está bajo.
+            # (alert_timestamp es auto_now_add: todas quedan con la fecha actual).
+            for _ in range(rng.randint(0, 2)):
+                alerts.append(StockAlert(product=product, current_stock_at_alert=product.minimum_stock_level,
+                                         resolved=True, resolved_timestamp=now))
+            if product.current_stock <= product.minimum_stock_level:
+                alerts.append(StockAlert(product=product, current_stock_at_alert=product.current_stock))
+        created['alerts'] = len(StockAlert.objects.bulk_create(alerts, batch_size=BATCH_SIZE))
+
+        # Los movimientos se generan y se insertan por lotes (pueden ser millones).
+        movement_objs = (
+            StockMovement(product=product,
+                          movement_type=rng.choice(('IN', 'OUT')),
+                          quantity=Decimal(rng.randint(1, 40)),
+                          movement_date=now - datetime.timedelta(days=rng.randint(0, history_days),
+                                                                 seconds=rng.randint(0, 86399)),
+                          registered_by=user)
+            for product in product_objs
+            for _ in range(movements_per_product)
+        )
+        created['movements'] = _bulk_create_in_batches(StockMovement, movement_objs)
+
+        used_dates = set(DailySalesSession.objects.values_list('sale_date', flat=True))
+        session_objs = []
+        day = timezone.localdate()
+        while len(session_objs) < sessions:
+            day -= datetime.timedelta(days=1)
+            if day not in used_dates:
+                # Marcadas para que refresh_daily_product_sales construya su resumen.
+                session_objs.append(DailySalesSession(sale_date=day, registered_by_user=user, rollup_stale=True))
+
+        # Los totales desnormalizados se calculan antes de insertar las sesiones.
+        items = []
+        for session in session_objs:
+            session.total_revenue, session.total_quantity = Decimal('0'), Decimal('0')
+            for product in rng.sample(product_objs, min(items_per_session, len(product_objs))):
+                item = SaleItem(sale_session=session, product=product,
+                                quantity_sold=Decimal(rng.randint(1, 10)),
+                                price_at_sale=product.price_per_unit_from_supplier * 2)
+                item.subtotal = item.calculate_subtotal()
+                session.total_revenue += item.subtotal
+                session.total_quantity += item.quantity_sold
+                session.item_count += 1
+                items.append(item)
+        created['sessions'] = len(DailySalesSession.objects.bulk_create(session_objs, batch_size=BATCH_SIZE))
+        created['sale_items'] = _bulk_create_in_batches(SaleItem, items)
+
+        # Un pedido por proveedor con algunos de sus productos; el último
+        # creado queda en borrador (el detalle más completo, con formset).
+        products_by_supplier = {}
+        for product in product_objs:
+            products_by_supplier.setdefault(product.supplier_id, []).append(product)
+        statuses = ('DRAFT', 'CONFIRMED', 'RECEIVED')
+        order_objs = []
+        for i, supplier in enumerate(suppliers):
+            status = statuses[(len(suppliers) - 1 - i) % len(statuses)]
+            order_objs.append(PurchaseOrder(
+                supplier=supplier, status=status, created_by=user,
+                expected_delivery_date=timezone.localdate() + datetime.timedelta(days=rng.randint(1, 7)),
+                confirmed_at=now if status != 'DRAFT' else None,
+                received_at=now if status == 'RECEIVED' else None,
+                received_by=user if status == 'RECEIVED' else None,
+            ))
+        order_objs = PurchaseOrder.objects.bulk_create(order_objs, batch_size=BATCH_SIZE)
+        created['purchase_orders'] = len(order_objs)
+
+        lines = []
+        for order in order_objs:
+            supplier_products = products_by_supplier.get(order.supplier_id, [])
+            for product in rng.sample(supplier_products, min(LINES_PER_ORDER, len(supplier_products))):
+                lines.append(PurchaseOrderLine(order=order, product=product, quantity=Decimal(rng.randint(1, 50)),
+                                               unit_price=product.price_per_unit_from_supplier))
+        created['purchase_order_lines'] = len(PurchaseOrderLine.objects.bulk_create(lines, batch_size=BATCH_SIZE))
+
+    return user, created
+
+
+def _bulk_create_in_batches(model, objs):
+    """bulk_create de un iterable sin materializarlo entero en memoria."""
+    total = 0
+    iterator = iter(objs)
+    while batch := list(islice(iterator, BATCH_SIZE)):
+        model.objects.bulk_create(batch)
+        total += len(batch)
+    return total
@@ -0,0 +1,242 @@
+"""
+Cola de tareas en segundo plano guardada en la propia base de datos.
+
+Los efectos secundarios que no tienen que terminar antes de responder
+(resúmenes de alertas por correo, refresco del resumen de ventas,
+exportaciones enviadas por correo) se encolan con enqueue() y los ejecutan los procesos de
+`python manage.py run_worker`, de modo que una venta responde en cuanto se
+guarda.
+
+enqueue() inserta la fila Task en la transacción de la escritura que la
+origina: los workers solo la ven cuando esa transacción se confirma y, si se
+revierte, la tarea desaparece con ella. A diferencia de on_commit, no se
+pierde si el proceso cae justo después de confirmar.
+
+Cada worker reclama una tarea con SELECT ... FOR UPDATE SKIP LOCKED (los
+demás saltan las filas bloqueadas en lugar de esperar) y un UPDATE
+condicional que la marca como RUNNING, así que dos workers nunca ejecutan la
+misma tarea (también en SQLite, que ignora FOR UPDATE). Si la tarea falla se
+reintenta con espera exponencial hasta max_attempts; si un worker muere a
+mitad, la tarea se vuelve a reclamar pasados TASK_TIMEOUT segundos (las
+tareas se ejecutan al menos una vez y deben tolerar repetirse). Esa
+recuperación también cuenta como intento: una tarea que tumba a su worker
+(memoria agotada, SIGKILL) queda FAILED al agotar max_attempts en lugar de
+reclamarse para siempre.
+
+Las tareas con `key` se deduplican: como mucho hay una pendiente por clave
+(índice único parcial), así que mil ventas seguidas encolan un solo
+refresco del resumen y las alertas de una ventana, un solo correo.
+"""
+import datetime
+import gzip
+import io
+import logging
+import random
+import time
+import traceback
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CustomUser, Task
+from .replicas import replica_reads
+
+logger = logging.getLogger(__name__)
+
+RegisteredTask = namedtuple('RegisteredTask', ['func', 'max_attempts'])
+
+# Tareas registradas con @task, por nombre.
+TASKS = {}
+
+
+def task(name=None, max_attempts=5):
+    """Registra una función como tarea; sus argumentos deben ser serializables en JSON."""
+    def decorator(func):
+        TASKS[name or func.__name__] = RegisteredTask(func, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, key=None, delay=None, **kwargs):
+    """
+    Encola la tarea `name` con los argumentos `kwargs` para cuando se confirme
+    la transacción actual. Con `key`, no se encola si ya hay una tarea
+    pendiente con la misma clave. `delay` (segundos) retrasa la ejecución.
+    """
+    registered = TASKS[name]
+    run_at = timezone.now()
+    if delay:
+        run_at += datetime.timedelta(seconds=delay)
+    new_task = Task(name=name, kwargs=kwargs, key=key, max_attempts=registered.max_attempts, run_at=run_at)
+    # ON CONFLICT DO NOTHING sobre unique_pending_task_key (como create_alerts).
+    Task.objects.bulk_create([new_task], ignore_conflicts=key is not None)
+
+
+# --- Worker ---
+
+def claim_task():
+    """
+    Reclama la siguiente tarea lista (pendiente y con run_at vencido, o en
+    ejecución desde hace más de TASK_TIMEOUT) y la marca como RUNNING.
+    Devuelve la Task o None si no hay ninguna. Las tareas en ejecución que
+    superan TASK_TIMEOUT con los intentos agotados se marcan como FAILED.
+    """
+    now = timezone.now()
+    timeout = datetime.timedelta(seconds=getattr(settings, 'TASK_TIMEOUT', 60 * 10))
+    with transaction.atomic():
+        while True:
+            ready = (Task.objects.select_for_update(skip_locked=True)
+                     .filter(Q(status='PENDING', run_at__lte=now) | Q(status='RUNNING', started_at__lt=now - timeout))
+                     .order_by('run_at', 'pk')
+                     .first())
+            if ready is None:
+                return None
+            if ready.status == 'PENDING' or ready.attempts < ready.max_attempts:
+                break
+            # Su worker murió en el último intento: no se vuelve a ejecutar.
+            Task.objects.filter(pk=ready.pk, status='RUNNING', attempts=ready.attempts).update(
+                status='FAILED', finished_at=now,
+                last_error=f"Sin terminar tras {ready.attempts} intentos: el worker no respondió en TASK_TIMEOUT.")
+        # Condicional: si otro worker la reclamó entre medias, no la toca.
+        claimed = Task.objects.filter(pk=ready.pk, status=ready.status, attempts=ready.attempts).update(
+            status='RUNNING', started_at=now, attempts=F('attempts') + 1)
+    if not claimed:
+        return None
+    ready.status, ready.started_at, ready.attempts = 'RUNNING', now, ready.attempts + 1
+    return ready
+
+
+def run_task(claimed):
+    """Ejecuta una tarea reclamada y registra el resultado (completada, reintento o fallida)."""
+    registered = TASKS.get(claimed.name)
+    try:
+        if registered is None:
+            raise LookupError(f"Tarea desconocida: {claimed.name}")
+        registered.func(**claimed.kwargs)
+    except Exception:
+        logger.exception("La tarea %s (#%s) falló en el intento %s.", claimed.name, claimed.pk, claimed.attempts)
+        error = traceback.format_exc()
+        if registered is None or claimed.attempts >= claimed.max_attempts:
+            _finish(claimed, 'FAILED', error)
+        else:
+            _retry(claimed, error)
+        return False
+    _finish(claimed, 'DONE')
+    return True
+
+
+def retry_delay(attempts):
+    """Segundos hasta el siguiente intento: exponencial, con tope y un poco de aleatoriedad."""
+    base = getattr(settings, 'TASK_RETRY_BASE_SECONDS', 10)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'TASK_RETRY_MAX_SECONDS', 60 * 60))
+    # Reparte los reintentos de tareas que fallaron a la vez (p. ej. el servidor de correo caído).
+    return delay * random.uniform(0.9, 1.1)
+
+
+def work(stop=None, burst=False, poll_interval=1.0):
+    """
+    Bucle de un worker: reclama y ejecuta tareas hasta que `stop` (un
+    threading/multiprocessing Event) se activa o, con `burst`, hasta que no
+    quedan tareas listas. Devuelve el número de tareas ejecutadas.
+    """
+    processed = 0
+    while stop is None or not stop.is_set():
+        _close_old_connections()
+        try:
+            claimed = claim_task()
+            if claimed is not None:
+                run_task(claimed)
+        except DatabaseError:
+            # Conexión caída o bloqueo (SQLite con varios workers): se reintenta
+            # tras la espera. Una tarea que quede en RUNNING se vuelve a
+            # reclamar pasado TASK_TIMEOUT.
+            logger.exception("Error de base de datos en el worker.")
+            _close_old_connections()
+            _wait(stop, poll_interval)
+            continue
+        if claimed is None:
+            if burst:
+                break
+            _wait(stop, poll_interval)
+            continue
+        processed += 1
+    _close_old_connections()
+    return processed
+
+
+def _wait(stop, seconds):
+    if stop is not None:
+        stop.wait(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def _close_old_connections():
+    # Como entre peticiones: descarta conexiones caducadas o rotas. Dentro de
+    # una transacción (p. ej. un TestCase que llama a work()) no se toca.
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def _finish(claimed, status, error=''):
+    Task.objects.filter(pk=claimed.pk).update(status=status, finished_at=timezone.now(), last_error=error)
+
+
+def _retry(claimed, error):
+    run_at = timezone.now() + datetime.timedelta(seconds=retry_delay(claimed.attempts))
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=claimed.pk).update(status='PENDING', run_at=run_at, last_error=error)
+    except IntegrityError:
+        # Ya hay otra pendiente con la misma clave y hará el mismo trabajo.
+        Task.objects.filter(pk=claimed.pk).delete()
+
+
+# --- Tareas ---
+
+@task()
+def refresh_sales_rollup():
+    """Recalcula el resumen de ventas de las sesiones marcadas (ver inventory.rollups)."""
+    from .rollups import refresh_daily_product_sales
+
+    refresh_daily_product_sales()
+
+
+@task()
+def send_alert_digests():
+    """Resumen por correo de las alertas creadas durante la ventana (ver inventory.notifications)."""
+    from .notifications import send_alert_digests as send
+
+    send()
+
+
+@task(max_attempts=3)
+def email_export(kind, fmt, user_id, start_date=None, end_date=None):
+    """Genera una exportación (ver inventory.exports) y la envía comprimida al correo del usuario."""
+    from .exports import export_filename, export_queryset, stream_export
+
+    user = CustomUser.objects.filter(pk=user_id).exclude(email='').first()
+    if user is None:
+        return
+    start_date = datetime.date.fromisoformat(start_date) if start_date else None
+    end_date = datetime.date.fromisoformat(end_date) if end_date else None
+
+    # Se comprime trozo a trozo: en memoria solo queda el fichero comprimido.
+    # Lectura larga de datos históricos: de la réplica, si la hay.
+    buffer = io.BytesIO()
+    with replica_reads(), gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+        for chunk in stream_export(kind, export_queryset(kind, start_date, end_date), fmt):
+            compressed.write(chunk.encode('utf-8'))
+
+    filename = export_filename(kind, fmt, start_date, end_date)
+    message = EmailMessage(
+        subject=f"CafeCentral: exportación {filename}",
+        body="Adjuntamos la exportación que solicitaste.",
+        to=[user.email],
+    )
+    message.attach(f"{filename}.gz", buffer.getvalue(), 'application/gzip')
+    message.send()
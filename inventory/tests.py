@@ -1,3 +1,1062 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import sqlite3
+import tempfile
+import threading
+from smtplib import SMTPException
+from decimal import Decimal
+from functools import partial
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.db.models import QuerySet
+from django.http import Http404
+from django.template.defaultfilters import floatformat
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from . import events
+from .alerts import create_alerts, reconcile_alerts
+from .analytics import ANALYTICS_CACHE_KEY, ConsumptionStats, get_consumption_stats
+from .asyncdb import gather_queries
+from .dashboard import compute_dashboard_metrics
+from .dbpool import pool_stats
+from .imports import import_catalog
+from .instrumentation import request_log
+from .models import (CustomUser, DailyProductSales, DailySalesSession, InventorySnapshot, Product, PurchaseOrder,
+                     PurchaseOrderLine, Role, SaleItem, StockAlert, StockMovement, Supplier, SyncLine, Task)
+from .notifications import pending_alerts, send_alert_digests
+from .pagination import KeysetPaginationMixin
+from .purchasing import (DEFAULT_REVIEW_DAYS, confirm_purchase_order, create_draft_orders, next_delivery_dates,
+                          parse_delivery_days, receive_purchase_order, suggest_purchase_orders)
+from .queryplans import check_query_plans
+from .replicas import PIN_COOKIE, REPLICA_DB_ALIAS, read_alias, replica_reads
+from .rollups import refresh_daily_product_sales
+from .sales import recalculate_session_totals, stale_session_totals
+from .snapshots import day_start, stock_at, take_snapshot
+from .stock import apply_stock_delta
+from .sync import sync_batch
+from .tasks import TASKS, claim_task, enqueue, retry_delay, run_task, task
+from .synthetic import generate_dataset
+
+
+def create_inventory(target):
+    """Datos mínimos compartidos: un propietario, un proveedor y dos productos."""
+    owner_role, _ = Role.objects.get_or_create(name='OWNER')
+    target.owner = CustomUser.objects.create_user('propietario', password='x', role=owner_role)
+    target.supplier = Supplier.objects.create(name='Proveedor')
+    target.coffee = Product.objects.create(
+        name='Café', unit_of_measurement='kg', current_stock=Decimal('10'),
+        minimum_stock_level=Decimal('3'), supplier=target.supplier,
+        price_per_unit_from_supplier=Decimal('1.00'))
+    target.milk = Product.objects.create(
+        name='Leche', unit_of_measurement='l', current_stock=Decimal('20'),
+        minimum_stock_level=Decimal('5'), supplier=target.supplier,
+        price_per_unit_from_supplier=Decimal('0.50'))
+
+
+class InventoryTestData:
+
+    @classmethod
+    def setUpTestData(cls):
+        create_inventory(cls)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.owner)
+
+
+class StockDeltaTests(InventoryTestData, TestCase):
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.current_stock
+
+    def test_saves_from_stale_instances_add_up(self):
+        session = DailySalesSession.objects.create(registered_by_user=self.owner)
+        first, second = Product.objects.get(pk=self.coffee.pk), Product.objects.get(pk=self.coffee.pk)
+        SaleItem(sale_session=session, product=first, quantity_sold=Decimal('2'), price_at_sale=Decimal('3')).save()
+        StockMovement(product=second, movement_type='OUT', quantity=Decimal('1')).save()
+        self.assertEqual(self.stock(self.coffee), Decimal('7'))
+
+    def test_sale_statements(self):
+        session = DailySalesSession.objects.create(registered_by_user=self.owner)
+        # Primera venta de la sesión: la marca para el resumen y encola el refresco.
+        with self.assertNumQueries(5):
+            SaleItem(sale_session=session, product=self.coffee, quantity_sold=Decimal('1'),
+                     price_at_sale=Decimal('3')).save()
+        # Con la sesión ya marcada: INSERT del ítem, UPDATE del stock y UPDATE de la sesión.
+        with self.assertNumQueries(3):
+            SaleItem(sale_session=session, product=self.milk, quantity_sold=Decimal('1'),
+                     price_at_sale=Decimal('1')).save()
+        self.assertEqual(Task.objects.filter(name='refresh_sales_rollup', status='PENDING').count(), 1)
+        session.refresh_from_db()
+        self.assertEqual((session.total_revenue, session.item_count, session.rollup_stale),
+                         (Decimal('4.00'), 2, True))
+
+    def test_one_active_alert_per_product(self):
+        session = DailySalesSession.objects.create(registered_by_user=self.owner)
+        item = SaleItem(sale_session=session, product=self.coffee, quantity_sold=Decimal('8'),
+                        price_at_sale=Decimal('3'))
+        item.save()
+        item.quantity_sold = Decimal('9')
+        item.save()
+        create_alerts([(self.coffee.pk, Decimal('1'))])
+        self.assertEqual(StockAlert.objects.filter(product=self.coffee, resolved=False).count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StockAlert.objects.create(product=self.coffee, current_stock_at_alert=Decimal('1'))
+
+        # Al reponer por encima del mínimo la alerta se resuelve.
+        StockMovement(product=self.coffee, movement_type='IN', quantity=Decimal('5')).save()
+        self.assertFalse(StockAlert.objects.filter(product=self.coffee, resolved=False).exists())
+        self.assertEqual(StockAlert.objects.filter(product=self.coffee).count(), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentStockTests(TransactionTestCase):
+    """Escrituras simultáneas desde varias conexiones (no aplica a SQLite, que las serializa)."""
+
+    def setUp(self):
+        create_inventory(self)
+
+    def run_concurrently(self, func, threads=8):
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    func()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_deltas_are_not_lost(self):
+        self.run_concurrently(lambda: apply_stock_delta(self.milk.pk, Decimal('-1')))
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.current_stock, Decimal('12'))
+
+    def test_concurrent_alerts_create_one(self):
+        self.run_concurrently(lambda: create_alerts([(self.coffee.pk, Decimal('1'))]))
+        self.assertEqual(StockAlert.objects.filter(product=self.coffee, resolved=False).count(), 1)
+
+
+class SaleItemBatchTests(InventoryTestData, TestCase):
+
+    def post_rows(self, session, rows):
+        data = {
+            'sale_items-TOTAL_FORMS': str(len(rows)),
+            'sale_items-INITIAL_FORMS': '0',
+            'sale_items-MIN_NUM_FORMS': '0',
+            'sale_items-MAX_NUM_FORMS': '1000',
+        }
+        for i, (product, quantity, price) in enumerate(rows):
+            data.update({f'sale_items-{i}-product': product.pk,
+                         f'sale_items-{i}-quantity_sold': quantity,
+                         f'sale_items-{i}-price_at_sale': price})
+        return self.client.post(reverse('inventory:saleitem_batch_create', args=[session.pk]), data)
+
+    def test_batch_records_items_and_stock(self):
+        session = DailySalesSession.objects.create(registered_by_user=self.owner)
+        response = self.post_rows(session, [(self.coffee, '2', '3.00'), (self.milk, '1', '1.00')])
+        self.assertRedirects(response, reverse('inventory:dailysalessession_detail', args=[session.pk]),
+                             fetch_redirect_response=False)
+        self.assertEqual(SaleItem.objects.filter(sale_session=session).count(), 2)
+        self.coffee.refresh_from_db()
+        self.assertEqual(self.coffee.current_stock, Decimal('8'))
+
+    def test_duplicate_product_in_batch_is_a_form_error(self):
+        session = DailySalesSession.objects.create(registered_by_user=self.owner)
+        response = self.post_rows(session, [(self.coffee, '2', '3.00'), (self.coffee, '1', '3.00')])
+        self.assertEqual(response.status_code, 200)
+        formset = response.context['formset']
+        self.assertFalse(formset.forms[0].errors)
+        self.assertIn('product', formset.forms[1].errors)
+        self.assertFalse(SaleItem.objects.filter(sale_session=session).exists())
+        self.coffee.refresh_from_db()
+        self.assertEqual(self.coffee.current_stock, Decimal('10'))
+
+
+class SyncBatchTests(InventoryTestData, TestCase):
+
+    def sale(self, key, product, quantity, price='3.00'):
+        return {'clave': key, 'tipo': 'venta', 'producto': product.pk, 'cantidad': quantity, 'precio': price}
+
+    def movement(self, key, product, movement_type, quantity):
+        return {'clave': key, 'tipo': 'movimiento', 'producto': product.pk,
+                'movimiento': movement_type, 'cantidad': quantity}
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.current_stock
+
+    def test_replayed_batch_returns_stored_result(self):
+        batch = {'lote': 'lote-1', 'lineas': [self.sale('l1', self.coffee, '2'),
+                                              self.movement('l2', self.milk, 'IN', '5')]}
+        first = sync_batch(batch, user=self.owner)
+        self.assertEqual(first['resumen'], {'aplicadas': 2, 'duplicadas': 0, 'errores': 0})
+        replay = sync_batch(batch, user=self.owner)
+        self.assertTrue(replay['repetido'])
+        self.assertEqual(replay['lineas'], sync_batch(batch)['lineas'])
+        self.assertEqual(self.stock(self.coffee), Decimal('8'))
+        self.assertEqual(self.stock(self.milk), Decimal('25'))
+
+    def test_line_from_another_batch_is_duplicate(self):
+        sync_batch({'lote': 'lote-1', 'lineas': [self.sale('l1', self.coffee, '2')]})
+        response = sync_batch({'lote': 'lote-2', 'lineas': [self.sale('l1', self.coffee, '2'),
+                                                            self.sale('l2', self.milk, '1', '1.00')]})
+        self.assertEqual(response['resumen'], {'aplicadas': 1, 'duplicadas': 1, 'errores': 0})
+        self.assertEqual(response['lineas'][0]['estado'], 'duplicada')
+        self.assertEqual(self.stock(self.coffee), Decimal('8'))
+
+    def test_repeated_key_within_batch_is_error(self):
+        response = sync_batch({'lote': 'lote-1', 'lineas': [self.sale('l1', self.coffee, '2'),
+                                                            self.sale('l1', self.coffee, '2')]})
+        self.assertEqual([line['estado'] for line in response['lineas']], ['aplicada', 'error'])
+        self.assertEqual(self.stock(self.coffee), Decimal('8'))
+
+    def test_oversold_out_is_rejected_and_releases_its_key(self):
+        response = sync_batch({'lote': 'lote-1', 'lineas': [self.sale('l1', self.coffee, '2'),
+                                                            self.movement('l2', self.coffee, 'OUT', '50')]})
+        self.assertEqual([line['estado'] for line in response['lineas']], ['aplicada', 'error'])
+        self.assertIn('cantidad', response['lineas'][1]['errores'])
+        self.assertFalse(SyncLine.objects.filter(key='l2').exists())
+        self.assertEqual(self.stock(self.coffee), Decimal('8'))
+
+        # Corregida, la misma línea se aplica en otro lote; borrarla deshace justo lo aplicado.
+        response = sync_batch({'lote': 'lote-2', 'lineas': [self.movement('l2', self.coffee, 'OUT', '8')]})
+        self.assertEqual(response['lineas'][0]['estado'], 'aplicada')
+        self.assertEqual(self.stock(self.coffee), Decimal('0'))
+        StockMovement.objects.get(pk=response['lineas'][0]['movimiento_id']).delete()
+        self.assertEqual(self.stock(self.coffee), Decimal('8'))
+
+    def test_out_check_counts_earlier_lines_of_the_batch(self):
+        response = sync_batch({'lote': 'lote-1', 'lineas': [
+            self.movement('l1', self.coffee, 'OUT', '6'),
+            self.movement('l2', self.coffee, 'OUT', '6'),
+            self.movement('l3', self.coffee, 'IN', '4'),
+            self.movement('l4', self.coffee, 'OUT', '6'),
+        ]})
+        self.assertEqual([line['estado'] for line in response['lineas']],
+                         ['aplicada', 'error', 'aplicada', 'aplicada'])
+        self.assertEqual(self.stock(self.coffee), Decimal('2'))
+
+    def test_sale_at_another_price_is_rejected(self):
+        sync_batch({'lote': 'lote-1', 'lineas': [self.sale('l1', self.coffee, '1', '3.00')]})
+        response = sync_batch({'lote': 'lote-2', 'lineas': [
+            self.sale('l2', self.coffee, '1', '3.50'),  # Distinto del ítem ya registrado
+            self.sale('l3', self.milk, '1', '1.00'),
+            self.sale('l4', self.milk, '1', '1.20'),  # Distinto de la primera del lote
+            self.sale('l5', self.coffee, '2', '3.00'),
+        ]})
+        self.assertEqual([line['estado'] for line in response['lineas']], ['error', 'aplicada', 'error', 'aplicada'])
+        self.assertEqual(response['lineas'][0]['errores']['precio'][0]['code'], 'price_mismatch')
+        self.assertFalse(SyncLine.objects.filter(key__in=['l2', 'l4']).exists())
+        item = SaleItem.objects.get(product=self.coffee)
+        self.assertEqual((item.quantity_sold, item.price_at_sale, item.subtotal),
+                         (Decimal('3'), Decimal('3.00'), Decimal('9.00')))
+        self.assertEqual(self.stock(self.coffee), Decimal('7'))
+        self.assertEqual(self.stock(self.milk), Decimal('19'))
+
+
+class KeysetPaginationTests(InventoryTestData, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Varias filas con la misma fecha: el orden lo desempata el id.
+        start = timezone.now().replace(microsecond=0)
+        dates = [start, start, start - datetime.timedelta(hours=1), start - datetime.timedelta(hours=1),
+                 start - datetime.timedelta(hours=2), start - datetime.timedelta(hours=3), start]
+        StockMovement.objects.bulk_create([
+            StockMovement(product=cls.coffee, movement_type='IN', quantity=Decimal('1'), movement_date=date)
+            for date in dates
+        ])
+        cls.expected = list(StockMovement.objects.order_by('-movement_date', '-pk').values_list('pk', flat=True))
+
+    def page(self, **params):
+        view = KeysetPaginationMixin()
+        view.keyset_ordering = ('-movement_date', '-pk')
+        view.request = RequestFactory().get('/', params)
+        _, page, rows, _ = view.paginate_queryset(StockMovement.objects.all(), 3)
+        return page, [row.pk for row in rows]
+
+    def test_forward_and_backward_cover_every_row_once(self):
+        pages, page = [], None
+        while page is None or page.has_next():
+            page, pks = self.page(**({'after': page.next_cursor} if page else {}))
+            pages.append(pks)
+        self.assertEqual([pk for pks in pages for pk in pks], self.expected)
+        self.assertEqual([len(pks) for pks in pages], [3, 3, 1])
+        self.assertFalse(page.has_next())
+
+        backward = [pages[-1]]
+        while page.has_previous():
+            page, pks = self.page(before=page.previous_cursor)
+            backward.insert(0, pks)
+        self.assertEqual(backward, pages)
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursor_is_404(self):
+        with self.assertRaises(Http404):
+            self.page(after='no-es-un-cursor')
+
+
+class DashboardMetricsTests(InventoryTestData, TestCase):
+
+    def test_counts_low_stock_and_only_active_alerts(self):
+        sugar = Product.objects.create(name='Azúcar', unit_of_measurement='kg', current_stock=Decimal('1'),
+                                       minimum_stock_level=Decimal('2'))
+        StockAlert.objects.get_or_create(product=sugar, resolved=False,
+                                         defaults={'current_stock_at_alert': sugar.current_stock})
+        StockAlert.objects.bulk_create([
+            StockAlert(product=self.coffee, current_stock_at_alert=Decimal('2'), resolved=True) for _ in range(3)
+        ])
+        with self.assertNumQueries(5):
+            metrics = compute_dashboard_metrics()
+        self.assertEqual(metrics['total_products'], 3)
+        self.assertEqual(metrics['products_low_stock_count'], 1)
+        self.assertEqual(metrics['active_stock_alerts_count'], 1)
+
+
+class CatalogImportTests(InventoryTestData, TestCase):
+
+    def test_import_reconciles_alerts_of_imported_products_only(self):
+        # Sin alerta por haberse escrito sin pasar por Product.save(): la importación no la toca.
+        Product.objects.bulk_create([Product(name='Canela', unit_of_measurement='g', current_stock=Decimal('0'),
+                                             minimum_stock_level=Decimal('10'))])
+        data = ("nombre,unidad,stock,stock_minimo,precio\n"
+                "Café,kg,1,3,1.00\n"
+                "Azúcar,kg,50,5,0.80\n").encode()
+        result = import_catalog('products', io.BytesIO(data), 'productos.csv')
+        self.assertEqual((result.created, result.updated, result.errors), (1, 1, []))
+        self.assertEqual(result.alerts_created, 1)
+        self.assertTrue(StockAlert.objects.filter(product=self.coffee, resolved=False).exists())
+        self.assertFalse(StockAlert.objects.filter(product__name='Canela').exists())
+
+
+class AuthenticationBackendTests(InventoryTestData, TestCase):
+
+    def test_sessions_from_model_backend_move_to_role_backend(self):
+        self.client.logout()
+        self.client.force_login(self.owner, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('inventory:product_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.session['_auth_user_backend'], 'inventory.backends.RoleModelBackend')
+        # El rol llega con el usuario: acceder a él no consulta la base de datos.
+        with self.assertNumQueries(0):
+            self.assertEqual(response.wsgi_request.user.role.name, 'OWNER')
+
+    def test_login_uses_role_backend(self):
+        self.client.logout()
+        self.assertTrue(self.client.login(username='propietario', password='x'))
+        response = self.client.get(reverse('inventory:product_list'))
+        self.assertEqual(response.wsgi_request.session['_auth_user_backend'], 'inventory.backends.RoleModelBackend')
+
+
+class SalesRollupReadTests(InventoryTestData, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.session = DailySalesSession.objects.create(
+            registered_by_user=self.owner, sale_date=timezone.localdate() - datetime.timedelta(days=1))
+        SaleItem(sale_session=self.session, product=self.coffee, quantity_sold=Decimal('2'),
+                 price_at_sale=Decimal('3')).save()
+
+    def test_report_reads_the_rollup_without_refreshing_it(self):
+        response = self.client.get(reverse('inventory:sales_report'))
+        self.assertEqual(response.context['pending']['sessions'], 1)
+        self.assertEqual(response.context['products'], [])
+        self.assertContains(response, 'aún no están en el informe')
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.rollup_stale)
+
+        refresh_daily_product_sales()
+        response = self.client.get(reverse('inventory:sales_report'))
+        self.assertEqual(response.context['pending']['sessions'], 0)
+        self.assertEqual([row['product__name'] for row in response.context['products']], ['Café'])
+        self.assertNotContains(response, 'aún no están en el informe')
+
+    def test_consumption_stats_do_not_refresh_the_rollup(self):
+        response = self.client.get(reverse('inventory:purchase_suggestions'))
+        self.assertEqual(response.context['pending']['sessions'], 1)
+        self.assertFalse(DailyProductSales.objects.exists())
+
+
+class QueryPlanTests(TestCase):
+
+    def test_main_views_use_indexes(self):
+        owner, _ = generate_dataset(products=300, movements_per_product=5, sessions=30, items_per_session=10)
+        refresh_daily_product_sales()
+        cache.clear()  # Sin páginas en caché: se ejecutan (y revisan) todas las consultas.
+        self.client.force_login(owner)
+        problems, checked = check_query_plans(self.client)
+        self.assertEqual(problems, [])
+        self.assertGreater(checked, 0)
+
+
+@skipUnless(connection.vendor == 'sqlite', "La réplica se simula con una copia de la base de datos SQLite.")
+@override_settings(DATABASE_ROUTERS=['inventory.replicas.ReplicaRouter'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Dos SQLite: la réplica es un fichero aparte que solo se pone al día al
+    llamar a replicate(), así que va por detrás del primario como una réplica real.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # El alias se registra aquí (el ejecutor de pruebas no crea su base de
+        # datos) y antes de que TransactionTestCase valide `databases`.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        cls.replica_path = Path(cls.replica_dir.name) / 'replica.sqlite3'
+        settings.DATABASES[REPLICA_DB_ALIAS] = connections.settings[REPLICA_DB_ALIAS] = {
+            **connection.settings_dict, 'NAME': str(cls.replica_path),
+        }
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        settings.DATABASES.pop(REPLICA_DB_ALIAS, None)
+        connections.settings.pop(REPLICA_DB_ALIAS, None)
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        super().setUp()
+        create_inventory(self)
+        self.replicate()
+        self.client.force_login(self.owner)
+
+    def replicate(self):
+        """Copia el primario en la réplica."""
+        connections[REPLICA_DB_ALIAS].close()
+        connection.ensure_connection()
+        target = sqlite3.connect(self.replica_path)
+        try:
+            connection.connection.backup(target)
+        finally:
+            target.close()
+
+    def listed_movements(self):
+        return len(self.client.get(reverse('inventory:stockmovement_list')).context['movements'])
+
+    def test_lists_read_the_replica_until_the_client_writes(self):
+        StockMovement(product=self.coffee, movement_type='IN', quantity=Decimal('1')).save()
+        self.assertEqual(self.listed_movements(), 0)
+
+        response = self.client.post(reverse('inventory:stockmovement_create'),
+                                    {'product': self.coffee.pk, 'movement_type': 'IN', 'quantity': '2'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # Fijado al primario: ve su movimiento (y el anterior) aunque la réplica no los tenga.
+        self.assertEqual(self.listed_movements(), 2)
+
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.listed_movements(), 0)
+        self.replicate()
+        self.assertEqual(self.listed_movements(), 2)
+
+    def test_writes_and_transactions_use_the_primary(self):
+        with replica_reads():
+            self.assertEqual(read_alias(), REPLICA_DB_ALIAS)
+            Product.objects.create(name='Azúcar', unit_of_measurement='kg', current_stock=Decimal('5'),
+                                   minimum_stock_level=Decimal('1'))
+            self.assertFalse(Product.objects.filter(name='Azúcar').exists())
+            with transaction.atomic():
+                self.assertEqual(read_alias(), DEFAULT_DB_ALIAS)
+                self.assertTrue(Product.objects.filter(name='Azúcar').exists())
+        self.assertEqual(read_alias(), DEFAULT_DB_ALIAS)
+        self.assertTrue(Product.objects.filter(name='Azúcar').exists())
+
+
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+
+        def probe(fail=False):
+            self.calls.append(fail)
+            if fail:
+                raise RuntimeError("fallo de prueba")
+
+        task(name='probe', max_attempts=2)(probe)
+        self.addCleanup(TASKS.pop, 'probe')
+
+    def test_claim_and_run(self):
+        enqueue('probe')
+        claimed = claim_task()
+        self.assertEqual((claimed.status, claimed.attempts), ('RUNNING', 1))
+        self.assertIsNone(claim_task())
+        self.assertTrue(run_task(claimed))
+        self.assertEqual(Task.objects.get(pk=claimed.pk).status, 'DONE')
+        self.assertEqual(self.calls, [False])
+
+    @override_settings(TASK_RETRY_BASE_SECONDS=10, TASK_RETRY_MAX_SECONDS=60)
+    def test_retry_with_backoff_then_fail(self):
+        self.assertTrue(9 <= retry_delay(1) <= 11)
+        self.assertTrue(36 <= retry_delay(3) <= 44)
+        self.assertTrue(54 <= retry_delay(10) <= 66)
+
+        enqueue('probe', fail=True)
+        self.assertFalse(run_task(claim_task()))
+        retried = Task.objects.get()
+        self.assertEqual((retried.status, retried.attempts), ('PENDING', 1))
+        self.assertGreater(retried.run_at, timezone.now() + datetime.timedelta(seconds=8))
+        self.assertIn('fallo de prueba', retried.last_error)
+        self.assertIsNone(claim_task())  # Aún no toca
+
+        Task.objects.update(run_at=timezone.now())
+        self.assertFalse(run_task(claim_task()))
+        failed = Task.objects.get()
+        self.assertEqual((failed.status, failed.attempts), ('FAILED', 2))
+        self.assertIsNone(claim_task())
+
+    @override_settings(TASK_TIMEOUT=60)
+    def test_timed_out_task_is_reclaimed_until_attempts_run_out(self):
+        enqueue('probe')
+        first = claim_task()
+        Task.objects.update(started_at=timezone.now() - datetime.timedelta(seconds=61))
+        second = claim_task()  # El worker murió: se vuelve a reclamar.
+        self.assertEqual((second.pk, second.attempts), (first.pk, 2))
+
+        # Vuelve a morir con los intentos agotados: FAILED, no otra vuelta.
+        Task.objects.update(started_at=timezone.now() - datetime.timedelta(seconds=61))
+        self.assertIsNone(claim_task())
+        failed = Task.objects.get()
+        self.assertEqual((failed.status, failed.attempts), ('FAILED', 2))
+        self.assertEqual(self.calls, [])
+
+
+class AlertDigestTests(InventoryTestData, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        CustomUser.objects.filter(pk=self.owner.pk).update(email='propietario@example.com')
+        StockAlert.objects.create(product=self.coffee, current_stock_at_alert=Decimal('2'))
+        StockAlert.objects.create(product=self.milk, current_stock_at_alert=Decimal('4'))
+
+    def test_digest_claims_alerts_and_sends_one_message(self):
+        self.assertEqual(send_alert_digests(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['propietario@example.com'])
+        self.assertIn('Café', mail.outbox[0].body)
+        self.assertFalse(pending_alerts().exists())
+        # Nada pendiente: ni otro correo ni otra marca.
+        self.assertEqual(send_alert_digests(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_send_leaves_alerts_pending(self):
+        with mock.patch('inventory.notifications.get_connection') as get_connection:
+            get_connection.return_value.send_messages.side_effect = SMTPException("sin servidor")
+            with self.assertRaises(SMTPException):
+                send_alert_digests()
+        self.assertEqual(pending_alerts().count(), 2)
+        self.assertEqual(send_alert_digests(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class StockAlertStreamTests(InventoryTestData, TestCase):
+
+    async def read_events(self, response, count):
+        """Los primeros `count` mensajes SSE (sin el `retry:` inicial) como (id, tipo, datos)."""
+        messages, content = [], response.streaming_content
+        try:
+            async for chunk in content:
+                chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+                if chunk.startswith('id:'):
+                    id, type, data = (line.split(': ', 1)[1] for line in chunk.strip().split('\n'))
+                    messages.append((id, type, json.loads(data)))
+                if len(messages) == count:
+                    return messages
+        finally:
+            await content.aclose()
+
+    def test_publish_waits_for_commit(self):
+        start = events.broker.last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            events.publish('prueba', {'n': 1})
+            self.assertEqual(events.broker.last_id, start)
+        self.assertEqual([(e.type, e.data) for e in events.broker.since(start)], [('prueba', {'n': 1})])
+
+    def test_wsgi_has_no_stream(self):
+        self.assertEqual(self.client.get(reverse('inventory:stockalert_stream')).status_code, 204)
+        self.assertNotContains(self.client.get(reverse('inventory:stockalert_list')), 'id="alerts-live"')
+
+    async def test_stream_resumes_from_last_event_id(self):
+        await self.async_client.aforce_login(self.owner)
+        self.assertContains(await self.async_client.get(reverse('inventory:stockalert_list')), 'id="alerts-live"')
+
+        start = events.broker.last_id
+        events.broker.publish('prueba', {'n': 1})
+        second = events.broker.publish('prueba', {'n': 2})
+        response = await self.async_client.get(reverse('inventory:stockalert_stream'),
+                                               headers={'Last-Event-ID': events.event_id_at(start + 1)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # Solo lo posterior al último id recibido.
+        self.assertEqual(await self.read_events(response, 1),
+                         [(events.event_id_at(second.id), 'prueba', {'n': 2})])
+
+    async def test_stream_from_another_epoch_resets(self):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(reverse('inventory:stockalert_stream'),
+                                               headers={'Last-Event-ID': 'otro-1'})
+        self.assertEqual(await self.read_events(response, 1),
+                         [(events.event_id_at(events.broker.last_id), 'reset', {})])
+
+
+class RequestTimingTests(InventoryTestData, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        request_log.clear()
+        self.addCleanup(request_log.clear)
+
+    def login_employee(self):
+        role, _ = Role.objects.get_or_create(name='EMPLOYEE')
+        self.client.force_login(CustomUser.objects.create_user('empleado', password='x', role=role))
+
+    def assertLogged(self, endpoint):
+        entry = request_log.entries()[-1]
+        self.assertEqual((entry['endpoint'], entry['status']), (endpoint, 200))
+        self.assertGreater(entry['queries'], 0)
+
+    def test_owner_gets_server_timing(self):
+        response = self.client.get(reverse('inventory:product_list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ consultas", view;dur=')
+        self.assertLogged('inventory:product_list')
+
+    def test_other_roles_are_only_logged(self):
+        self.login_employee()
+        response = self.client.get(reverse('inventory:product_list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertLogged('inventory:product_list')
+
+    @override_settings(DEBUG=True)
+    def test_debug_shows_timing_to_everyone(self):
+        self.login_employee()
+        self.assertIn('Server-Timing', self.client.get(reverse('inventory:product_list')))
+
+    async def test_async_request_is_measured(self):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(reverse('inventory:product_list'))
+        self.assertIn('Server-Timing', response)
+        self.assertLogged('inventory:product_list')
+
+
+class ApiConditionalGetTests(InventoryTestData, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse('inventory:api_products')
+        self.first = self.client.get(self.url)
+
+    def test_current_etag_is_not_modified(self):
+        self.assertEqual(self.first.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], self.first['ETag'])
+
+    def test_last_modified_is_not_modified(self):
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=self.first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_the_etag(self):
+        self.coffee.current_stock = Decimal('7')
+        self.coffee.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], self.first['ETag'])
+        stocks = {p['nombre']: p['stock'] for p in response.json()['productos']}
+        self.assertEqual(Decimal(stocks['Café']), Decimal('7'))
+
+    def test_sync_endpoint_only_accepts_post(self):
+        self.assertEqual(self.client.get(reverse('inventory:api_sync')).status_code, 405)
+
+
+class InventorySnapshotTests(InventoryTestData, TestCase):
+    """Historial del café: 10, +6 (hace 20 días), venta de 4 (hace 12), -2 (hace 8): hoy 10."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        StockMovement.objects.create(product=cls.coffee, movement_type='IN', quantity=Decimal('6'),
+                                     movement_date=cls.noon(20))
+        session = DailySalesSession.objects.create(registered_by_user=cls.owner, sale_date=cls.day(12))
+        SaleItem.objects.create(sale_session=session, product=cls.coffee, quantity_sold=Decimal('4'),
+                                price_at_sale=Decimal('3'))
+        StockMovement.objects.create(product=cls.coffee, movement_type='OUT', quantity=Decimal('2'),
+                                     movement_date=cls.noon(8))
+
+    @classmethod
+    def day(cls, days_ago):
+        return timezone.localdate() - datetime.timedelta(days=days_ago)
+
+    @classmethod
+    def noon(cls, days_ago):
+        return day_start(cls.day(days_ago)) + datetime.timedelta(hours=12)
+
+    def coffee_at(self, days_ago):
+        stocks, base_date = stock_at(self.day(days_ago), product_ids=[self.coffee.pk])
+        return stocks[self.coffee.pk], base_date
+
+    def test_without_snapshots_replays_from_current_stock(self):
+        self.assertEqual(self.coffee_at(15), (Decimal('16'), None))
+        self.assertEqual(self.coffee_at(25), (Decimal('10'), None))
+        stocks, _ = stock_at(self.day(15))
+        self.assertEqual(stocks[self.milk.pk], Decimal('20'))
+
+    def test_take_snapshot_walks_back_day_by_day(self):
+        self.assertEqual(take_snapshot(self.day(10), days=10), 20)
+        closing = dict(InventorySnapshot.objects.filter(product=self.coffee)
+                       .values_list('snapshot_date', 'closing_stock'))
+        self.assertEqual(sorted(closing), [self.day(n) for n in range(19, 9, -1)])
+        self.assertEqual((closing[self.day(19)], closing[self.day(13)], closing[self.day(12)], closing[self.day(10)]),
+                         (Decimal('16'), Decimal('16'), Decimal('12'), Decimal('12')))
+        self.assertEqual(InventorySnapshot.objects.get(product=self.coffee, snapshot_date=self.day(10)).stock_value,
+                         Decimal('12.00'))
+
+    def test_nearest_snapshot_and_replay(self):
+        take_snapshot(self.day(10), days=10)
+        # Un cambio sin movimiento (edición manual) solo se refleja desde el stock actual.
+        Product.objects.filter(pk=self.coffee.pk).update(current_stock=Decimal('100'))
+        # Más cerca de la instantánea del día -10: se aplica la salida posterior.
+        self.assertEqual(self.coffee_at(7), (Decimal('10'), self.day(10)))
+        # Antes de la primera instantánea: se deshace la entrada de hace 20 días.
+        self.assertEqual(self.coffee_at(22), (Decimal('10'), self.day(19)))
+        # Instantánea ese mismo día: su cierre, sin cambios que aplicar.
+        self.assertEqual(self.coffee_at(12), (Decimal('12'), self.day(12)))
+        # Más cerca de hoy que de cualquier instantánea: parte del stock actual.
+        self.assertEqual(self.coffee_at(2), (Decimal('100'), None))
+
+
+class PurchasingTests(InventoryTestData, TestCase):
+    MONDAY = datetime.date(2026, 10, 19)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Supplier.objects.filter(pk=cls.supplier.pk).update(delivery_days='Lunes y jueves')
+        cls.other = Supplier.objects.create(name='Otro proveedor')
+        cls.sugar = Product.objects.create(
+            name='Azúcar', unit_of_measurement='kg', current_stock=Decimal('0'),
+            minimum_stock_level=Decimal('1'), supplier=cls.other,
+            price_per_unit_from_supplier=Decimal('2.00'))
+
+    def suggest(self, coffee='2', milk='3'):
+        stats = {self.coffee.pk: ConsumptionStats(0, 0, float(coffee), 0),
+                 self.milk.pk: ConsumptionStats(0, 0, float(milk), 0)}
+        return {suggestion.supplier.pk: suggestion for suggestion in suggest_purchase_orders(self.MONDAY, stats)}
+
+    def test_parse_delivery_days(self):
+        cases = {
+            'Lunes, Miércoles': {0, 2},
+            'martes y jueves': {1, 3},
+            'de lunes a viernes': {0, 1, 2, 3, 4},
+            'viernes a lunes': {4, 5, 6, 0},
+            'Sáb.': {5},
+            'diario': set(range(7)),
+            'cuando puede': set(),
+            '': set(),
+        }
+        for text, days in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_delivery_days(text), days)
+
+    def test_next_delivery_dates(self):
+        thursday, next_monday = self.MONDAY + datetime.timedelta(days=3), self.MONDAY + datetime.timedelta(days=7)
+        self.assertEqual(next_delivery_dates(frozenset({0, 3}), self.MONDAY), (thursday, next_monday))
+        # Sin días reconocibles: mañana y revisión semanal.
+        tomorrow = self.MONDAY + datetime.timedelta(days=1)
+        self.assertEqual(next_delivery_dates(frozenset(), self.MONDAY),
+                         (tomorrow, tomorrow + datetime.timedelta(days=DEFAULT_REVIEW_DAYS)))
+
+    def test_suggested_quantities(self):
+        pending = PurchaseOrder.objects.create(supplier=self.supplier, status='CONFIRMED')
+        PurchaseOrderLine.objects.create(order=pending, product=self.milk, quantity=Decimal('4'),
+                                         unit_price=Decimal('0.50'))
+        suggestion = self.suggest()[self.supplier.pk]
+        self.assertEqual(suggestion.delivery_date, self.MONDAY + datetime.timedelta(days=3))
+        lines = {line.product_name: line for line in suggestion.lines}
+        # Café: objetivo 3 + 2 × 7 días = 17, disponible 10 -> 8.
+        self.assertEqual(lines['Café'].quantity, Decimal('8'))
+        self.assertEqual(lines['Café'].subtotal, Decimal('8.00'))
+        # Leche: objetivo 5 + 3 × 7 = 26, disponible 20 + 4 pendientes -> 3.
+        self.assertEqual((lines['Leche'].quantity, lines['Leche'].on_order), (Decimal('3'), Decimal('4')))
+        self.assertEqual(suggestion.total, Decimal('9.50'))
+        # Por encima del objetivo no se pide.
+        self.assertNotIn('Leche', {line.product_name for line in self.suggest(milk='1')[self.supplier.pk].lines})
+
+    def test_drafts_of_other_suppliers_are_kept(self):
+        other_draft = PurchaseOrder.objects.create(supplier=self.other)
+        old_draft = PurchaseOrder.objects.create(supplier=self.supplier)
+        [order] = create_draft_orders([self.suggest()[self.supplier.pk]], user=self.owner)
+        self.assertFalse(PurchaseOrder.objects.filter(pk=old_draft.pk).exists())
+        self.assertEqual(set(PurchaseOrder.objects.filter(status='DRAFT').values_list('pk', flat=True)),
+                         {other_draft.pk, order.pk})
+        self.assertEqual(order.lines.count(), 2)
+
+    def test_receiving_adds_stock(self):
+        [order] = create_draft_orders([self.suggest()[self.supplier.pk]], user=self.owner)
+        confirm_purchase_order(order)
+        movements = receive_purchase_order(order, user=self.owner)
+        self.assertEqual(sorted((m.product_id, m.movement_type, m.quantity) for m in movements),
+                         sorted([(self.coffee.pk, 'IN', Decimal('8')), (self.milk.pk, 'IN', Decimal('7'))]))
+        self.assertEqual(StockMovement.objects.filter(description__contains=f'#{order.pk}').count(), 2)
+        self.coffee.refresh_from_db()
+        self.milk.refresh_from_db()
+        self.assertEqual((self.coffee.current_stock, self.milk.current_stock), (Decimal('18'), Decimal('27')))
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.received_by), ('RECEIVED', self.owner))
+        # Una segunda recepción no vuelve a sumar el stock.
+        with self.assertRaises(ValidationError):
+            receive_purchase_order(order)
+        self.coffee.refresh_from_db()
+        self.assertEqual(self.coffee.current_stock, Decimal('18'))
+
+
+class CachedContentTests(InventoryTestData, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse('inventory:product_list')
+
+    def test_write_changes_cached_page(self):
+        self.assertContains(self.client.get(self.url), 'Café')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coffee.name = 'Café molido'
+            self.coffee.save()
+        self.assertContains(self.client.get(self.url), 'Café molido')
+
+    def test_refreshed_consumption_changes_cached_page(self):
+        first = self.client.get(self.url)
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        # La tarea de resumen incorpora las ventas de ayer y el consumo en caché caduca.
+        session = DailySalesSession.objects.create(registered_by_user=self.owner, sale_date=yesterday)
+        DailyProductSales.objects.create(sale_session=session, sale_date=yesterday, product=self.coffee,
+                                         quantity_sold=Decimal('13.37'), revenue=Decimal('40'), cost=Decimal('13'))
+        cache.delete(ANALYTICS_CACHE_KEY.format(date=timezone.localdate().isoformat()))
+        ewma = floatformat(get_consumption_stats()[self.coffee.pk].ewma, 2)
+        self.assertNotContains(first, ewma)
+        self.assertContains(self.client.get(self.url), ewma)
+
+
+class AlertReconcileTests(InventoryTestData, TestCase):
+
+    def active_alerts(self):
+        return list(StockAlert.objects.filter(resolved=False).values_list('product_id', flat=True))
+
+    def test_save_creates_and_resolves_one_alert(self):
+        for stock in ('2', '1'):
+            self.coffee.current_stock = Decimal(stock)
+            self.coffee.save()
+        self.assertEqual(self.active_alerts(), [self.coffee.pk])
+        self.coffee.current_stock = Decimal('9')
+        self.coffee.save()
+        self.assertEqual(self.active_alerts(), [])
+        self.assertEqual(StockAlert.objects.get(product=self.coffee).resolved_by_user, None)
+
+    def test_update_and_bulk_update_sync_alerts(self):
+        Product.objects.update(current_stock=Decimal('1'))
+        self.assertEqual(sorted(self.active_alerts()), sorted([self.coffee.pk, self.milk.pk]))
+        self.coffee.current_stock = Decimal('10')
+        Product.objects.bulk_update([self.coffee], ['current_stock'])
+        self.assertEqual(self.active_alerts(), [self.milk.pk])
+
+    def test_reconcile_fixes_writes_outside_the_orm(self):
+        # Escritura que no pasa por ProductQuerySet (como un UPDATE en SQL).
+        QuerySet.update(Product.objects.all(), current_stock=Decimal('1'))
+        self.assertEqual(self.active_alerts(), [])
+        self.assertEqual(reconcile_alerts(), (2, 0))
+        self.assertEqual(reconcile_alerts(), (0, 0))
+
+        QuerySet.update(Product.objects.filter(pk=self.coffee.pk), current_stock=Decimal('10'))
+        out = io.StringIO()
+        call_command('reconcile_alerts', '--check', stdout=out)
+        self.assertIn('1 alertas activas de productos que ya superan el mínimo.', out.getvalue())
+        call_command('reconcile_alerts', product=[self.coffee.pk], stdout=io.StringIO())
+        self.assertEqual(self.active_alerts(), [self.milk.pk])
+
+
+class SessionTotalsTests(InventoryTestData, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.session = DailySalesSession.objects.create(registered_by_user=cls.owner)
+        for product, qty, price in ((cls.coffee, '2', '3.00'), (cls.milk, '1.5', '1.00')):
+            SaleItem(sale_session=cls.session, product=product, quantity_sold=Decimal(qty),
+                     price_at_sale=Decimal(price)).save()
+        cls.empty = DailySalesSession.objects.create(
+            registered_by_user=cls.owner, sale_date=timezone.localdate() - datetime.timedelta(days=1))
+
+    def totals(self, session):
+        session.refresh_from_db()
+        return session.total_revenue, session.total_quantity, session.item_count
+
+    def test_saves_keep_totals_current(self):
+        self.assertEqual(self.totals(self.session), (Decimal('7.50'), Decimal('3.50'), 2))
+        self.assertFalse(stale_session_totals().exists())
+
+    def test_stale_sessions_are_recalculated(self):
+        DailySalesSession.objects.filter(pk=self.session.pk).update(total_revenue=Decimal('1'))
+        DailySalesSession.objects.filter(pk=self.empty.pk).update(total_quantity=Decimal('4'), item_count=3)
+        self.assertEqual(sorted(stale_session_totals().values_list('pk', flat=True)),
+                         sorted([self.session.pk, self.empty.pk]))
+
+        self.assertEqual(recalculate_session_totals(stale_session_totals()), 2)
+        self.assertEqual(self.totals(self.session), (Decimal('7.50'), Decimal('3.50'), 2))
+        # Sin ítems: ceros, no NULL.
+        self.assertEqual(self.totals(self.empty), (Decimal('0'), Decimal('0'), 0))
+        self.assertFalse(stale_session_totals().exists())
+        # El resumen de ventas se refrescará con los totales corregidos.
+        self.assertTrue(DailySalesSession.objects.get(pk=self.empty.pk).rollup_stale)
+
+
+class ExportTests(InventoryTestData, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = timezone.localdate()
+        StockMovement.objects.create(product=cls.coffee, movement_type='IN', quantity=Decimal('5'),
+                                     movement_date=timezone.now() - datetime.timedelta(days=3),
+                                     description='Compra, lote "A"', registered_by=cls.owner)
+        StockMovement.objects.create(product=cls.milk, movement_type='OUT', quantity=Decimal('2'))
+        session = DailySalesSession.objects.create(registered_by_user=cls.owner)
+        SaleItem(sale_session=session, product=cls.coffee, quantity_sold=Decimal('2'),
+                 price_at_sale=Decimal('3.00')).save()
+
+    def export(self, kind, fmt, **params):
+        response = self.client.get(reverse('inventory:export', args=[kind, fmt]), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_rows_and_columns(self):
+        # Trozos de una fila: el iterador recorre varias lecturas del cursor.
+        with mock.patch('inventory.exports.CHUNK_SIZE', 1):
+            response, content = self.export('movements', 'csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="movimientos.csv"')
+        header, *rows = csv.reader(io.StringIO(content))
+        self.assertEqual(header, ['id', 'fecha', 'producto', 'proveedor', 'tipo', 'cantidad', 'unidad',
+                                  'descripcion', 'registrado_por'])
+        self.assertEqual([row[2:] for row in rows], [
+            ['Café', 'Proveedor', 'IN', '5.00', 'kg', 'Compra, lote "A"', 'propietario'],
+            ['Leche', 'Proveedor', 'OUT', '2.00', 'l', '', ''],
+        ])
+
+    def test_date_range(self):
+        response, content = self.export('movements', 'csv', start_date=self.today.isoformat())
+        self.assertEqual(len(content.splitlines()), 2)
+        self.assertIn(f'desde_{self.today.isoformat()}', response['Content-Disposition'])
+        response = self.client.get(reverse('inventory:export', args=['movements', 'csv']),
+                                   {'start_date': self.today.isoformat(), 'end_date': '2000-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_ndjson_rows(self):
+        _, content = self.export('sales', 'ndjson')
+        [row] = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual({key: row[key] for key in ('fecha', 'producto', 'cantidad', 'precio_unitario', 'subtotal')},
+                         {'fecha': self.today.isoformat(), 'producto': 'Café', 'cantidad': '2.00',
+                          'precio_unitario': '3.00', 'subtotal': '6.00'})
+
+    def test_unknown_export(self):
+        self.assertEqual(self.client.get(reverse('inventory:export', args=['products', 'csv'])).status_code, 404)
+
+
+class GatherQueriesTests(TransactionTestCase):
+
+    def setUp(self):
+        create_inventory(self)
+
+    def test_queries_run_in_parallel_outside_transactions(self):
+        # Las dos funciones solo pasan la barrera si se ejecutan a la vez.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def query():
+            barrier.wait()
+            return threading.current_thread().name, Product.objects.count()
+
+        results = async_to_sync(gather_queries)(query, query)
+        self.assertEqual([count for _, count in results], [2, 2])
+        self.assertTrue(all(name.startswith('cafecentral-db') for name, _ in results))
+        self.assertNotEqual(results[0][0], results[1][0])
+
+    def test_transaction_runs_queries_in_order_on_its_connection(self):
+        calls = []
+
+        def query(name):
+            calls.append(name)
+            return threading.get_ident(), Product.objects.filter(name=name).count()
+
+        with transaction.atomic():
+            Product.objects.create(name='Azúcar', unit_of_measurement='kg', current_stock=Decimal('1'),
+                                   minimum_stock_level=Decimal('0'), price_per_unit_from_supplier=Decimal('1'))
+            results = async_to_sync(gather_queries)(partial(query, 'Azúcar'), partial(query, 'Café'))
+        # En el hilo de la petición: ven la fila aún sin confirmar.
+        self.assertEqual(results, [(threading.get_ident(), 1), (threading.get_ident(), 1)])
+        self.assertEqual(calls, ['Azúcar', 'Café'])
+
+
+class PoolStatsTests(InventoryTestData, TestCase):
+
+    def test_without_pool(self):
+        self.assertIsNone(pool_stats())
+        response = self.client.get(reverse('inventory:performance'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['pool'])
+
+    def test_pool_counters(self):
+        conn = connections[DEFAULT_DB_ALIAS]
+        counters = {'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1,
+                    'requests_num': 50, 'requests_queued': 4, 'requests_wait_ms': 30, 'requests_errors': 1}
+        pool = mock.Mock(closed=False, **{'get_stats.return_value': counters, 'pop_stats.return_value': counters})
+        with mock.patch.dict(conn.settings_dict, {'OPTIONS': {'pool': True}}), \
+                mock.patch.object(conn, 'pool', pool, create=True):
+            stats = pool_stats()
+            pool_stats(reset=True)
+        self.assertEqual({key: stats[key] for key in ('abiertas', 'en_uso', 'saturacion', 'espera_media_ms', 'timeouts')},
+                         {'abiertas': 4, 'en_uso': 3, 'saturacion': 0.3, 'espera_media_ms': 7.5, 'timeouts': 1})
+        pool.pop_stats.assert_called_once_with()
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_every_measured_view_responds(self):
+        out = io.StringIO()
+        call_command('benchmark', products=12, movements_per_product=2, sessions=4, items_per_session=2,
+                     iterations=1, warmup=0, stdout=out, stderr=io.StringIO())
+        report = json.loads(out.getvalue())
+        statuses = {label: result['cold']['status'] for label, result in report['results'].items()
+                    if label.startswith('GET ')}
+        self.assertIn('GET inventory:export (movements.csv)', statuses)
+        self.assertIn('GET inventory:purchaseorder_detail', statuses)
+        self.assertEqual({label: status for label, status in statuses.items() if status != 200}, {})
+        self.assertIn('inventory:stockalert_stream (stream de eventos solo con ASGI; con WSGI responde 204)',
+                      report['meta']['skipped'])
@@ -11,6 +11,7 @@ urlpatterns = [
     # RUTAS para el CRUD de Productos con CBV
     path('products/', views.ProductListView.as_view(), name='product_list'),
     path('products/add/', views.ProductCreateView.as_view(), name='product_create'),
+    path('products/import/', views.CatalogImportView.as_view(), name='catalog_import'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('products/<int:pk>/edit/', views.ProductUpdateView.as_view(), name='product_update'),
     path('products/<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
@@ -28,13 +29,16 @@ urlpatterns = [
     path('sales/sessions/<int:pk>/', views.DailySalesSessionDetailView.as_view(), name='dailysalessession_detail'),
     path('sales/sessions/<int:pk>/edit/', views.DailySalesSessionUpdateView.as_view(), name='dailysalessession_update'),
     path('sales/sessions/<int:pk>/delete/', views.DailySalesSessionDeleteView.as_view(), name='dailysalessession_delete'),
+    path('sales/report/', views.SalesReportView.as_view(), name='sales_report'),
 
     # --- RUTA para añadir SaleItem a una Sesión específica ---
     path('sales/sessions/<int:pk>/add_item/', views.SaleItemCreateView.as_view(), name='saleitem_create'),
+    path('sales/sessions/<int:pk>/add_items/', views.SaleItemBatchCreateView.as_view(), name='saleitem_batch_create'),
     
     # --- RUTAS para la gestión de StockAlerts ---
     path('alerts/', views.StockAlertListView.as_view(), name='stockalert_list'),
     path('alerts/<int:pk>/resolve/', views.StockAlertUpdateView.as_view(), name='stockalert_resolve'),
+    path('alerts/stream/', views.StockAlertStreamView.as_view(), name='stockalert_stream'),
     
     # --- RUTAS para la gestión de Roles ---
     path('roles/', views.RoleListView.as_view(), name='role_list'),
@@ -53,6 +57,23 @@ urlpatterns = [
     # --- URLs para StockMovement ---
     path('stock-movements/', views.StockMovementListView.as_view(), name='stockmovement_list'),
     path('stock-movements/create/', views.StockMovementCreateView.as_view(), name='stockmovement_create'),
+    path('stock-at/', views.StockAtDateView.as_view(), name='stock_at_date'),
+
+    # --- RUTAS para los pedidos a proveedores ---
+    path('purchase-orders/', views.PurchaseOrderListView.as_view(), name='purchaseorder_list'),
+    path('purchase-orders/suggestions/', views.PurchaseSuggestionView.as_view(), name='purchase_suggestions'),
+    path('purchase-orders/<int:pk>/', views.PurchaseOrderDetailView.as_view(), name='purchaseorder_detail'),
+
+    path('performance/', views.PerformanceView.as_view(), name='performance'),
+    path('export/<str:kind>.<str:fmt>', views.ExportView.as_view(), name='export'),
+    path('export/<str:kind>.<str:fmt>/email/', views.ExportEmailView.as_view(), name='export_email'),
+
+    # --- API JSON de solo lectura (versionada) ---
+    path('api/v1/products/', views.ApiProductListView.as_view(), name='api_products'),
+    path('api/v1/alerts/', views.ApiStockAlertListView.as_view(), name='api_alerts'),
+    path('api/v1/sales/today/', views.ApiTodaySalesView.as_view(), name='api_sales_today'),
+    # Lotes de ventas y movimientos de los TPV (escritura, idempotente)
+    path('api/v1/sync/', views.ApiSyncView.as_view(), name='api_sync'),
     # Opcional:
     # path('stock-movements/<int:pk>/', views.StockMovementDetailView.as_view(), name='stockmovement_detail'),
     # path('stock-movements/<int:pk>/edit/', views.StockMovementUpdateView.as_view(), name='stockmovement_update'),
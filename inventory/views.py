@@ -1,21 +1,50 @@
 
+import json
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
 from pyexpat.errors import messages
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.urls import reverse_lazy 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin # Para CBV
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView # Importa las CBV
+from django.core.exceptions import ValidationError
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView # Importa las CBV
 from django.views import View # Importa la clase base View para vistas personalizadas
-from django.forms import inlineformset_factory # Para gestionar formularios relacionados
 from django.utils import timezone # Para asignar la hora de resolución
-from django.db import models # Para usar F() en consultas
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.db import connection, models, transaction # Para usar F() en consultas
 
-from .models import Product, StockMovement, Supplier, CustomUser, DailySalesSession, SaleItem, StockAlert, Role
+from .models import Product, StockMovement, Supplier, CustomUser, DailySalesSession, SaleItem, StockAlert, Role, PurchaseOrder
 from .decorators import role_required # Tu decorador personalizado
+from .pagination import KeysetPaginationMixin # Paginación por cursor para las listas
 # Importa los formularios de usuario adecuados
 from .forms import (
     ProductForm, StockMovementForm, SupplierForm, DailySalesSessionForm, SaleItemForm,
-    StockAlertForm, RoleForm, CustomUserCreationForm, CustomUserChangeForm
+    SaleItemFormSet, StockAlertForm, RoleForm, CustomUserCreationForm, CustomUserChangeForm,
+    ExportFilterForm, CatalogImportForm, StockAtDateForm, SalesReportForm, PurchaseOrderLineFormSet
+)
+from .sales import record_sale_items
+from .instrumentation import request_log
+from .exports import EXPORTS, FORMATS, export_filename, export_queryset, stream_export
+from .imports import import_catalog
+from .snapshots import stock_at
+from .rollups import pending_refresh, sales_by_period, sales_by_product
+from .analytics import ANALYSIS_DAYS, attach_consumption, consumption_stamp, pending_consumption
+from .asyncdb import gather_queries
+from .dbpool import pool_stats
+from .tasks import enqueue
+from .caching import CachedContentMixin
+from .replicas import ReplicaReadMixin, read_alias, replica_reads
+from .sync import claim_line, new_line_key, sync_batch
+from . import api, events
+from .purchasing import (
+    cancel_purchase_order, confirm_purchase_order, create_draft_orders, receive_purchase_order,
+    replaced_drafts, suggest_purchase_orders
 )
 
 # product_list_view (función) antes de Opción con CBV
@@ -50,18 +79,33 @@ class RoleRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
         # Redirige a la página de inicio o a una página de error de acceso denegado
         return redirect(reverse_lazy('home')) # O una URL de error más específica
 
+
+class AsyncRoleRequiredMixin(RoleRequiredMixin):
+    """
+    RoleRequiredMixin para vistas con manejadores async: el usuario se carga
+    con request.auser() (en una vista async no se puede consultar la base de
+    datos de forma síncrona) y queda en request.user para test_func y la plantilla.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not self.test_func():
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
+
 # --- VISTAS BASADAS EN CLASES (CBV) para la gestión de CustomUser ---
 
-class UserListView(RoleRequiredMixin, ListView):
+class UserListView(RoleRequiredMixin, KeysetPaginationMixin, ListView):
     model = CustomUser
     template_name = 'inventory/user_list.html'
     context_object_name = 'users'
     allowed_roles = ['OWNER']
+    keyset_ordering = ('username', 'pk')
     
     def get_queryset(self):
         # Excluir al propio usuario logueado de la lista si no quieres que se auto-elimine/edite su propio rol.
         # Esto puede ser gestionado también por lógica en la plantilla.
-        return CustomUser.objects.exclude(pk=self.request.user.pk).order_by('username')
+        return CustomUser.objects.exclude(pk=self.request.user.pk).select_related('role')
 
 
     def get_context_data(self, **kwargs):
@@ -133,28 +177,39 @@ class UserDeleteView(RoleRequiredMixin, DeleteView):
         return super().post(request, *args, **kwargs)
     
 
-class ProductListView(RoleRequiredMixin, ListView):
+class ProductListView(RoleRequiredMixin, CachedContentMixin, KeysetPaginationMixin, ListView):
     model = Product
     template_name = 'inventory/product_list.html' # Reutiliza la plantilla existente
     context_object_name = 'products'
     allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE']
+    keyset_ordering = ('name', 'pk')
+    cache_models = (Product, Supplier)
+
+    def get_content_cache_key(self):
+        # El consumo diario se recalcula durante el día si el resumen de ventas
+        # aún no estaba al día: la huella del resultado forma parte de la clave.
+        return f'{super().get_content_cache_key()}:{consumption_stamp()}'
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('supplier')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = 'Inventario de Productos'
         
-        # Calcular estadísticas de productos
-        products = self.get_queryset()
-        
-        # Contar productos con stock bajo
-        context['productos_stock_bajo'] = products.filter(
-            current_stock__lte=models.F('minimum_stock_level')
-        ).count()
-        
-        # Contar productos con proveedor asignado
-        context['productos_con_proveedor'] = products.filter(
-            supplier__isnull=False
-        ).count()
+        # Calcular estadísticas de productos (total, stock bajo y con proveedor) en una sola consulta
+        stats = Product.objects.aggregate(
+            total=models.Count('pk'),
+            stock_bajo=models.Count('pk', filter=models.Q(current_stock__lte=models.F('minimum_stock_level'))),
+            con_proveedor=models.Count('pk', filter=models.Q(supplier__isnull=False)),
+        )
+        context['total_productos'] = stats['total']
+        context['productos_stock_bajo'] = stats['stock_bajo']
+        context['productos_con_proveedor'] = stats['con_proveedor']
+
+        # Consumo diario y días de cobertura de los productos de la página (ver inventory.analytics)
+        context['products'] = attach_consumption(context['products'])
+        context['analysis_days'] = ANALYSIS_DAYS
         
         return context
 
@@ -165,6 +220,12 @@ class ProductDetailView(RoleRequiredMixin, DetailView):
     context_object_name = 'product'
     allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE']
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        attach_consumption([self.object])
+        context['analysis_days'] = ANALYSIS_DAYS
+        return context
+
 
 class ProductCreateView(RoleRequiredMixin, CreateView):
     model = Product
@@ -217,11 +278,12 @@ class SupplierListView(RoleRequiredMixin, ListView):
         return context
 
 
-class SupplierDetailView(RoleRequiredMixin, DetailView):
+class SupplierDetailView(RoleRequiredMixin, CachedContentMixin, DetailView):
     model = Supplier
     template_name = 'inventory/supplier_detail.html'
     context_object_name = 'supplier'
     allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE']
+    cache_models = (Supplier, Product) # Muestra los productos del proveedor
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -267,32 +329,32 @@ class SupplierDeleteView(RoleRequiredMixin, DeleteView):
         return context
     
 # --- VISTAS BASADAS EN CLASES (CBV) para CRUD de Sesiones de Venta ---
-class DailySalesSessionListView(RoleRequiredMixin, ListView):
+class DailySalesSessionListView(RoleRequiredMixin, ReplicaReadMixin, CachedContentMixin, KeysetPaginationMixin, ListView):
     model = DailySalesSession
     template_name = 'inventory/dailysalessession_list.html'
     context_object_name = 'sessions'
-    ordering = ['-sale_date'] # Ordenar por fecha más reciente primero
+    keyset_ordering = ('-sale_date', '-pk') # Ordenar por fecha más reciente primero
     allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE']
+    cache_models = (DailySalesSession, CustomUser) # registered_by_user se muestra en cada fila
+
+    def get_queryset(self):
+        # registered_by_user se muestra en cada fila de la plantilla
+        return super().get_queryset().select_related('registered_by_user')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = 'Sesiones de Ventas Diarias'
         
-        # Calcular estadísticas de las sesiones
-        sessions = self.get_queryset()
-        
-        # Total de sesiones
-        context['total_sessions'] = sessions.count()
-        
-        # Calcular ingresos totales
-        total_revenue = sum(session.total_revenue for session in sessions)
-        context['total_revenue'] = total_revenue
-        
-        # Calcular promedio por sesión
-        if context['total_sessions'] > 0:
-            context['average_per_session'] = total_revenue / context['total_sessions']
-        else:
-            context['average_per_session'] = 0
+        # Calcular estadísticas de las sesiones con un solo aggregate sobre los
+        # totales desnormalizados de cada sesión
+        stats = DailySalesSession.objects.aggregate(
+            sessions_count=models.Count('pk'),
+            revenue_sum=models.Sum('total_revenue'),
+            revenue_avg=models.Avg('total_revenue'),
+        )
+        context['total_sessions'] = stats['sessions_count']
+        context['total_revenue'] = stats['revenue_sum'] or 0
+        context['average_per_session'] = stats['revenue_avg'] or 0
         
         return context
 
@@ -307,9 +369,10 @@ class DailySalesSessionDetailView(RoleRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         context['page_title'] = f"Detalles de Sesión - {self.object.sale_date.strftime('%Y-%m-%d')}"
         # Añade los ítems de venta relacionados a la sesión
-        context['sale_items'] = self.object.sale_items.all()
+        context['sale_items'] = self.object.sale_items.select_related('product')
         # Forma para añadir un nuevo ítem de venta a esta sesión
         context['sale_item_form'] = SaleItemForm()
+        context['form_key'] = new_line_key() # Un doble envío no registra la venta dos veces
         return context
 
 
@@ -347,6 +410,7 @@ class DailySalesSessionUpdateView(RoleRequiredMixin, UpdateView):
 class DailySalesSessionDeleteView(RoleRequiredMixin, DeleteView):
     model = DailySalesSession
     template_name = 'inventory/dailysalessession_confirm_delete.html'
+    context_object_name = 'session'
     success_url = reverse_lazy('inventory:dailysalessession_list')
     allowed_roles = ['OWNER', 'ADMIN']
 
@@ -368,10 +432,19 @@ class SaleItemCreateView(RoleRequiredMixin, View):
         session = get_object_or_404(DailySalesSession, pk=pk)
         form = SaleItemForm(request.POST)
 
+        key = request.POST.get('clave')
         if form.is_valid():
             sale_item = form.save(commit=False)
             sale_item.sale_session = session
-            sale_item.save()
+            with transaction.atomic():
+                sync_line = claim_line(key, 'SALE') if key else None
+                if key and sync_line is None:
+                    # Clave ya usada: es un doble envío y la venta ya está registrada.
+                    return redirect('inventory:dailysalessession_detail', pk=pk)
+                sale_item.save()
+                if sync_line is not None:
+                    sync_line.sale_item = sale_item
+                    sync_line.save(update_fields=['sale_item'])
             return redirect('inventory:dailysalessession_detail', pk=pk)
         else:
             # Si el formulario no es válido, volvemos a la página de detalle con los errores
@@ -383,34 +456,103 @@ class SaleItemCreateView(RoleRequiredMixin, View):
             # Una mejora futura sería renderizar la plantilla de detalle con el formulario pre-llenado y errores.
             context = {
                 'session': session,
-                'sale_items': session.sale_items.all(),
+                'sale_items': session.sale_items.select_related('product'),
                 'sale_item_form': form, # Se pasa el formulario con errores
+                'form_key': key or new_line_key(),
                 'page_title': f"Detalles de Sesión - {session.sale_date.strftime('%Y-%m-%d')}"
             }
             return render(request, 'inventory/dailysalessession_detail.html', context)
 
+
+# --- Vista para añadir VARIOS SaleItem de una sola vez (cierre del día) ---
+# Valida todas las filas juntas y las guarda con un solo INSERT y un solo
+# UPDATE de stock por petición.
+
+class SaleItemBatchCreateView(RoleRequiredMixin, View):
+    allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE']
+    template_name = 'inventory/saleitem_batch_form.html'
+
+    def get_formset(self, session, data=None):
+        # queryset vacío: el formset solo sirve para añadir ítems nuevos
+        return SaleItemFormSet(data, instance=session, queryset=SaleItem.objects.none())
+
+    def render_formset(self, request, session, formset):
+        context = {
+            'session': session,
+            'formset': formset,
+            'page_title': f"Registrar Ventas - {session.sale_date.strftime('%Y-%m-%d')}"
+        }
+        return render(request, self.template_name, context)
+
+    def get(self, request, pk):
+        session = get_object_or_404(DailySalesSession, pk=pk)
+        return self.render_formset(request, session, self.get_formset(session))
+
+    def post(self, request, pk):
+        session = get_object_or_404(DailySalesSession, pk=pk)
+        formset = self.get_formset(session, request.POST)
+
+        if formset.is_valid():
+            # save(commit=False) ignora las filas vacías y asigna la sesión a cada ítem
+            record_sale_items(formset.save(commit=False))
+            return redirect('inventory:dailysalessession_detail', pk=pk)
+        return self.render_formset(request, session, formset)
+
 # --- BASADAS EN CLASES (CBV) para la gestión de StockAlerts ---
 
-class StockAlertListView(RoleRequiredMixin, ListView):
+class StockAlertListView(RoleRequiredMixin, KeysetPaginationMixin, ListView):
     model = StockAlert
     template_name = 'inventory/stockalert_list.html'
     context_object_name = 'alerts'
-    ordering = ['-alert_timestamp']
+    keyset_ordering = ('-alert_timestamp', '-pk')
     # Los empleados pueden ver las alertas, pero solo los admins/owners las resuelven.
     allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE']
 
     def get_queryset(self):
-        # Opcional:  filtrar para mostrar solo las alertas no resueltas por defecto
-        # return StockAlert.objects.filter(resolved=False).order_by('-alert_timestamp')
-        return super().get_queryset()
+        # Solo las alertas activas por defecto (?status=resolved / all para el histórico)
+        self.status = self.request.GET.get('status', 'active')
+        if self.status not in api.ALERT_STATUSES:
+            self.status = 'active'
+        # Posición del feed en vivo antes de leer las alertas: el stream de la
+        # página continúa desde aquí sin perder cambios (como mucho repite alguno).
+        self.last_event_id = events.event_id_at(events.broker.last_id)
+        return api.alerts_queryset(self.status).select_related('product', 'resolved_by_user')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = 'Alertas de Stock'
+        context['status'] = self.status
+        context['last_event_id'] = self.last_event_id
+        context['live_events'] = events.is_live(self.request)
+        # Solo las activas: el índice parcial de alertas activas cubre el COUNT.
         context['active_alerts_count'] = StockAlert.objects.filter(resolved=False).count()
         return context
 
 
+class StockAlertStreamView(RoleRequiredMixin, View):
+    """
+    Server-sent events con las alertas creadas / resueltas y los cambios de
+    stock (ver inventory.events). Reanuda desde la cabecera Last-Event-ID o
+    ?last_event_id=. Solo con ASGI, donde cada conexión es una corrutina en
+    espera: con WSGI responde 204 (el navegador no reconecta) en lugar de
+    ocupar un hilo del servidor hasta STREAM_SECONDS.
+    """
+    allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE']
+
+    def get(self, request):
+        if not events.is_live(request):
+            return HttpResponse(status=204)
+        last_id = events.parse_event_id(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+        # El stream no usa la base de datos: se libera la conexión (o se
+        # devuelve al pool) en lugar de retenerla hasta STREAM_SECONDS.
+        if not connection.in_atomic_block:
+            connection.close()
+        response = StreamingHttpResponse(events.astream(last_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # Sin búfer en un proxy nginx
+        return response
+
+
 class StockAlertUpdateView(RoleRequiredMixin, UpdateView):
     model = StockAlert
     form_class = StockAlertForm
@@ -502,25 +644,33 @@ class RoleDeleteView(RoleRequiredMixin, DeleteView):
 
 # --- VISTAS BASADAS EN CLASES (CBV) para la gestión de StockMovement ---
 
-class StockMovementListView(RoleRequiredMixin, ListView):
+class StockMovementListView(RoleRequiredMixin, ReplicaReadMixin, KeysetPaginationMixin, ListView):
     model = StockMovement
     template_name = 'inventory/stockmovement_list.html'
     context_object_name = 'movements'
-    ordering = ['-movement_date'] # Muestra los más recientes primero
+    keyset_ordering = ('-movement_date', '-pk') # Muestra los más recientes primero
     allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE'] # Empleados pueden ver el historial
+    stats_days = 30 # Las estadísticas cubren solo los últimos días: la tabla crece sin límite
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('product', 'registered_by')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = 'Historial de Movimientos de Stock'
         
-        # Calcular estadísticas de movimientos
-        movements = self.get_queryset()
-        
-        # Contar movimientos de entrada (IN)
-        context['movimientos_entrada'] = movements.filter(movement_type='IN').count()
-        
-        # Contar movimientos de salida (OUT)
-        context['movimientos_salida'] = movements.filter(movement_type='OUT').count()
+        # Calcular estadísticas de movimientos recientes en una sola consulta
+        stats = StockMovement.objects.filter(
+            movement_date__gte=timezone.now() - timedelta(days=self.stats_days)
+        ).aggregate(
+            total=models.Count('pk'),
+            entrada=models.Count('pk', filter=models.Q(movement_type='IN')),
+            salida=models.Count('pk', filter=models.Q(movement_type='OUT')),
+        )
+        context['stats_days'] = self.stats_days
+        context['movimientos_total'] = stats['total']
+        context['movimientos_entrada'] = stats['entrada']
+        context['movimientos_salida'] = stats['salida']
         
         return context
 
@@ -535,11 +685,23 @@ class StockMovementCreateView(RoleRequiredMixin, CreateView):
     def form_valid(self, form):
         # Asignar automáticamente el usuario logueado
         form.instance.registered_by = self.request.user
-        return super().form_valid(form)
+        key = self.request.POST.get('clave')
+        with transaction.atomic():
+            sync_line = claim_line(key, 'MOVEMENT') if key else None
+            if key and sync_line is None:
+                # Clave ya usada: es un doble envío y el movimiento ya está registrado.
+                return redirect(self.success_url)
+            response = super().form_valid(form)
+            if sync_line is not None:
+                sync_line.stock_movement = self.object
+                sync_line.save(update_fields=['stock_movement'])
+        return response
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = 'Registrar Nuevo Movimiento de Stock'
+        # Se conserva al volver a mostrar el formulario con errores.
+        context['form_key'] = self.request.POST.get('clave') or new_line_key()
         return context
 
 # Opcional: Si decido implementar Detail, Update, Delete para StockMovement:
@@ -562,4 +724,435 @@ class StockMovementCreateView(RoleRequiredMixin, CreateView):
 #     success_url = reverse_lazy('inventory:stockmovement_list')
 #     allowed_roles = ['OWNER', 'ADMIN']
 #     # Consideración: La eliminación de movimientos de stock puede tener implicaciones en la auditoría.
-#     # Puede que quiera restringirla fuertemente o solo permitirla en circunstancias muy específicas.
\ No newline at end of file
+#     # Puede que quiera restringirla fuertemente o solo permitirla en circunstancias muy específicas.
+
+
+# --- EXPORTACIONES (CSV / NDJSON en streaming) ---
+
+class ExportView(RoleRequiredMixin, ReplicaReadMixin, View):
+    """
+    Descarga el historial completo de movimientos, ventas o alertas, con un
+    rango de fechas opcional (?start_date=AAAA-MM-DD&end_date=AAAA-MM-DD).
+    La respuesta se genera fila a fila (ver inventory.exports).
+    """
+    allowed_roles = ['OWNER', 'ADMIN']
+
+    def get(self, request, kind, fmt):
+        if kind not in EXPORTS or fmt not in FORMATS:
+            raise Http404("Exportación no disponible.")
+        form = ExportFilterForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(" ".join(form.errors.get('__all__', [])) or "Fechas no válidas.")
+
+        start_date, end_date = form.cleaned_data['start_date'], form.cleaned_data['end_date']
+        # El streaming se consume después de la vista: el alias se fija aquí.
+        queryset = export_queryset(kind, start_date, end_date).using(read_alias())
+        response = StreamingHttpResponse(stream_export(kind, queryset, fmt), content_type=FORMATS[fmt])
+        filename = export_filename(kind, fmt, start_date, end_date)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ExportEmailView(RoleRequiredMixin, View):
+    """
+    Confirma y encola una exportación para recibirla comprimida por correo
+    (ver inventory.tasks.email_export): para rangos grandes, en lugar de
+    esperar a la descarga.
+    """
+    allowed_roles = ['OWNER', 'ADMIN']
+    template_name = 'inventory/export_email.html'
+
+    def get(self, request, kind, fmt):
+        if kind not in EXPORTS or fmt not in FORMATS:
+            raise Http404("Exportación no disponible.")
+        form = ExportFilterForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(" ".join(form.errors.get('__all__', [])) or "Fechas no válidas.")
+        start_date, end_date = form.cleaned_data['start_date'], form.cleaned_data['end_date']
+        return render(request, self.template_name, {
+            'page_title': 'Enviar Exportación por Correo',
+            'filename': export_filename(kind, fmt, start_date, end_date),
+            'start_date': start_date,
+            'end_date': end_date,
+            'sent': request.GET.get('enviada') == '1',
+        })
+
+    def post(self, request, kind, fmt):
+        if kind not in EXPORTS or fmt not in FORMATS:
+            raise Http404("Exportación no disponible.")
+        # El rango viaja en la URL (el formulario de confirmación se envía a la misma URL).
+        form = ExportFilterForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(" ".join(form.errors.get('__all__', [])) or "Fechas no válidas.")
+        if not request.user.email:
+            return HttpResponseBadRequest("Tu usuario no tiene un correo electrónico configurado.")
+        enqueue('email_export', kind=kind, fmt=fmt, user_id=request.user.pk,
+                start_date=form.cleaned_data['start_date'], end_date=form.cleaned_data['end_date'])
+        params = request.GET.copy()
+        params['enviada'] = '1'
+        return redirect(f"{request.path}?{params.urlencode()}")
+
+
+# --- INFORME DE VENTAS (resumen materializado por producto y día) ---
+
+class SalesReportView(AsyncRoleRequiredMixin, TemplateView):
+    """
+    Ventas por semana o mes y productos más vendidos, leídos de
+    DailyProductSales (ver inventory.rollups) en lugar de agregar SaleItem.
+    Vista async: las agregaciones se ejecutan en paralelo.
+    """
+    template_name = 'inventory/sales_report.html'
+    allowed_roles = ['OWNER', 'ADMIN']
+    top_products = 20
+
+    async def get(self, request, *args, **kwargs):
+        form = SalesReportForm(request.GET or None)
+        start_date = end_date = None
+        period = 'month'
+        if form.is_bound and form.is_valid():
+            start_date, end_date = form.cleaned_data['start_date'], form.cleaned_data['end_date']
+            period = form.cleaned_data['period'] or period
+
+        # El resumen lo recalcula la tarea refresh_sales_rollup que encola la
+        # venta; aquí solo se lee y se avisa de las sesiones que aún no incluye.
+        with replica_reads(request):
+            rows, products, pending = await gather_queries(
+                partial(list, sales_by_period(period, start_date, end_date)),
+                partial(list, sales_by_product(start_date, end_date)[:self.top_products]),
+                partial(pending_refresh, start_date, end_date),
+            )
+        context = self.get_context_data(**kwargs)
+        context.update({
+            'page_title': 'Informe de Ventas',
+            'form': form,
+            'period': period,
+            'rows': rows,
+            'products': products,
+            'pending': pending,
+            'totals': {key: sum(row[key] for row in rows)
+                       for key in ('total_quantity', 'total_revenue', 'total_cost', 'margin')},
+        })
+        return self.render_to_response(context)
+
+
+# --- STOCK EN UNA FECHA (a partir de las instantáneas de inventario) ---
+
+class StockAtDateView(RoleRequiredMixin, ReplicaReadMixin, View):
+    """
+    JSON con el stock de cierre de cada producto en una fecha pasada
+    (?date=AAAA-MM-DD, opcionalmente &product=<id> repetido). Se calcula desde
+    la instantánea más cercana (ver inventory.snapshots); la valoración usa el
+    precio de compra actual.
+    """
+    allowed_roles = ['OWNER', 'ADMIN']
+
+    def get(self, request):
+        form = StockAtDateForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errores': form.errors.get_json_data()}, status=400)
+
+        date = form.cleaned_data['date']
+        selected = form.cleaned_data['product']
+        stocks, base_date = stock_at(date, [p.pk for p in selected] if selected else None)
+        products = selected if selected else Product.objects.filter(pk__in=stocks)
+        return JsonResponse({
+            'fecha': date,
+            'instantanea_base': base_date,
+            'productos': [
+                {
+                    'id': product.pk,
+                    'nombre': product.name,
+                    'unidad': product.unit_of_measurement,
+                    'stock': stocks[product.pk],
+                    'precio_compra': product.price_per_unit_from_supplier,
+                    'valor': (stocks[product.pk] * product.price_per_unit_from_supplier).quantize(Decimal('0.01')),
+                }
+                for product in products.order_by('name')
+            ],
+        })
+
+
+# --- API JSON DE SOLO LECTURA (v1) ---
+
+class ApiView(RoleRequiredMixin, View):
+    """Base de las vistas de la API (ver inventory.api): roles y errores de acceso en JSON."""
+    allowed_roles = ['OWNER', 'ADMIN', 'EMPLOYEE']
+
+    def handle_no_permission(self):
+        # Un cliente de la API no sigue la redirección a la página de inicio.
+        status = 403 if self.request.user.is_authenticated else 401
+        return JsonResponse({'error': 'No autorizado.'}, status=status)
+
+
+class ConditionalGetMixin:
+    """
+    GET condicional de los recursos de solo lectura: calcula primero el
+    ETag / Last-Modified con una consulta agregada y, si el cliente ya tiene
+    esa versión (If-None-Match / If-Modified-Since), responde 304 sin leer ni
+    serializar las filas. Si no, el cuerpo JSON se sirve desde la caché por
+    ETag (el contenido no depende del rol), así que cada versión se serializa
+    una sola vez para todos los clientes.
+    """
+
+    def get_validators(self):
+        """(etag, last_modified o None) del recurso."""
+        raise NotImplementedError
+
+    def get_payload(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        etag = quote_etag(etag)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            key = api.API_CACHE_KEY.format(etag=etag)
+            body = cache.get(key)
+            if body is None:
+                body = JsonResponse(self.get_payload()).content
+                cache.set(key, body, getattr(settings, 'CONTENT_CACHE_TIMEOUT', 60 * 5))
+            response = HttpResponse(body, content_type='application/json')
+        response.headers['ETag'] = etag
+        if last_modified:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        # Los clientes pueden guardar la respuesta, pero deben revalidarla en cada consulta.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class ApiProductListView(ConditionalGetMixin, ApiView):
+    """GET /api/v1/products/: todos los productos con su stock."""
+
+    def get_validators(self):
+        return api.products_validators()
+
+    def get_payload(self):
+        return api.products_payload()
+
+
+class ApiStockAlertListView(ConditionalGetMixin, ApiView):
+    """GET /api/v1/alerts/?status=active|resolved|all (por defecto, las activas)."""
+
+    def get(self, request, *args, **kwargs):
+        self.status = request.GET.get('status', 'active')
+        if self.status not in api.ALERT_STATUSES:
+            return JsonResponse({'error': f"status debe ser uno de: {', '.join(api.ALERT_STATUSES)}."}, status=400)
+        return super().get(request, *args, **kwargs)
+
+    def get_validators(self):
+        return api.alerts_validators(self.status)
+
+    def get_payload(self):
+        return api.alerts_payload(self.status)
+
+
+class ApiTodaySalesView(ConditionalGetMixin, ApiView):
+    """GET /api/v1/sales/today/: totales de la sesión de venta de hoy."""
+
+    def get_validators(self):
+        self.state = api.today_session_state()
+        return api.today_session_validators(self.state)
+
+    def get_payload(self):
+        return api.today_session_payload(self.state)
+
+
+# --- SINCRONIZACIÓN DE LOS TPV (API v1) ---
+
+class ApiSyncView(ApiView):
+    """
+    POST /api/v1/sync/: lote de ventas y movimientos de un TPV que estuvo sin
+    conexión (ver inventory.sync). Se puede reintentar con seguridad: las
+    claves del lote y de cada línea impiden aplicarlas dos veces. Como el
+    resto de la API, usa la sesión: requiere la cabecera X-CSRFToken.
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': "El cuerpo debe ser JSON válido."}, status=400)
+        try:
+            return JsonResponse(sync_batch(data, user=request.user))
+        except ValidationError as error:
+            return JsonResponse({'error': " ".join(error.messages)}, status=400)
+
+
+# --- IMPORTACIÓN DE CATÁLOGO (CSV / XLSX) ---
+
+class CatalogImportView(RoleRequiredMixin, View):
+    """
+    Alta o actualización masiva de proveedores y productos desde ficheros
+    CSV/XLSX (ver inventory.imports). Muestra el resumen y los errores por fila.
+    """
+    template_name = 'inventory/catalog_import.html'
+    allowed_roles = ['OWNER', 'ADMIN']
+    # Errores por fila que se muestran en la página (el resto solo se cuenta).
+    max_errors_shown = 200
+
+    def render_form(self, request, form, results=None):
+        context = {
+            'form': form,
+            'results': results or [],
+            'max_errors_shown': self.max_errors_shown,
+            'page_title': 'Importar Catálogo',
+        }
+        return render(request, self.template_name, context)
+
+    def get(self, request):
+        return self.render_form(request, CatalogImportForm())
+
+    def post(self, request):
+        form = CatalogImportForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return self.render_form(request, form)
+
+        results = []
+        # Los proveedores primero: los productos los referencian por nombre.
+        for kind, field in (('suppliers', 'suppliers_file'), ('products', 'products_file')):
+            upload = form.cleaned_data[field]
+            if not upload:
+                continue
+            try:
+                results.append(import_catalog(kind, upload, upload.name, dry_run=form.cleaned_data['dry_run']))
+            except ValidationError as e:
+                form.add_error(field, e)
+                break
+        return self.render_form(request, form, results)
+
+
+# --- RENDIMIENTO (solo OWNER) ---
+
+class PerformanceView(RoleRequiredMixin, TemplateView):
+    """
+    Endpoints más lentos y sus consultas más costosas, según las últimas
+    peticiones registradas por RequestTimingMiddleware en este proceso, y el
+    estado del pool de conexiones (si está activado).
+    """
+    template_name = 'inventory/performance.html'
+    allowed_roles = ['OWNER']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page_title'] = 'Rendimiento'
+        context['endpoints'] = request_log.endpoint_summary()
+        context['request_count'] = len(request_log.entries())
+        context['log_size'] = request_log.size
+        context['pool'] = pool_stats()
+        return context
+
+    def post(self, request, *args, **kwargs):
+        # Vacía el registro para medir desde cero.
+        request_log.clear()
+        return redirect('inventory:performance')
+
+
+# --- PEDIDOS A PROVEEDORES ---
+
+class PurchaseSuggestionView(RoleRequiredMixin, View):
+    """
+    Cantidades a pedir de todo el catálogo agrupadas por proveedor y próximo
+    día de reparto (ver inventory.purchasing). El POST las guarda como pedidos
+    en borrador, sustituyendo los borradores anteriores de esos proveedores.
+    """
+    template_name = 'inventory/purchase_suggestions.html'
+    allowed_roles = ['OWNER', 'ADMIN']
+
+    def get(self, request):
+        suggestions = suggest_purchase_orders()
+        context = {
+            'suggestions': suggestions,
+            'total': sum(suggestion.total for suggestion in suggestions),
+            'draft_count': replaced_drafts(suggestions).count(),
+            'pending': pending_consumption(),
+            'page_title': 'Sugerencias de Pedido',
+        }
+        return render(request, self.template_name, context)
+
+    def post(self, request):
+        create_draft_orders(suggest_purchase_orders(), user=request.user)
+        return redirect(f"{reverse_lazy('inventory:purchaseorder_list')}?status=DRAFT")
+
+
+class PurchaseOrderListView(RoleRequiredMixin, KeysetPaginationMixin, ListView):
+    model = PurchaseOrder
+    template_name = 'inventory/purchaseorder_list.html'
+    context_object_name = 'orders'
+    keyset_ordering = ('-created_at', '-pk')
+    allowed_roles = ['OWNER', 'ADMIN']
+
+    def get_status(self):
+        status = self.request.GET.get('status')
+        return status if status in dict(PurchaseOrder.STATUS_CHOICES) else None
+
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related('supplier').annotate(
+            line_count=models.Count('lines'),
+            total=models.Sum(models.F('lines__quantity') * models.F('lines__unit_price')),
+        )
+        if self.get_status():
+            queryset = queryset.filter(status=self.get_status())
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page_title'] = 'Pedidos a Proveedores'
+        context['status'] = self.get_status()
+        context['status_choices'] = PurchaseOrder.STATUS_CHOICES
+        return context
+
+
+class PurchaseOrderDetailView(RoleRequiredMixin, View):
+    """
+    Detalle de un pedido. En borrador se pueden ajustar o quitar líneas y
+    confirmarlo; un pedido confirmado se recibe (entradas de stock en bloque)
+    o se cancela. Las acciones llegan como POST con el campo `action`.
+    """
+    template_name = 'inventory/purchaseorder_detail.html'
+    allowed_roles = ['OWNER', 'ADMIN']
+
+    def get_formset(self, order, data=None):
+        if not order.is_draft:
+            return None
+        return PurchaseOrderLineFormSet(data, instance=order,
+                                        queryset=order.lines.select_related('product'))
+
+    def render_order(self, request, order, formset=None, error=None):
+        context = {
+            'order': order,
+            'lines': order.lines.select_related('product'),
+            'formset': formset if formset is not None else self.get_formset(order),
+            'error': error,
+            'page_title': f"Pedido #{order.pk} - {order.supplier.name}",
+        }
+        return render(request, self.template_name, context)
+
+    def get(self, request, pk):
+        order = get_object_or_404(PurchaseOrder.objects.select_related('supplier'), pk=pk)
+        return self.render_order(request, order)
+
+    def post(self, request, pk):
+        order = get_object_or_404(PurchaseOrder.objects.select_related('supplier'), pk=pk)
+        action = request.POST.get('action')
+        try:
+            if action in ('save', 'confirm'):
+                formset = self.get_formset(order, request.POST)
+                if formset is None:
+                    raise ValidationError("Solo se pueden modificar los pedidos en borrador.")
+                if not formset.is_valid():
+                    return self.render_order(request, order, formset)
+                with transaction.atomic():
+                    formset.save()
+                    if action == 'confirm':
+                        confirm_purchase_order(order)
+            elif action == 'receive':
+                receive_purchase_order(order, user=request.user)
+            elif action == 'cancel':
+                cancel_purchase_order(order)
+            else:
+                return HttpResponseBadRequest("Acción no válida.")
+        except ValidationError as e:
+            return self.render_order(request, order, error=' '.join(e.messages))
+        return redirect('inventory:purchaseorder_detail', pk=order.pk)